@@ -9,6 +9,8 @@ from .models import (
 
 )
 from .forms import CustomUserCreationForm, CustomUserChangeForm, PatchAdminForm
+from .signals import security_issue_links_changed
+from .search import filter_matching, search_index_supported
 
 # -----------------------
 # Inline Admin Classes
@@ -121,7 +123,8 @@ class ProductAdmin(admin.ModelAdmin):
 # -----------------------
 @admin.register(Image)
 class ImageAdmin(admin.ModelAdmin):
-    list_display = ('image_name', 'product', 'build_number', 'twistlock_status', 'security_issues_list')
+    list_display = ('image_name', 'product', 'build_number', 'twistlock_status',
+                    'critical_count', 'high_count', 'medium_count', 'max_cvss_score', 'security_issues_list')
     list_filter = ('product__name', 'twistlock_report_clean')
     search_fields = ('image_name', 'product__name')
     raw_id_fields = ('product',)
@@ -141,6 +144,12 @@ class ImageAdmin(admin.ModelAdmin):
         return ", ".join([issue.cve_id for issue in obj.security_issues.all()])
     security_issues_list.short_description = "Security Issues"
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # The inline saves through-model rows, which send no signals
+        if any(formset.has_changed() for formset in formsets):
+            security_issue_links_changed([form.instance.pk])
+
 # -----------------------
 # Security Issue Admin
 # -----------------------
@@ -151,6 +160,12 @@ class SecurityIssueAdmin(admin.ModelAdmin):
     search_fields = ('cve_id', 'affected_libraries')
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the full-text index where there is one (see search.py)
+        if search_term.strip() and search_index_supported():
+            return filter_matching(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
     def affected_images_count(self, obj):
         return obj.images.count()
     affected_images_count.short_description = "Affected Images"
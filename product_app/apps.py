@@ -4,4 +4,12 @@ from django.apps import AppConfig
 class ProductAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'product_app'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .search import install_search_index
+
+        post_migrate.connect(install_search_index, sender=self)
  
\ No newline at end of file
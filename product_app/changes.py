@@ -0,0 +1,96 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+
+from .completion import refresh_rollup
+from .counters import refresh_vulnerability_counters
+from .models import Patch, PatchImage
+
+# -----------------------
+# Patch change tracking
+# -----------------------
+# signals.py reports every write that touches a patch document. For each
+# changed patch we
+#   * bump Patch.version (the ETag of the patch detail endpoints), and
+#   * refresh its PatchProductCompletion rollup when the write can affect
+#     completion.
+# Images whose security issues changed get their vulnerability counters
+# (counters.py) recomputed.
+# Outside a change_batch() block this happens straight after the write; bulk
+# writers wrap their work in change_batch() so it happens once, at the end of
+# the block. Both run in the writer's transaction.
+
+_state = threading.local()
+
+
+def _pending():
+    if not hasattr(_state, 'depth'):
+        _state.depth = 0
+        _reset(_state)
+    return _state
+
+
+def _reset(pending):
+    pending.patches = set()
+    pending.patch_images = set()
+    pending.completion_patches = set()
+    pending.completion_patch_images = set()
+    pending.images = set()
+
+
+def mark_changed(patch_names=(), patch_image_ids=(), completion=True, image_ids=()):
+    """
+    Record that the given patches (or the patches of the given PatchImage ids)
+    changed, and that the security issues of the given Image ids changed.
+    """
+    pending = _pending()
+    patch_names = {name for name in patch_names if name is not None}
+    patch_image_ids = {pk for pk in patch_image_ids if pk is not None}
+    pending.patches |= patch_names
+    pending.patch_images |= patch_image_ids
+    pending.images |= {pk for pk in image_ids if pk is not None}
+    if completion:
+        pending.completion_patches |= patch_names
+        pending.completion_patch_images |= patch_image_ids
+    if pending.depth == 0:
+        flush_changes()
+
+
+def flush_changes():
+    pending = _pending()
+    patches, completion_patches = pending.patches, pending.completion_patches
+    patch_images, completion_patch_images = pending.patch_images, pending.completion_patch_images
+    images = pending.images
+    _reset(pending)
+
+    if images:
+        refresh_vulnerability_counters(images)
+
+    if patch_images:
+        for pi_id, patch_name in PatchImage.objects.filter(id__in=patch_images).values_list('id', 'patch_id'):
+            patches.add(patch_name)
+            if pi_id in completion_patch_images:
+                completion_patches.add(patch_name)
+
+    if patches:
+        Patch.objects.filter(name__in=patches).update(version=F('version') + 1)
+    if completion_patches:
+        refresh_rollup(completion_patches)
+
+
+@contextmanager
+def change_batch():
+    """Defer version bumps and rollup / counter refreshes to the end of the block (nestable)."""
+    pending = _pending()
+    pending.depth += 1
+    try:
+        yield
+    except BaseException:
+        pending.depth -= 1
+        if pending.depth == 0:
+            _reset(pending)
+        raise
+    pending.depth -= 1
+    if pending.depth == 0:
+        flush_changes()
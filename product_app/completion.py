@@ -0,0 +1,261 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, Func, IntegerField, Sum, TextField, Value, When
+from django.db.models.lookups import Exact
+
+from .models import Patch, PatchImage, PatchImageJar, PatchProductCompletion
+
+# -----------------------
+# Completion engine
+# -----------------------
+# A patch is tracked as a set of "items":
+#   * every PatchImage counts as one item, worth half a point for registry
+#     and half a point for ot2_pass once either is 'Released';
+#   * every PatchImageJar whose jar is also tracked on the patch (PatchJar)
+#     counts as one item, complete when it is 'updated' or carries remarks.
+# Points are kept as integer half-points so sums stay exact, and every
+# function below runs a fixed number of queries however many patches,
+# products, images or jars are involved.
+
+
+class Completion:
+    def __init__(self, total=0, halves=0):
+        self.total = total
+        self.halves = halves
+
+    def add(self, other):
+        self.total += other.total
+        self.halves += other.halves
+        return self
+
+    @property
+    def completed(self):
+        return self.halves / 2
+
+    @property
+    def percentage(self):
+        if self.total == 0:
+            return 0
+        return round((self.completed / self.total) * 100, 2)
+
+    @property
+    def is_complete(self):
+        return self.total > 0 and self.halves == 2 * self.total
+
+
+def _released(field):
+    return Case(
+        When(**{f'{field}__iexact': 'released'}, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+# Every character str.isspace() accepts (none lies above U+3000)
+WHITESPACE = ''.join(ch for ch in map(chr, range(0x3001)) if ch.isspace())
+
+
+class StripWhitespace(Func):
+    """str.strip() in SQL: TRIM(x, chars) strips any of `chars` (BTRIM on PostgreSQL)."""
+    function = 'TRIM'
+    output_field = TextField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, Value(WHITESPACE), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='BTRIM', **extra_context)
+
+
+def _jar_done():
+    # updated OR remarks.strip() != ''
+    return Case(
+        When(updated=True, then=Value(1)),
+        When(remarks__isnull=True, then=Value(0)),
+        When(Exact(StripWhitespace('remarks'), Value('')), then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+
+
+def tracked_patch_images(patch_names):
+    """
+    PatchImage rows that count towards completion: the image is a live build
+    of the patch (build_number == patch name) and belongs to a live product
+    attached to the patch.
+    """
+    return PatchImage.objects.filter(
+        patch_id__in=patch_names,
+        image__build_number=F('patch_id'),
+        image__is_deleted=False,
+        image__product__is_deleted=False,
+        image__product__patches=F('patch_id'),
+    )
+
+
+def image_completion(patch_names):
+    """
+    {patch_name: {product_name: {image_name: Completion}}} for the given patches.
+    Two queries: one over PatchImage, one grouped count over PatchImageJar.
+    """
+    result = {name: {} for name in patch_names}
+
+    image_rows = (
+        tracked_patch_images(patch_names)
+        .annotate(halves=_released('registry') + _released('ot2_pass'))
+        .values_list('id', 'patch_id', 'image__product_id', 'image__image_name', 'halves')
+    )
+
+    jar_counts = {
+        row['patch_image_id']: row
+        for row in (
+            PatchImageJar.objects
+            .filter(patch_image__patch_id__in=patch_names,
+                    jar__patchjar__patch=F('patch_image__patch'))
+            .values('patch_image_id')
+            .annotate(total=Count('id'), done=Sum(_jar_done()))
+            .order_by()
+        )
+    }
+
+    for pi_id, patch_name, product_name, image_name, halves in image_rows:
+        c = Completion(total=1, halves=halves)
+        jars = jar_counts.get(pi_id)
+        if jars:
+            c.add(Completion(total=jars['total'], halves=2 * (jars['done'] or 0)))
+        images = result[patch_name].setdefault(product_name, {})
+        if image_name in images:
+            images[image_name].add(c)
+        else:
+            images[image_name] = c
+    return result
+
+
+def product_completion(patch_names):
+    """
+    {patch_name: {product_name: Completion}} covering every live product on
+    each patch, including products with nothing to track yet.
+    """
+    result = {name: {} for name in patch_names}
+    product_links = (
+        Patch.products.through.objects
+        .filter(patch_id__in=patch_names, product__is_deleted=False)
+        .order_by('id')
+        .values_list('patch_id', 'product_id')
+    )
+    for patch_name, product_name in product_links:
+        result[patch_name][product_name] = Completion()
+
+    for patch_name, products in image_completion(patch_names).items():
+        for product_name, images in products.items():
+            bucket = result[patch_name].setdefault(product_name, Completion())
+            for c in images.values():
+                bucket.add(c)
+    return result
+
+
+def patch_completion(patch_names):
+    """{patch_name: Completion} for the given patches."""
+    result = {name: Completion() for name in patch_names}
+    for patch_name, products in image_completion(patch_names).items():
+        for images in products.values():
+            for c in images.values():
+                result[patch_name].add(c)
+    return result
+
+
+# -----------------------
+# Completion rollup
+# -----------------------
+# PatchProductCompletion holds the product_completion() numbers for every
+# (patch, product). changes.py refreshes the rows of a patch whenever a
+# PatchImage, PatchImageJar, PatchJar, Image or patch/product link changes,
+# inside the writer's transaction.
+
+
+def _rollup_rows(computed):
+    return [
+        PatchProductCompletion(
+            patch_id=patch_name,
+            product_id=product_name,
+            total_items=c.total,
+            completed_halves=c.halves,
+        )
+        for patch_name, products in computed.items()
+        for product_name, c in products.items()
+    ]
+
+
+def refresh_rollup(patch_names):
+    """Recompute the rollup rows of the given patches from the live tables."""
+    patch_names = list(patch_names)
+    computed = product_completion(patch_names)
+    PatchProductCompletion.objects.filter(patch_id__in=patch_names).delete()
+    PatchProductCompletion.objects.bulk_create(_rollup_rows(computed))
+    return computed
+
+
+def rollup_completion(patch_names):
+    """
+    {patch_name: {product_name: Completion}} read from the rollup table.
+    Patches that have no rollup rows yet (written before the rollup existed)
+    are computed, and stored on the way when there is anything to store.
+    """
+    result = {name: {} for name in patch_names}
+    rows = (
+        PatchProductCompletion.objects
+        .filter(patch_id__in=patch_names)
+        .order_by('id')
+        .values_list('patch_id', 'product_id', 'total_items', 'completed_halves')
+    )
+    for patch_name, product_name, total, halves in rows:
+        result[patch_name][product_name] = Completion(total=total, halves=halves)
+
+    missing = [name for name, products in result.items() if not products]
+    if missing:
+        computed = product_completion(missing)
+        result.update(computed)
+        # Only inserts: a concurrent read (or writer) may store the same rows
+        # first, and its rows are at least as fresh as these.
+        rows = _rollup_rows(computed)
+        if rows:
+            with transaction.atomic():
+                PatchProductCompletion.objects.bulk_create(rows, ignore_conflicts=True)
+    return result
+
+
+def rollup_patch_completion(patch_names):
+    """{patch_name: Completion} summed from the rollup table."""
+    result = {name: Completion() for name in patch_names}
+    for patch_name, products in rollup_completion(patch_names).items():
+        for c in products.values():
+            result[patch_name].add(c)
+    return result
+
+
+def rollup_drift(patch_names=None):
+    """
+    Compare the rollup table against a live computation.
+    Returns a list of (patch, product, stored, live) tuples that disagree;
+    `stored` or `live` is None when the row only exists on one side.
+    """
+    if patch_names is None:
+        patch_names = list(Patch.objects.values_list('name', flat=True))
+    live = product_completion(patch_names)
+    stored = {name: {} for name in patch_names}
+    rows = (
+        PatchProductCompletion.objects
+        .filter(patch_id__in=patch_names)
+        .values_list('patch_id', 'product_id', 'total_items', 'completed_halves')
+    )
+    for patch_name, product_name, total, halves in rows:
+        stored[patch_name][product_name] = (total, halves)
+
+    drift = []
+    for patch_name in patch_names:
+        live_products = {p: (c.total, c.halves) for p, c in live[patch_name].items()}
+        for product_name in sorted(set(live_products) | set(stored[patch_name])):
+            s = stored[patch_name].get(product_name)
+            l = live_products.get(product_name)
+            if s != l:
+                drift.append((patch_name, product_name, s, l))
+    return drift
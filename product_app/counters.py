@@ -0,0 +1,48 @@
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Image
+
+# -----------------------
+# Image vulnerability counters
+# -----------------------
+# Every Image carries the number of its linked security issues per severity
+# and their highest CVSS score, so listings and dashboards read plain columns
+# instead of joining the image / security issue table. changes.py refreshes
+# them for the images signals.py (or a bulk writer) reports through
+# mark_changed(image_ids=...).
+
+CHUNK_SIZE = 500
+
+SEVERITY_COUNTERS = {
+    'critical_count': 'Critical',
+    'high_count': 'High',
+    'medium_count': 'Medium',
+}
+
+
+def _links():
+    return Image.security_issues.through.objects.filter(image_id=OuterRef('pk')).values('image_id')
+
+
+def vulnerability_counters():
+    """The counter columns as expressions over an image's security issue links."""
+    counters = {
+        field: Coalesce(
+            Subquery(_links().filter(securityissue__severity=severity).annotate(n=Count('id')).values('n')),
+            Value(0),
+            output_field=IntegerField(),
+        )
+        for field, severity in SEVERITY_COUNTERS.items()
+    }
+    counters['max_cvss_score'] = Subquery(
+        _links().annotate(score=Max('securityissue__cvss_score')).values('score')
+    )
+    return counters
+
+
+def refresh_vulnerability_counters(image_ids):
+    """Recomputes the counters of the given images, one UPDATE per CHUNK_SIZE images."""
+    image_ids = list({pk for pk in image_ids if pk is not None})
+    for i in range(0, len(image_ids), CHUNK_SIZE):
+        Image.objects.filter(pk__in=image_ids[i:i + CHUNK_SIZE]).update(**vulnerability_counters())
@@ -0,0 +1,23 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Applies `view.query_filters`, a {query_param: orm_lookup} mapping, e.g.
+        query_filters = {'severity': 'severity', 'cvss_min': 'cvss_score__gte'}
+    Every lookup should be backed by an index.
+    """
+    def filter_queryset(self, request, queryset, view):
+        lookups = {}
+        for param, lookup in getattr(view, 'query_filters', {}).items():
+            value = request.query_params.get(param)
+            if value not in (None, ''):
+                lookups[lookup] = value
+        if not lookups:
+            return queryset
+        try:
+            return queryset.filter(**lookups)
+        except (ValueError, TypeError, DjangoValidationError) as e:
+            raise ValidationError({"detail": f"Invalid filter value: {e}"})
@@ -0,0 +1,579 @@
+import hashlib
+import json
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .changes import change_batch, mark_changed
+from .interning import jar_names
+from .models import (
+    SECURITY_ISSUE_KEY, Image, Patch, PatchImage, PatchImageJar, PatchProductHelmChart, Product,
+    SecurityIssue, library_hash, security_issue_hash,
+)
+
+logger = logging.getLogger(__name__)
+
+# -----------------------
+# Bulk patch data ingestion
+# -----------------------
+# Backs POST /patches/update-data/. The whole payload is validated and
+# applied to in-memory rows first, then written with a fixed number of
+# set-based statements:
+#   1. resolve   existing Patch / Product / Image / SecurityIssue / PatchImage /
+#                helm chart rows with IN queries,
+#   2. apply     every patch -> product -> image entry in payload order, so a
+#                later entry sees what an earlier one did (locks, created images),
+#   3. write     bulk_create(update_conflicts=True) where the table has a
+#                natural unique key, bulk_create + bulk_update where it has not.
+# Bulk writes skip model signals, so the touched patches are reported to
+# changes.py explicitly.
+
+CHUNK_SIZE = 500
+
+SECURITY_ISSUE_FIELDS = ('library_path', 'description', 'is_deleted', 'updated_at')
+
+
+class IngestError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def chunked(values, size=CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def live_names(payload):
+    """(live patch names, live product names) referenced by a payload."""
+    patch_names = {p.get('name') for p in payload if p.get('name')}
+    product_names = {
+        prod.get('name')
+        for p in payload for prod in p.get('products', [])
+        if prod.get('name')
+    }
+    live_patches = set(
+        Patch.objects.filter(name__in=patch_names, is_deleted=False).values_list('name', flat=True)
+    )
+    live_products = set(
+        Product.objects.filter(name__in=product_names, is_deleted=False).values_list('name', flat=True)
+    )
+    return live_patches, live_products
+
+
+def section_digest(section):
+    """sha256 of a payload section, independent of key order and whitespace."""
+    encoded = json.dumps(section, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def security_issue_fields(issue_data):
+    """(cve_id, cvss_score, severity, affected_libraries) of a payload issue, or None if incomplete."""
+    cve_id = issue_data.get('CVE')
+    cvss_score = issue_data.get('cvss')
+    severity = issue_data.get('Severity')
+    affected_libraries = issue_data.get('PackageName')
+    if not (cve_id and cvss_score is not None and severity and affected_libraries):
+        return None
+    return cve_id, float(cvss_score), severity, affected_libraries
+
+
+class PatchDataIngest:
+    """Applies one update-data payload (a list of patch documents)."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.images = {}              # (image_name, build_number) -> Image
+        self.touched_images = {}      # existing images to bulk_update
+        self.new_images = []
+        self.issues = {}              # natural_key_hash -> SecurityIssue
+        self.touched_issues = {}
+        self.image_issues = {}        # image key -> [natural_key_hash]
+        self.patch_images = {}        # (patch_name, image key) -> PatchImage
+        self.touched_patch_images = {}
+        self.patch_image_jars = {}    # (patch_image key, jar_name) -> {field: value}
+        self.helm_charts = {}         # (patch_name, product_name) -> value
+        self.existing_helm_charts = {}
+        self.image_patch_images = {}  # image key -> {pi key: PatchImage} touched
+        self.skipped = {'security_issues': 0, 'jars': 0}
+
+    def run(self, validate=True):
+        if validate:
+            self.validate()
+        self.resolve()
+        for patch_data in self.payload:
+            self.apply_patch(patch_data)
+        self.write()
+
+    # -- 0. validation ------------------------------------------------
+
+    def validate(self):
+        """Raise the first error the per-row endpoint would have hit, before anything is written."""
+        live_patches, live_products = live_names(self.payload)
+        for patch_data in self.payload:
+            patch_name = patch_data.get('name')
+            if not patch_name:
+                raise IngestError("Field 'name' is required at top level.", 400)
+            if patch_name not in live_patches:
+                raise IngestError(f"Patch '{patch_name}' not found.", 404)
+            for prod_data in patch_data.get('products', []):
+                product_name = prod_data.get('name')
+                if not product_name:
+                    raise IngestError("Each product object must have a 'name'.", 400)
+                if product_name not in live_products:
+                    raise IngestError(f"Product '{product_name}' not found.", 404)
+
+    # -- 1. resolve existing rows -------------------------------------
+
+    def _entries(self):
+        for patch_data in self.payload:
+            for prod_data in patch_data.get('products', []):
+                for img_data in prod_data.get('images', []):
+                    if img_data.get('image_name'):
+                        yield patch_data['name'], prod_data, img_data
+
+    def resolve(self):
+        image_names, build_numbers = set(), set()
+        for patch_name, _, img_data in self._entries():
+            image_names.add(img_data['image_name'])
+            build_numbers.update((patch_name, img_data.get('patch_name', '')))
+
+        for names in chunked(image_names):
+            for image in Image.objects.filter(image_name__in=names, build_number__in=build_numbers):
+                self.images[(image.image_name, image.build_number)] = image
+
+        patch_names = {p['name'] for p in self.payload}
+        image_keys = {image.pk: key for key, image in self.images.items()}
+        for ids in chunked(image_keys):
+            rows = (
+                PatchImage.objects
+                .filter(patch_id__in=patch_names, image_id__in=ids)
+                .order_by('id')
+            )
+            for pi in rows:
+                self.patch_images.setdefault((pi.patch_id, image_keys[pi.image_id]), pi)
+
+        # Sections matching the digest stored on their PatchImage will be
+        # skipped, so their issues need not be loaded (a later entry that does
+        # need one after all still upserts it on its natural key).
+        hashes = set()
+        for patch_name, _, img_data in self._entries():
+            patch_image = self.patch_images.get((patch_name, (img_data['image_name'], patch_name)))
+            issues = img_data.get('security_issues', [])
+            if patch_image is not None and section_digest(issues) == patch_image.security_issues_digest:
+                continue
+            for issue_data in issues:
+                fields = security_issue_fields(issue_data)
+                if fields is not None:
+                    hashes.add(security_issue_hash(*fields))
+        for chunk in chunked(hashes):
+            for issue in SecurityIssue.objects.filter(natural_key_hash__in=chunk):
+                self.issues[issue.natural_key_hash] = issue
+
+        helm_rows = PatchProductHelmChart.objects.filter(
+            patch_id__in=patch_names,
+            product_id__in={prod['name'] for p in self.payload for prod in p.get('products', [])},
+        )
+        for row in helm_rows:
+            self.existing_helm_charts.setdefault((row.patch_id, row.product_id), []).append(row)
+
+    # -- 2. apply the payload in order --------------------------------
+
+    def apply_patch(self, patch_data):
+        patch_name = patch_data['name']
+        for prod_data in patch_data.get('products', []):
+            product_name = prod_data['name']
+            for img_data in prod_data.get('images', []):
+                if img_data.get('image_name'):
+                    self.apply_image(patch_name, product_name, img_data)
+
+            helm_val = prod_data.get('helm_charts', None)
+            if helm_val is not None:
+                self.helm_charts[(patch_name, product_name)] = helm_val
+
+    def apply_image(self, patch_name, product_name, img_data):
+        image_name = img_data['image_name']
+
+        # Image: matched on (image_name, patch name), created otherwise
+        image = self.images.get((image_name, patch_name))
+        if image is not None:
+            if 'twistlock_report_url' in img_data:
+                image.twistlock_report_url = img_data['twistlock_report_url']
+            if 'twistlock_report_clean' in img_data:
+                image.twistlock_report_clean = img_data['twistlock_report_clean']
+            if image.pk is not None:
+                self.touched_images[image.pk] = image
+        else:
+            image = Image(
+                product_id=product_name,
+                image_name=image_name,
+                build_number=img_data.get('patch_name', ''),
+                twistlock_report_url=img_data.get('twistlock_report_url', ''),
+                twistlock_report_clean=img_data.get('twistlock_report_clean', True),
+            )
+            # A clash with an existing (image_name, build_number) surfaces as an
+            # IntegrityError on write, as it did with Image.objects.create().
+            self.images.setdefault((image_name, image.build_number), image)
+            self.new_images.append(image)
+        image_key = (image.image_name, image.build_number)
+
+        pi_key = (patch_name, image_key)
+        patch_image = self.patch_images.get(pi_key)
+        if patch_image is None:
+            patch_image = self.patch_images[pi_key] = PatchImage(patch_id=patch_name)
+        self.touched_patch_images[pi_key] = patch_image
+        self.image_patch_images.setdefault(image_key, {})[pi_key] = patch_image
+
+        # SecurityIssues: upserted on their natural key, then the image's set
+        # replaced -- unless the section is identical to the last one ingested.
+        if 'security_issues' in img_data:
+            digest = section_digest(img_data['security_issues'])
+            if digest == patch_image.security_issues_digest:
+                self.skipped['security_issues'] += 1
+            else:
+                self.apply_security_issues(image_key, img_data['security_issues'])
+                # The image's set is shared by every PatchImage of the image.
+                for other in self.image_patch_images[image_key].values():
+                    other.security_issues_digest = ''
+                patch_image.security_issues_digest = digest
+
+        # PatchImage: only the fields given; patch_build_number only while unlocked
+        was_locked = patch_image.lock
+        if 'ot2_pass' in img_data:
+            patch_image.ot2_pass = img_data['ot2_pass']
+        if 'registry' in img_data:
+            patch_image.registry = img_data['registry']
+        if 'build_number' in img_data and not was_locked:
+            patch_image.patch_build_number = img_data['build_number']
+        # force lock on any new "Released" status
+        if img_data.get('ot2_pass') == 'Released' or img_data.get('registry') == 'Released':
+            patch_image.lock = True
+
+        # PatchImageJar: only the fields given, merged across repeated entries
+        if 'jars' in img_data:
+            digest = section_digest(img_data['jars'])
+            if digest == patch_image.jars_digest:
+                self.skipped['jars'] += 1
+            else:
+                self.apply_jars(pi_key, img_data['jars'])
+                patch_image.jars_digest = digest
+
+    def apply_security_issues(self, image_key, issues):
+        keys = []
+        for issue_data in issues:
+            fields = security_issue_fields(issue_data)
+            if fields is None:
+                # Skip incomplete entries
+                continue
+
+            key = security_issue_hash(*fields)
+            issue = self.issues.get(key)
+            if issue is None:
+                issue = self.issues[key] = SecurityIssue(
+                    **dict(zip(SECURITY_ISSUE_KEY, fields)), natural_key_hash=key,
+                    affected_libraries_hash=library_hash(fields[-1]),
+                )
+            issue.library_path = issue_data.get('library_path', '')
+            issue.description = issue_data.get('Description', '')
+            issue.is_deleted = False
+            self.touched_issues[key] = issue
+            keys.append(key)
+        self.image_issues[image_key] = keys
+
+    def apply_jars(self, pi_key, jars):
+        for jar_data in jars:
+            jar_name = jar_data.get('Name')
+            if not jar_name:
+                continue
+            fields = self.patch_image_jars.setdefault((pi_key, jar_name), {})
+            if 'Version' in jar_data:
+                fields['current_version'] = jar_data['Version']
+            if 'updated' in jar_data:
+                fields['updated'] = jar_data['updated']
+            if 'remarks' in jar_data:
+                fields['remarks'] = jar_data['remarks']
+
+    # -- 3. write -----------------------------------------------------
+
+    def write(self):
+        now = timezone.now()
+        self.write_security_issues(now)
+        self.write_images(now)
+        self.write_image_security_issues()
+        self.write_patch_images()
+        self.write_patch_image_jars()
+        self.write_helm_charts()
+
+        mark_changed(patch_names={p['name'] for p in self.payload}
+                     | {image.build_number for image in self.new_images},
+                     image_ids=[self.images[image_key].pk for image_key in self.image_issues])
+
+    def write_security_issues(self, now):
+        existing, new = [], []
+        for issue in self.touched_issues.values():
+            issue.updated_at = now
+            (existing if issue.pk is not None else new).append(issue)
+
+        SecurityIssue.objects.bulk_update(existing, SECURITY_ISSUE_FIELDS, batch_size=CHUNK_SIZE)
+        SecurityIssue.objects.bulk_create(
+            new,
+            update_conflicts=True,
+            unique_fields=['natural_key_hash'],
+            update_fields=SECURITY_ISSUE_FIELDS,
+            batch_size=CHUNK_SIZE,
+        )
+        # An upsert that hit a conflict does not hand back the existing pk.
+        pending = {i.natural_key_hash: i for i in new if i.pk is None}
+        for chunk in chunked(pending):
+            for pk, key in SecurityIssue.objects.filter(natural_key_hash__in=chunk).values_list('pk', 'natural_key_hash'):
+                pending[key].pk = pk
+
+    def write_images(self, now):
+        existing = list(self.touched_images.values())
+        for image in existing:
+            image.updated_at = now
+        Image.objects.bulk_update(
+            existing, ['twistlock_report_url', 'twistlock_report_clean', 'updated_at'],
+            batch_size=CHUNK_SIZE,
+        )
+        Image.objects.bulk_create(self.new_images, batch_size=CHUNK_SIZE)
+
+    def write_image_security_issues(self):
+        if not self.image_issues:
+            return
+        through = Image.security_issues.through
+        wanted = {
+            self.images[image_key].pk: {self.issues[key].pk for key in keys}
+            for image_key, keys in self.image_issues.items()
+        }
+
+        stale, current = [], {}
+        for ids in chunked(wanted):
+            rows = through.objects.filter(image_id__in=ids).values_list('id', 'image_id', 'securityissue_id')
+            for link_id, image_id, issue_id in rows:
+                if issue_id in wanted[image_id]:
+                    current.setdefault(image_id, set()).add(issue_id)
+                else:
+                    stale.append(link_id)
+
+        for ids in chunked(stale):
+            through.objects.filter(id__in=ids).delete()
+        # Digests stored on PatchImages of these images that this payload did
+        # not touch no longer describe the image's set.
+        touched = [
+            pi.pk for image_key in self.image_issues
+            for pi in self.image_patch_images[image_key].values() if pi.pk is not None
+        ]
+        for ids in chunked(wanted):
+            (PatchImage.objects.filter(image_id__in=ids).exclude(id__in=touched)
+             .exclude(security_issues_digest='').update(security_issues_digest=''))
+        through.objects.bulk_create(
+            [
+                through(image_id=image_id, securityissue_id=issue_id)
+                for image_id, issue_ids in wanted.items()
+                for issue_id in issue_ids - current.get(image_id, set())
+            ],
+            ignore_conflicts=True,
+            batch_size=CHUNK_SIZE,
+        )
+
+    def write_patch_images(self):
+        existing, new = [], []
+        for (_, image_key), patch_image in self.touched_patch_images.items():
+            if patch_image.pk is not None:
+                existing.append(patch_image)
+            else:
+                patch_image.image_id = self.images[image_key].pk
+                new.append(patch_image)
+
+        PatchImage.objects.bulk_update(
+            existing,
+            ['ot2_pass', 'registry', 'patch_build_number', 'lock', 'security_issues_digest', 'jars_digest'],
+            batch_size=CHUNK_SIZE,
+        )
+        PatchImage.objects.bulk_create(new, batch_size=CHUNK_SIZE)
+
+    def write_patch_image_jars(self):
+        if not self.patch_image_jars:
+            return
+        jar_names.ensure(jar_name for _, jar_name in self.patch_image_jars)
+
+        # One upsert per distinct set of provided fields, so rows only
+        # overwrite the columns their payload entry actually sent.
+        groups = {}
+        for (pi_key, jar_name), fields in self.patch_image_jars.items():
+            groups.setdefault(tuple(sorted(fields)), []).append(
+                PatchImageJar(patch_image_id=self.patch_images[pi_key].pk, jar_id=jar_name, **fields)
+            )
+        for field_names, rows in groups.items():
+            if field_names:
+                PatchImageJar.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['patch_image', 'jar'],
+                    update_fields=field_names,
+                    batch_size=CHUNK_SIZE,
+                )
+            else:
+                PatchImageJar.objects.bulk_create(rows, ignore_conflicts=True, batch_size=CHUNK_SIZE)
+
+    def write_helm_charts(self):
+        existing, new = [], []
+        for (patch_name, product_name), value in self.helm_charts.items():
+            rows = self.existing_helm_charts.get((patch_name, product_name))
+            if rows:
+                for row in rows:
+                    row.helm_charts = value
+                existing.extend(rows)
+            else:
+                new.append(PatchProductHelmChart(patch_id=patch_name, product_id=product_name, helm_charts=value))
+
+        PatchProductHelmChart.objects.bulk_update(existing, ['helm_charts'], batch_size=CHUNK_SIZE)
+        PatchProductHelmChart.objects.bulk_create(new, batch_size=CHUNK_SIZE)
+
+
+# -----------------------
+# Streaming NDJSON ingestion
+# -----------------------
+# Backs POST /patches/update-data/stream/. The body holds one record per line:
+#   {"patch": "<patch>", "product": "<product>", "image": {...}, "helm_charts": "..."}
+# where "image" is an image object exactly as nested in the update-data
+# payload and both "image" and "helm_charts" are optional. Lines are parsed
+# as they are read and written BATCH_SIZE records at a time, each batch in
+# its own transaction, so memory stays bounded by the batch size.
+
+BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+
+
+def record_error(record):
+    """Shape error of one NDJSON record, or None."""
+    if not isinstance(record, dict):
+        return "Record must be a JSON object."
+    for field in ('patch', 'product'):
+        if not record.get(field) or not isinstance(record[field], str):
+            return f"Field '{field}' is required."
+    image = record.get('image')
+    if image is not None:
+        if not isinstance(image, dict):
+            return "Field 'image' must be an object."
+        if not image.get('image_name') or not isinstance(image['image_name'], str):
+            return "Field 'image.image_name' is required."
+        # Sections the ingest walks entry by entry
+        for field in ('security_issues', 'jars'):
+            section = image.get(field)
+            if section is not None and not (
+                isinstance(section, list) and all(isinstance(entry, dict) for entry in section)
+            ):
+                return f"Field 'image.{field}' must be a list of objects."
+    return None
+
+
+def record_document(record):
+    """The update-data patch document equivalent to one NDJSON record."""
+    product = {'name': record['product']}
+    if record.get('image') is not None:
+        product['images'] = [record['image']]
+    if record.get('helm_charts') is not None:
+        product['helm_charts'] = record['helm_charts']
+    return {'name': record['patch'], 'products': [product]}
+
+
+def payload_documents(payload):
+    """Split an update-data payload into single-record patch documents, in payload order."""
+    for patch_data in payload:
+        for prod_data in patch_data.get('products', []):
+            for img_data in prod_data.get('images', []):
+                if img_data.get('image_name'):
+                    yield record_document({
+                        'patch': patch_data['name'], 'product': prod_data['name'], 'image': img_data,
+                    })
+            if prod_data.get('helm_charts') is not None:
+                yield record_document({
+                    'patch': patch_data['name'], 'product': prod_data['name'],
+                    'helm_charts': prod_data['helm_charts'],
+                })
+
+
+def ingest_batch(batch, skipped=None):
+    """
+    Write one batch of (line, record, error) tuples; yield a result per record,
+    in order. Skipped-section counts are added to `skipped` when given.
+    """
+    results = {}
+    documents = []
+    for line, record, error in batch:
+        error = error or record_error(record)
+        if error:
+            results[line] = {"line": line, "status": "error", "error": error}
+        else:
+            documents.append((line, record_document(record)))
+
+    accepted = []
+    try:
+        live_patches, live_products = live_names([doc for _, doc in documents])
+        for line, doc in documents:
+            product_name = doc['products'][0]['name']
+            if doc['name'] not in live_patches:
+                results[line] = {"line": line, "status": "error", "error": f"Patch '{doc['name']}' not found."}
+            elif product_name not in live_products:
+                results[line] = {"line": line, "status": "error", "error": f"Product '{product_name}' not found."}
+            else:
+                accepted.append((line, doc))
+
+        if accepted:
+            ingest = PatchDataIngest([doc for _, doc in accepted])
+            with transaction.atomic(), change_batch():
+                ingest.run(validate=False)
+    except Exception as e:
+        # The batch is all-or-nothing; earlier batches stay written and the
+        # stream carries on with the next one.
+        if not isinstance(e, (DatabaseError, ValidationError, ValueError, TypeError)):
+            logger.exception("Ingest batch starting at line %s failed", batch[0][0])
+        for line, _ in documents:
+            results.setdefault(line, {"line": line, "status": "error", "error": f"Batch rejected: {e}"})
+    else:
+        for line, _ in accepted:
+            results[line] = {"line": line, "status": "ok"}
+        if skipped is not None and accepted:
+            for section, count in ingest.skipped.items():
+                skipped[section] += count
+
+    for line, _, _ in batch:
+        yield results[line]
+
+
+def stream_ingest(lines, batch_size=BATCH_SIZE):
+    """
+    Ingest an iterable of NDJSON lines (bytes or str). Yields one result per
+    record followed by a closing {"summary": {...}}.
+    """
+    counts = {"records": 0, "ok": 0, "errors": 0}
+    skipped = {'security_issues': 0, 'jars': 0}
+    batch = []
+
+    def flush():
+        for result in ingest_batch(batch, skipped):
+            counts["records"] += 1
+            counts["ok" if result["status"] == "ok" else "errors"] += 1
+            yield result
+        batch.clear()
+
+    for line_no, raw in enumerate(lines, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            batch.append((line_no, json.loads(raw), None))
+        except ValueError as e:
+            batch.append((line_no, None, f"Invalid JSON: {e}"))
+        if len(batch) >= batch_size:
+            yield from flush()
+    if batch:
+        yield from flush()
+
+    yield {"summary": {**counts, "skipped": skipped}}
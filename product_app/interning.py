@@ -0,0 +1,85 @@
+import threading
+import time
+from functools import partial
+
+from django.db import transaction
+
+from .models import HighLevelScope, Jar
+
+# -----------------------
+# Jar / HighLevelScope name interning
+# -----------------------
+# Jar and HighLevelScope are name-keyed tables that every patch, ingest
+# payload and PatchImageJar refers to by name. NameCache keeps the set of
+# names known to exist in this process, so writers can point foreign keys
+# at jar_id=<name> without a get_or_create round trip per reference:
+#   * the first use (and every TTL seconds after) loads all names in one query,
+#   * ensure() creates every missing name of a batch in one bulk_create,
+#     after checking the cached ones still exist (another process may have
+#     deleted them; its delete signal only reaches its own cache),
+#   * names only enter the cache once the creating transaction commits,
+#   * deletes drop the name straight away (signals.py), covering
+#     JarViewSet / HighLevelScopeViewSet, the admin and cascades.
+
+CACHE_TTL = 300
+
+
+class NameCache:
+    def __init__(self, model, ttl=CACHE_TTL):
+        self.model = model
+        self.ttl = ttl
+        self._names = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _known(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._names = set(self.model.objects.values_list('name', flat=True))
+                self._loaded_at = time.monotonic()
+            return self._names
+
+    def exists(self, name):
+        if name in self._known():
+            return True
+        if self.model.objects.filter(name=name).exists():
+            self.add([name])
+            return True
+        return False
+
+    def ensure(self, names):
+        """
+        Make sure a row exists for every name; missing ones are created in one
+        statement. Call it in the transaction that writes the references.
+        """
+        names = {name for name in names if name}
+        # Cached names may have been deleted by another process since they
+        # were loaded; the ones this batch relies on are checked in the
+        # writing transaction, and stale ones are created again.
+        cached = names & self._known()
+        present = set(self.model.objects.filter(name__in=cached).values_list('name', flat=True)) if cached else set()
+        for name in cached - present:
+            self.discard(name)
+        missing = names - present
+        if missing:
+            self.model.objects.bulk_create(
+                [self.model(name=name) for name in missing], ignore_conflicts=True,
+            )
+            transaction.on_commit(partial(self.add, missing))
+
+    def add(self, names):
+        with self._lock:
+            self._names.update(names)
+
+    def discard(self, name):
+        with self._lock:
+            self._names.discard(name)
+
+    def clear(self):
+        with self._lock:
+            self._names = set()
+            self._loaded_at = None
+
+
+jar_names = NameCache(Jar)
+scope_names = NameCache(HighLevelScope)
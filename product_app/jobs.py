@@ -0,0 +1,116 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .changes import change_batch
+from .ingest import BATCH_SIZE, IngestError, PatchDataIngest, chunked, payload_documents
+from .models import IngestJob
+
+logger = logging.getLogger(__name__)
+
+# -----------------------
+# Asynchronous ingestion jobs
+# -----------------------
+# update_patch_data?async=1 stores the payload as a queued IngestJob and
+# answers 202; `manage.py process_ingest_jobs` claims queued jobs and runs
+# them through the same PatchDataIngest engine. A job is validated as a
+# whole first (same errors as the synchronous endpoint), then written
+# BATCH_SIZE records at a time, one transaction per batch, with
+# processed_items advanced in the batch's own transaction.
+#
+# A claim is a lease: heartbeat_at is renewed with every batch, and a
+# 'running' job whose heartbeat is older than the lease timeout (its worker
+# died) is claimed again like a queued one and resumed after the last
+# committed batch. Every write of the holder is conditional on the
+# heartbeat it last wrote, so a worker that lost its lease stops without
+# writing anything further.
+
+LEASE_TIMEOUT = timedelta(minutes=10)
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def enqueue_ingest_job(payload, user=None):
+    return IngestJob.objects.create(payload=payload, created_by=user)
+
+
+def claimable(lease_timeout=LEASE_TIMEOUT):
+    return Q(status='queued') | Q(status='running', heartbeat_at__lt=timezone.now() - lease_timeout)
+
+
+def claim_next_job(lease_timeout=LEASE_TIMEOUT):
+    """
+    Atomically move the oldest queued (or abandoned running) job to 'running'
+    and return it (None if there is nothing to claim).
+    """
+    while True:
+        job = IngestJob.objects.filter(claimable(lease_timeout)).order_by('id').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        claimed = IngestJob.objects.filter(claimable(lease_timeout), pk=job.pk).update(
+            status='running', started_at=now, heartbeat_at=now,
+        )
+        if claimed:
+            job.refresh_from_db()
+            if job.processed_items:
+                logger.warning("Resuming abandoned ingest job %s after %s records", job.pk, job.processed_items)
+            return job
+        # Another worker got there first; try the next one.
+
+
+def _renew(job, **fields):
+    """Write `fields` and a new heartbeat, as long as `job` still holds its lease."""
+    now = timezone.now()
+    held = IngestJob.objects.filter(pk=job.pk, status='running', heartbeat_at=job.heartbeat_at).update(
+        heartbeat_at=now, **fields,
+    )
+    if not held:
+        raise LeaseLost(f"Ingest job {job.pk} was claimed by another worker")
+    job.heartbeat_at = now
+    for name, value in fields.items():
+        setattr(job, name, value)
+
+
+def _finish(job, status, error='', error_status=None):
+    _renew(job, status=status, error=error, error_status=error_status, finished_at=timezone.now())
+
+
+def run_ingest_job(job, batch_size=BATCH_SIZE):
+    try:
+        try:
+            PatchDataIngest(job.payload).validate()
+        except IngestError as e:
+            _finish(job, 'failed', error=e.message, error_status=e.status_code)
+            return job
+        except (AttributeError, TypeError) as e:
+            _finish(job, 'failed', error=f"Malformed payload: {e}", error_status=400)
+            return job
+
+        documents = list(payload_documents(job.payload))
+        # A reclaimed job carries on after its last committed batch
+        done = job.processed_items
+        _renew(job, total_items=len(documents))
+
+        try:
+            for batch in chunked(documents[done:], batch_size):
+                with transaction.atomic(), change_batch():
+                    PatchDataIngest(batch).run(validate=False)
+                    _renew(job, processed_items=job.processed_items + len(batch))
+        except LeaseLost:
+            raise
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job.pk)
+            _finish(job, 'failed', error=str(e))
+            return job
+
+        _finish(job, 'succeeded')
+    except LeaseLost:
+        logger.warning("Ingest job %s lost its lease; left to the worker that reclaimed it", job.pk)
+        job.refresh_from_db()
+    return job
@@ -0,0 +1,62 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from product_app.ingest import BATCH_SIZE, MAX_BATCH_SIZE
+from product_app.jobs import LEASE_TIMEOUT, claim_next_job, run_ingest_job
+
+
+class Command(BaseCommand):
+    help = 'Processes queued update_patch_data ingestion jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Number of jobs processed in parallel')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Records written per transaction')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of polling')
+        parser.add_argument(
+            '--lease-timeout', type=float, default=LEASE_TIMEOUT.total_seconds(),
+            help='Seconds without a heartbeat after which a running job is taken over; must exceed one batch',
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        batch_size = min(max(1, options['batch_size']), MAX_BATCH_SIZE)
+        lease_timeout = timedelta(seconds=options['lease_timeout'])
+        stop = threading.Event()
+
+        def worker():
+            try:
+                while not stop.is_set():
+                    job = claim_next_job(lease_timeout)
+                    if job is None:
+                        if options['once']:
+                            return
+                        stop.wait(options['poll_interval'])
+                        continue
+                    started = time.monotonic()
+                    run_ingest_job(job, batch_size=batch_size)
+                    message = (
+                        f'  Job #{job.pk} {job.status}: {job.processed_items}/{job.total_items} records '
+                        f'in {time.monotonic() - started:.1f}s'
+                    )
+                    if job.status == 'succeeded':
+                        self.stdout.write(self.style.SUCCESS(message))
+                    else:
+                        self.stdout.write(self.style.ERROR(f'{message} ({job.error})'))
+            finally:
+                connection.close()
+
+        self.stdout.write(f'Processing ingest jobs with {concurrency} worker(s)...')
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(worker) for _ in range(concurrency)]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                stop.set()
+                self.stdout.write('Stopping after the current jobs...')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from product_app.search import rebuild_search_index, search_index_supported
+
+
+class Command(BaseCommand):
+    help = 'Recreates the security issue full-text index and its sync triggers, and re-indexes every issue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias (default: "default")')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not search_index_supported(connections[using]):
+            raise CommandError('The full-text index is only available on SQLite.')
+        rows = rebuild_search_index(using)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {rows} security issue(s).'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0009_alter_customuser_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatchProductCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_items', models.PositiveIntegerField(default=0)),
+                ('completed_halves', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completion_rollups', to='product_app.patch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='product_app.product')),
+            ],
+            options={
+                'unique_together': {('patch', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0010_patchproductcompletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patch',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
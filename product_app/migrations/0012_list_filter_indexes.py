@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0011_patch_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='build_number',
+            field=models.CharField(db_index=True, default='1234', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='patch',
+            name='patch_state',
+            field=models.CharField(choices=[('new', 'New'), ('cancelled', 'Cancelled'), ('released', 'Released'), ('in_progress', 'In progress')], db_index=True, default='new', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='securityissue',
+            name='cvss_score',
+            field=models.FloatField(db_index=True, default=7.5),
+        ),
+        migrations.AlterField(
+            model_name='securityissue',
+            name='severity',
+            field=models.CharField(choices=[('Critical', 'Critical'), ('High', 'High'), ('Medium', 'Medium')], db_index=True, default='High', max_length=50),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0013_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patchimage',
+            name='jars_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='patchimage',
+            name='security_issues_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
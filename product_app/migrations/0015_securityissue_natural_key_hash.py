@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0014_patchimage_ingest_digests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='securityissue',
+            name='natural_key_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+    ]
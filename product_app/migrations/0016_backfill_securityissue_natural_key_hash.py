@@ -0,0 +1,44 @@
+import hashlib
+
+from django.db import migrations, transaction
+
+CHUNK_SIZE = 1000
+
+
+def security_issue_hash(cve_id, cvss_score, severity, affected_libraries):
+    # Frozen copy of models.security_issue_hash
+    raw = "\x1f".join([str(cve_id), repr(float(cvss_score)), str(severity), str(affected_libraries)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def backfill(apps, schema_editor):
+    SecurityIssue = apps.get_model('product_app', 'SecurityIssue')
+    last_pk = 0
+    while True:
+        # One transaction per chunk, walking the primary key, so a large
+        # table never holds a long write lock.
+        with transaction.atomic():
+            chunk = list(
+                SecurityIssue.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'cve_id', 'cvss_score', 'severity', 'affected_libraries')[:CHUNK_SIZE]
+            )
+            if not chunk:
+                return
+            for issue in chunk:
+                issue.natural_key_hash = security_issue_hash(
+                    issue.cve_id, issue.cvss_score, issue.severity, issue.affected_libraries
+                )
+            SecurityIssue.objects.bulk_update(chunk, ['natural_key_hash'])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('product_app', '0015_securityissue_natural_key_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
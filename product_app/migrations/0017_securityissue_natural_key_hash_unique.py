@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0016_backfill_securityissue_natural_key_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='securityissue',
+            name='natural_key_hash',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+        migrations.RemoveConstraint(
+            model_name='securityissue',
+            name='unique_security_issue',
+        ),
+    ]
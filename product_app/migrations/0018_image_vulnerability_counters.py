@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0017_securityissue_natural_key_hash_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='critical_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='high_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='max_cvss_score',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='medium_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 1000
+
+SEVERITY_COUNTERS = {
+    'critical_count': 'Critical',
+    'high_count': 'High',
+    'medium_count': 'Medium',
+}
+
+
+def backfill(apps, schema_editor):
+    # Frozen copy of counters.vulnerability_counters
+    Image = apps.get_model('product_app', 'Image')
+    links = Image.security_issues.through.objects.filter(image_id=OuterRef('pk')).values('image_id')
+    counters = {
+        field: Coalesce(
+            Subquery(links.filter(securityissue__severity=severity).annotate(n=Count('id')).values('n')),
+            Value(0),
+            output_field=IntegerField(),
+        )
+        for field, severity in SEVERITY_COUNTERS.items()
+    }
+    counters['max_cvss_score'] = Subquery(links.annotate(score=Max('securityissue__cvss_score')).values('score'))
+
+    last_pk = 0
+    while True:
+        # One transaction per chunk, walking the primary key, so a large
+        # table never holds a long write lock.
+        with transaction.atomic():
+            ids = list(Image.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:CHUNK_SIZE])
+            if not ids:
+                return
+            Image.objects.filter(pk__in=ids).update(**counters)
+        last_pk = ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('product_app', '0018_image_vulnerability_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
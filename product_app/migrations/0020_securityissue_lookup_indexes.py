@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0019_backfill_image_vulnerability_counters'),
+    ]
+
+    operations = [
+        # The auto-created image / security issue table indexes securityissue_id
+        # on its own; with image_id added, "which images carry issue X" is
+        # answered from the index alone.
+        migrations.RunSQL(
+            sql='CREATE INDEX product_app_image_security_issues_issue_image '
+                'ON product_app_image_security_issues (securityissue_id, image_id)',
+            reverse_sql='DROP INDEX product_app_image_security_issues_issue_image',
+        ),
+        migrations.AlterField(
+            model_name='securityissue',
+            name='affected_libraries',
+            field=models.TextField(db_index=True, default='Some Library'),
+        ),
+        migrations.AlterField(
+            model_name='securityissue',
+            name='cve_id',
+            field=models.CharField(db_index=True, default='CVE-1234', max_length=255),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:46
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0020_securityissue_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['build_number', 'product'], name='image_live_build_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['product', 'image_name'], name='image_live_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patch',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['release'], name='patch_live_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patch',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['patch_state'], name='patch_live_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patchimage',
+            index=models.Index(fields=['patch', 'image', 'lock'], name='patchimage_patch_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='product_name_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+import hashlib
+
+from django.db import migrations, models, transaction
+
+CHUNK_SIZE = 1000
+
+
+def library_hash(affected_libraries):
+    # Frozen copy of models.library_hash
+    return hashlib.sha256(str(affected_libraries).encode()).hexdigest()
+
+
+def backfill(apps, schema_editor):
+    SecurityIssue = apps.get_model('product_app', 'SecurityIssue')
+    last_pk = 0
+    while True:
+        # One transaction per chunk, walking the primary key, so a large
+        # table never holds a long write lock.
+        with transaction.atomic():
+            chunk = list(
+                SecurityIssue.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'affected_libraries')[:CHUNK_SIZE]
+            )
+            if not chunk:
+                return
+            for issue in chunk:
+                issue.affected_libraries_hash = library_hash(issue.affected_libraries)
+            SecurityIssue.objects.bulk_update(chunk, ['affected_libraries_hash'])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('product_app', '0021_index_suite'),
+    ]
+
+    operations = [
+        # A b-tree entry on the unbounded text fails for long values (and
+        # PostgreSQL adds a second, varchar_pattern_ops, index on top);
+        # ?library= lookups use a fixed-width hash of it instead.
+        migrations.AlterField(
+            model_name='securityissue',
+            name='affected_libraries',
+            field=models.TextField(default='Some Library'),
+        ),
+        migrations.AddField(
+            model_name='securityissue',
+            name='affected_libraries_hash',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
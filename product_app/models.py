@@ -1,9 +1,11 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from datetime import timedelta
+import hashlib
 
 defaults = settings.DEFAULTS
 
@@ -85,21 +87,53 @@ class HighLevelScope(models.Model):
 # SecurityIssue Model
 # -----------------------
 
+SECURITY_ISSUE_KEY = ('cve_id', 'cvss_score', 'severity', 'affected_libraries')
+
+
+def security_issue_hash(cve_id, cvss_score, severity, affected_libraries):
+    """
+    Fixed-width natural key of a SecurityIssue: sha256 over the four
+    identifying fields. cvss_score is normalised through float() so 7.5,
+    "7.5" and 7.50 hash alike, as they compare alike in the database.
+    """
+    raw = "\x1f".join([str(cve_id), repr(float(cvss_score)), str(severity), str(affected_libraries)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def library_hash(affected_libraries):
+    """Fixed-width lookup key of SecurityIssue.affected_libraries: its sha256."""
+    return hashlib.sha256(str(affected_libraries).encode()).hexdigest()
+
+
 class SecurityIssue(models.Model):
-    cve_id = models.CharField(max_length=255, default=defaults['security_issue']['cve_id'])
-    cvss_score = models.FloatField(default=defaults['security_issue']['cvss_score'])
-    severity = models.CharField(max_length=50, choices=[('Critical', 'Critical'), ('High', 'High'), ('Medium', 'Medium')], default=defaults['security_issue']['severity'])
+    cve_id = models.CharField(max_length=255, default=defaults['security_issue']['cve_id'], db_index=True)
+    cvss_score = models.FloatField(default=defaults['security_issue']['cvss_score'], db_index=True)
+    severity = models.CharField(max_length=50, choices=[('Critical', 'Critical'), ('High', 'High'), ('Medium', 'Medium')], default=defaults['security_issue']['severity'], db_index=True)
     affected_libraries = models.TextField(default=defaults['security_issue']['affected_libraries'])
     library_path = models.CharField(max_length=500, blank=True, default=defaults['security_issue']['library_path'])
     description = models.TextField(default="Security issue description")
     created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)
+    # security_issue_hash() of the four identifying fields; the unique key
+    # every natural-key lookup goes through. Kept in step by save().
+    natural_key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    # library_hash() of affected_libraries. ?library= lookups go through this
+    # bounded index; the text itself can be longer than a b-tree entry may be.
+    # Kept in step by save().
+    affected_libraries_hash = models.CharField(max_length=64, db_index=True, editable=False)
     # objects = SoftDeleteManager()
-    class Meta:
-        constraints = [
-            models.UniqueConstraint(fields=['cve_id', 'cvss_score', 'severity', 'affected_libraries'], name='unique_security_issue')
-        ]
+
+    def save(self, *args, **kwargs):
+        self.natural_key_hash = security_issue_hash(
+            self.cve_id, self.cvss_score, self.severity, self.affected_libraries
+        )
+        self.affected_libraries_hash = library_hash(self.affected_libraries)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(SECURITY_ISSUE_KEY):
+            kwargs['update_fields'] = {*update_fields, 'natural_key_hash', 'affected_libraries_hash'}
+        super().save(*args, **kwargs)
+
     def soft_delete(self):
         self.is_deleted = True
         self.save()
@@ -126,6 +160,12 @@ class Product(models.Model):
     # Add the ManyToManyField with through here
     security_issues = models.ManyToManyField(SecurityIssue, through='ProductSecurityIssue', related_name='products')
 
+    class Meta:
+        indexes = [
+            # case-insensitive name lookups (PatchesByProductView)
+            models.Index(Lower('name'), name='product_name_lower_idx'),
+        ]
+
     def soft_delete(self):
         self.is_deleted = True
         self.save()
@@ -146,7 +186,7 @@ class Product(models.Model):
 class Image(models.Model):
     product = models.ForeignKey('Product', related_name='images', on_delete=models.CASCADE)
     image_name = models.CharField(default=defaults['image']['image_name'], max_length=255)
-    build_number = models.CharField(max_length=100, default=defaults['image']['build_number'])
+    build_number = models.CharField(max_length=100, default=defaults['image']['build_number'], db_index=True)
     release_date = models.DateField(default=defaults['release']['release_date'])
     twistlock_report_url = models.URLField(default=defaults['image']['twistlock_report_url'], null=True, blank=True)
     twistlock_report_clean = models.BooleanField(default=True, null=True, blank=True)
@@ -156,11 +196,21 @@ class Image(models.Model):
     created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)
+    # Kept in step with security_issues (see counters.py)
+    critical_count = models.PositiveIntegerField(default=0, editable=False)
+    high_count = models.PositiveIntegerField(default=0, editable=False)
+    medium_count = models.PositiveIntegerField(default=0, editable=False)
+    max_cvss_score = models.FloatField(null=True, blank=True, editable=False)
     # objects = SoftDeleteManager()
 
     
     class Meta:
         unique_together = ('image_name', 'build_number')
+        # Live images only; image_name lookups use the unique key above
+        indexes = [
+            models.Index(fields=['build_number', 'product'], condition=models.Q(is_deleted=False), name='image_live_build_idx'),
+            models.Index(fields=['product', 'image_name'], condition=models.Q(is_deleted=False), name='image_live_product_idx'),
+        ]
 
     def twistlock_status(self):
         if self.twistlock_report_clean:
@@ -275,7 +325,7 @@ class Patch(models.Model):
     security_issues = models.CharField(max_length=500, blank=True)
 
 
-    patch_state = models.CharField(max_length=20, choices=PATCH_STATE_CHOICES, default='new')
+    patch_state = models.CharField(max_length=20, choices=PATCH_STATE_CHOICES, default='new', db_index=True)
     
     products = models.ManyToManyField(
         Product, 
@@ -301,8 +351,27 @@ class Patch(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)
+    # bumped on every change to the patch document (see changes.py); used as ETag
+    version = models.PositiveIntegerField(default=0, editable=False)
     # objects = SoftDeleteManager()
 
+    class Meta:
+        # PatchViewSet lists live patches only
+        indexes = [
+            models.Index(fields=['release'], condition=models.Q(is_deleted=False), name='patch_live_release_idx'),
+            models.Index(fields=['patch_state'], condition=models.Q(is_deleted=False), name='patch_live_state_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # version only ever moves in the database (F('version') + 1, see
+        # changes.py). Writing back the value loaded with this instance
+        # would undo bumps made since, so updates leave the column alone.
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'version']
+        super().save(*args, **kwargs)
 
     def soft_delete(self):
         self.is_deleted = True
@@ -368,6 +437,17 @@ class PatchImage(models.Model):
     patch_build_number = models.CharField(max_length=50, blank=True, null=True)
     #always lock changes from false → true whenever image is released into ot2paas or registry(defined in save() method).
     lock = models.BooleanField(default=False)
+    # sha256 of the security_issues / jars sections last ingested through
+    # update_patch_data; unchanged sections are skipped on the next ingest.
+    # Cleared whenever those rows are edited any other way (see signals.py).
+    security_issues_digest = models.CharField(max_length=64, blank=True, default='', editable=False)
+    jars_digest = models.CharField(max_length=64, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # (patch, image) lookups, and a patch's locked images from the index alone
+            models.Index(fields=['patch', 'image', 'lock'], name='patchimage_patch_image_idx'),
+        ]
 
 
 class PatchProductHelmChart(models.Model):
@@ -383,6 +463,55 @@ class PatchProductHelmChart(models.Model):
     )
 
 
+# -----------------------
+# PatchProductCompletion Model
+# -----------------------
+# Denormalized completion rollup per (patch, product), kept in step with
+# PatchImage / PatchImageJar / PatchJar writes (see completion.py / signals.py).
+class PatchProductCompletion(models.Model):
+    patch = models.ForeignKey(Patch, on_delete=models.CASCADE, related_name='completion_rollups')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    total_items = models.PositiveIntegerField(default=0)
+    completed_halves = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('patch', 'product')
+
+    def __str__(self):
+        return f"{self.patch_id} - {self.product_id}: {self.completed_halves}/{2 * self.total_items}"
+
+
+# -----------------------
+# IngestJob Model
+# -----------------------
+# Queued update_patch_data payloads, processed by the process_ingest_jobs
+# management command (see jobs.py).
+class IngestJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    payload = models.JSONField()
+    total_items = models.PositiveIntegerField(default=0)
+    processed_items = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    error_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Renewed by the worker holding the job after every batch; a 'running'
+    # job whose heartbeat is older than the lease timeout is claimed again.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Ingest job #{self.pk} ({self.status})"
+
 
 class ProductSecurityIssue(models.Model):
     # patch = models.ForeignKey('Patch', on_delete=models.CASCADE)  # NEW
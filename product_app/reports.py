@@ -0,0 +1,254 @@
+from collections import Counter
+
+from django.db import connection
+
+from .counters import SEVERITY_COUNTERS
+from .ingest import chunked
+from .models import Image, Patch, Product, ProductSecurityIssue, SecurityIssue
+
+# -----------------------
+# Security report engine
+# -----------------------
+# Reports cover a list of (image_name, build_number) pairs, often a thousand
+# or more. Instead of OR-ing one condition per pair, each chunk of pairs is
+# bound as a VALUES list and joined against Image (unique on the pair). The
+# severity summary sums the images' vulnerability counters (counters.py) and
+# counts the links of any other severity (ingest stores whatever the scanner
+# sent) with a GROUP BY; issue details are joined in through the image /
+# security issue table. Pairs must be distinct so no image is counted twice
+# across chunks.
+
+
+def _report_query(pairs, select, tail='', issues=False, params=()):
+    qn = connection.ops.quote_name
+    through = Image.security_issues.through._meta
+    image, issue = Image._meta, SecurityIssue._meta
+    values = ', '.join(['(%s, %s)'] * len(pairs))
+    sql = (
+        f"WITH wanted (image_name, build_number) AS (VALUES {values}) "
+        f"SELECT {select} FROM wanted "
+        f"JOIN {qn(image.db_table)} i ON i.image_name = wanted.image_name "
+        f"AND i.build_number = wanted.build_number "
+    )
+    if issues:
+        sql += (
+            f"JOIN {qn(through.db_table)} link ON link.{qn(through.get_field('image').column)} = i.id "
+            f"JOIN {qn(issue.db_table)} s ON s.id = link.{qn(through.get_field('securityissue').column)} "
+        )
+    sql += tail
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for pair in pairs for value in pair] + list(params))
+        return cursor.fetchall()
+
+
+def severity_counts(pairs):
+    """{severity: number of (image, security issue) links} over the given pairs."""
+    counts = Counter()
+    select = ', '.join(f'SUM(i.{field})' for field in SEVERITY_COUNTERS)
+    counted = list(SEVERITY_COUNTERS.values())
+    uncounted = f"WHERE s.severity NOT IN ({', '.join(['%s'] * len(counted))}) GROUP BY s.severity"
+    for chunk in chunked(pairs):
+        (sums,) = _report_query(chunk, select)
+        for severity, count in zip(counted, sums):
+            counts[severity] += count or 0
+        for severity, count in _report_query(chunk, 's.severity, COUNT(*)', uncounted, issues=True, params=counted):
+            counts[severity] += count
+    return {severity: count for severity, count in counts.items() if count}
+
+
+def image_security_issues(pairs):
+    """{(image_name, build_number): [{cve_id, severity, description}, ...]} for the given pairs."""
+    issues = {}
+    for chunk in chunked(pairs):
+        rows = _report_query(
+            chunk,
+            'i.image_name, i.build_number, s.cve_id, s.severity, s.description',
+            'ORDER BY s.id',
+            issues=True,
+        )
+        for image_name, build_number, cve_id, severity, description in rows:
+            issues.setdefault((image_name, build_number), []).append(
+                {"cve_id": cve_id, "severity": severity, "description": description}
+            )
+    return issues
+
+
+# -----------------------
+# CVE impact
+# -----------------------
+# "Where are we exposed to CVE-X?": every live image build linked to the
+# matching security issues, with its product, patch and release and the
+# product's triage note for that patch. Each step is one indexed lookup
+# (SecurityIssue.cve_id / affected_libraries, the issue side of the image /
+# security issue table, then the images' patches and triage rows), so the
+# answer costs a fixed number of queries.
+
+
+def cve_exposure(queryset):
+    """
+    Exposure report for the security issues in `queryset`, or None if it
+    matches nothing. Deleted images, products and patches are left out.
+    """
+    issues = {
+        row['id']: row
+        for row in queryset.order_by('pk').values('id', 'cve_id', 'cvss_score', 'severity', 'affected_libraries')
+    }
+    if not issues:
+        return None
+
+    links = (
+        Image.security_issues.through.objects
+        .filter(securityissue_id__in=issues, image__is_deleted=False, image__product__is_deleted=False)
+        .order_by('image__product_id', 'image__image_name', 'image__build_number', 'securityissue_id')
+        .values_list('securityissue_id', 'image_id', 'image__image_name', 'image__build_number', 'image__product_id')
+    )
+    images = {}
+    for issue_id, image_id, image_name, build_number, product_name in links:
+        image = images.setdefault(image_id, {
+            "image_name": image_name, "build_number": build_number, "product": product_name,
+            "patch": None, "release": None, "security_issues": [],
+        })
+        image["security_issues"].append(issue_id)
+
+    # An image belongs to the patch named by its build number
+    build_numbers = {image["build_number"] for image in images.values()}
+    patches, deleted_patches = {}, set()
+    for name, release, is_deleted in (
+        Patch.objects.filter(name__in=build_numbers).values_list('name', 'release_id', 'is_deleted')
+    ):
+        if is_deleted:
+            deleted_patches.add(name)
+        else:
+            patches[name] = release
+    triage = {
+        (patch_name, product_name, issue_id): description
+        for patch_name, product_name, issue_id, description in (
+            ProductSecurityIssue.objects
+            .filter(security_issue_id__in=issues, patch_id__in=patches)
+            .values_list('patch_id', 'product_id', 'security_issue_id', 'product_security_des')
+        )
+    }
+
+    for image in images.values():
+        if image["build_number"] in patches:
+            image["patch"] = image["build_number"]
+            image["release"] = patches[image["build_number"]]
+        image["security_issues"] = [
+            {
+                **{k: v for k, v in issues[issue_id].items() if k != 'id'},
+                "product_security_des": triage.get((image["patch"], image["product"], issue_id)),
+            }
+            for issue_id in image["security_issues"]
+        ]
+
+    exposed = [image for image in images.values() if image["build_number"] not in deleted_patches]
+    return {
+        "security_issues": [{k: v for k, v in row.items() if k != 'id'} for row in issues.values()],
+        "releases": sorted({image["release"] for image in exposed if image["release"]}),
+        "patches": sorted({image["patch"] for image in exposed if image["patch"]}),
+        "products": sorted({image["product"] for image in exposed}),
+        "images": exposed,
+    }
+
+
+# -----------------------
+# Vulnerability diff
+# -----------------------
+# "What did we fix since the last build / patch?": the security issue sets
+# of two sides are compared per image name. Each side is a set of images
+# (one build, or every live image of a patch), tagged 0 ("from") or 1
+# ("to"); grouping the image / security issue links by (image_name, issue)
+# in the database gives MIN/MAX side 0/0 = resolved, 1/1 = added and
+# 0/1 = unchanged, so neither side is ever loaded as a whole.
+
+
+def _build_sides(image_name, from_build, to_build):
+    sql = (
+        f"SELECT id AS image_id, image_name, build_number, product_id, "
+        f"CASE WHEN build_number = %s THEN 0 ELSE 1 END AS side "
+        f"FROM {connection.ops.quote_name(Image._meta.db_table)} "
+        f"WHERE image_name = %s AND build_number IN (%s, %s)"
+    )
+    return sql, [from_build, image_name, from_build, to_build]
+
+
+def _patch_sides(from_patch, to_patch):
+    # A patch's images are its builds (build_number = patch name), as in
+    # ProductSerializer and cve_exposure; PatchProductImage links are not
+    # written by update-data ingest.
+    qn = connection.ops.quote_name
+    sql = (
+        f"SELECT i.id AS image_id, i.image_name, i.build_number, i.product_id, "
+        f"CASE WHEN i.build_number = %s THEN 0 ELSE 1 END AS side "
+        f"FROM {qn(Image._meta.db_table)} i "
+        f"JOIN {qn(Product._meta.db_table)} p ON p.name = i.product_id "
+        f"WHERE i.build_number IN (%s, %s) AND i.is_deleted = %s AND p.is_deleted = %s"
+    )
+    return sql, [from_patch, from_patch, to_patch, False, False]
+
+
+def _diff(sides, sides_params):
+    qn = connection.ops.quote_name
+    through = Image.security_issues.through._meta
+    issue = SecurityIssue._meta
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH sides AS ({sides}) "
+            f"SELECT side, image_name, build_number, product_id FROM sides "
+            f"ORDER BY image_name, side, image_id",
+            sides_params,
+        )
+        image_rows = cursor.fetchall()
+        cursor.execute(
+            f"WITH sides AS ({sides}) "
+            f"SELECT sides.image_name, MIN(sides.side), MAX(sides.side), "
+            f"s.cve_id, s.severity, s.cvss_score, s.affected_libraries "
+            f"FROM sides "
+            f"JOIN {qn(through.db_table)} link ON link.{qn(through.get_field('image').column)} = sides.image_id "
+            f"JOIN {qn(issue.db_table)} s ON s.id = link.{qn(through.get_field('securityissue').column)} "
+            f"WHERE s.is_deleted = %s "
+            f"GROUP BY sides.image_name, s.id, s.cve_id, s.severity, s.cvss_score, s.affected_libraries "
+            f"ORDER BY sides.image_name, s.cve_id, s.id",
+            sides_params + [False],
+        )
+        issue_rows = cursor.fetchall()
+
+    images = {}
+    for side, image_name, build_number, product_name in image_rows:
+        image = images.setdefault(image_name, {
+            "image_name": image_name, "product": product_name, "from_build": None, "to_build": None,
+            "added": [], "resolved": [], "unchanged": [], "severity_delta": Counter(),
+        })
+        key = 'to_build' if side else 'from_build'
+        if image[key] is None:
+            image[key] = build_number
+
+    status = {(0, 0): 'resolved', (1, 1): 'added', (0, 1): 'unchanged'}
+    for image_name, first_side, last_side, cve_id, severity, cvss_score, affected_libraries in issue_rows:
+        image = images[image_name]
+        change = status[(first_side, last_side)]
+        image[change].append({
+            "cve_id": cve_id, "severity": severity, "cvss_score": cvss_score,
+            "affected_libraries": affected_libraries,
+        })
+        if change != 'unchanged':
+            image["severity_delta"][severity] += 1 if change == 'added' else -1
+
+    summary = {"added": 0, "resolved": 0, "unchanged": 0, "severity_delta": Counter()}
+    for image in images.values():
+        for change in ('added', 'resolved', 'unchanged'):
+            summary[change] += len(image[change])
+        summary["severity_delta"].update(image["severity_delta"])
+        image["severity_delta"] = {k: v for k, v in image["severity_delta"].items() if v}
+    summary["severity_delta"] = {k: v for k, v in summary["severity_delta"].items() if v}
+    return {"summary": summary, "images": list(images.values())}
+
+
+def build_vulnerability_diff(image_name, from_build, to_build):
+    """Diff of the security issues of two builds of one image."""
+    return _diff(*_build_sides(image_name, from_build, to_build))
+
+
+def patch_vulnerability_diff(from_patch, to_patch):
+    """Diff of the security issues of every live image in two patches, per image name."""
+    return _diff(*_patch_sides(from_patch, to_patch))
@@ -0,0 +1,172 @@
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import ProductSecurityIssue, SecurityIssue
+
+# -----------------------
+# Security issue full-text search
+# -----------------------
+# On SQLite, an FTS5 table mirrors the searchable text of every SecurityIssue
+# (cve_id, description, affected_libraries, library_path) plus the triage
+# notes of its ProductSecurityIssue rows, keyed by the issue id (rowid).
+# Triggers on both tables keep it in sync on every write, bulk or not.
+#
+# The table is derived data, so it is installed by install_search_index()
+# after every `migrate` rather than by a migration: rebuilding a table on
+# SQLite (any AlterField) drops its triggers, and this puts them back and
+# re-indexes. `manage.py rebuild_security_search` does the same on demand.
+# Other databases fall back to icontains lookups.
+
+FTS_TABLE = 'product_app_securityissue_fts'
+ISSUE_TABLE = SecurityIssue._meta.db_table
+TRIAGE_TABLE = ProductSecurityIssue._meta.db_table
+
+SEARCH_FIELDS = ('cve_id', 'description', 'affected_libraries', 'library_path')
+# bm25() weights, in FTS column order: an id or library hit outranks prose
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0, 2.0, 1.0)
+
+_TRIAGE_TEXT = (
+    f"COALESCE((SELECT group_concat(product_security_des, ' ') FROM {TRIAGE_TABLE} "
+    f"WHERE security_issue_id = {{issue_id}}), '')"
+)
+
+_TRIGGERS = {
+    f'{FTS_TABLE}_issue_insert': f"""
+        AFTER INSERT ON {ISSUE_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}, product_security_des)
+            VALUES (new.id, {', '.join(f'new.{f}' for f in SEARCH_FIELDS)}, {_TRIAGE_TEXT.format(issue_id='new.id')});
+        END""",
+    f'{FTS_TABLE}_issue_update': f"""
+        AFTER UPDATE OF {', '.join(SEARCH_FIELDS)} ON {ISSUE_TABLE} BEGIN
+            UPDATE {FTS_TABLE} SET {', '.join(f'{f} = new.{f}' for f in SEARCH_FIELDS)}
+            WHERE rowid = new.id;
+        END""",
+    f'{FTS_TABLE}_issue_delete': f"""
+        AFTER DELETE ON {ISSUE_TABLE} BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        END""",
+    f'{FTS_TABLE}_triage_insert': f"""
+        AFTER INSERT ON {TRIAGE_TABLE} BEGIN
+            UPDATE {FTS_TABLE} SET product_security_des = {_TRIAGE_TEXT.format(issue_id='new.security_issue_id')}
+            WHERE rowid = new.security_issue_id;
+        END""",
+    f'{FTS_TABLE}_triage_update': f"""
+        AFTER UPDATE OF product_security_des, security_issue_id ON {TRIAGE_TABLE} BEGIN
+            UPDATE {FTS_TABLE} SET product_security_des = {_TRIAGE_TEXT.format(issue_id='old.security_issue_id')}
+            WHERE rowid = old.security_issue_id;
+            UPDATE {FTS_TABLE} SET product_security_des = {_TRIAGE_TEXT.format(issue_id='new.security_issue_id')}
+            WHERE rowid = new.security_issue_id;
+        END""",
+    f'{FTS_TABLE}_triage_delete': f"""
+        AFTER DELETE ON {TRIAGE_TABLE} BEGIN
+            UPDATE {FTS_TABLE} SET product_security_des = {_TRIAGE_TEXT.format(issue_id='old.security_issue_id')}
+            WHERE rowid = old.security_issue_id;
+        END""",
+}
+
+
+def search_index_supported(conn=connection):
+    return conn.vendor == 'sqlite'
+
+
+def install_search_index(using='default', **kwargs):
+    """
+    Creates the FTS table and its triggers where missing, and re-indexes when
+    anything had to be created. Connected to post_migrate.
+    """
+    conn = connections[using]
+    if not search_index_supported(conn):
+        return
+    tables = set(conn.introspection.table_names())
+    if ISSUE_TABLE not in tables or TRIAGE_TABLE not in tables:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f'{FTS_TABLE}%'],
+        )
+        existing = {name for (name,) in cursor.fetchall()}
+    if existing >= {FTS_TABLE, *_TRIGGERS}:
+        return
+    rebuild_search_index(using)
+
+
+def rebuild_search_index(using='default'):
+    """(Re)creates the FTS table and its triggers and re-indexes every issue."""
+    conn = connections[using]
+    with transaction.atomic(using=using), conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(SEARCH_FIELDS)}, product_security_des)"
+        )
+        for name, body in _TRIGGERS.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}, product_security_des) "
+            f"SELECT id, {', '.join(SEARCH_FIELDS)}, {_TRIAGE_TEXT.format(issue_id=f'{ISSUE_TABLE}.id')} "
+            f"FROM {ISSUE_TABLE}"
+        )
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def fts_query(text):
+    """Turns free text into an FTS5 query: every word must match, as a prefix."""
+    terms = text.split()
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_security_issues(text, severities=(), cvss_min=None, cvss_max=None, limit=50):
+    """
+    [(SecurityIssue, score)] for the non-deleted issues matching `text`, best
+    match first (score is the bm25 rank, lower is better; None when the
+    database has no search index).
+    """
+    if not search_index_supported():
+        filters = Q(is_deleted=False)
+        if severities:
+            filters &= Q(severity__in=severities)
+        if cvss_min is not None:
+            filters &= Q(cvss_score__gte=cvss_min)
+        if cvss_max is not None:
+            filters &= Q(cvss_score__lte=cvss_max)
+        for term in text.split():
+            term_filter = Q(productsecurityissue__product_security_des__icontains=term)
+            for field in SEARCH_FIELDS:
+                term_filter |= Q(**{f'{field}__icontains': term})
+            filters &= term_filter
+        issues = SecurityIssue.objects.filter(filters).distinct().order_by('cve_id', 'pk')[:limit]
+        return [(issue, None) for issue in issues]
+
+    where, params = [f"{FTS_TABLE} MATCH %s", "s.is_deleted = %s"], [fts_query(text), False]
+    if severities:
+        where.append(f"s.severity IN ({', '.join(['%s'] * len(severities))})")
+        params.extend(severities)
+    if cvss_min is not None:
+        where.append("s.cvss_score >= %s")
+        params.append(cvss_min)
+    if cvss_max is not None:
+        where.append("s.cvss_score <= %s")
+        params.append(cvss_max)
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT s.id, bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} "
+            f"JOIN {ISSUE_TABLE} s ON s.id = {FTS_TABLE}.rowid "
+            # an exact CVE id always comes first
+            f"WHERE {' AND '.join(where)} ORDER BY s.cve_id = %s DESC, score LIMIT %s",
+            params + [text, limit],
+        )
+        ranked = cursor.fetchall()
+
+    issues = SecurityIssue.objects.in_bulk([pk for pk, _ in ranked])
+    return [(issues[pk], score) for pk, score in ranked if pk in issues]
+
+
+def filter_matching(queryset, text):
+    """Narrows a SecurityIssue queryset to the issues whose indexed text matches `text`."""
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_query(text)]
+    ))
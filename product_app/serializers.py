@@ -1,9 +1,66 @@
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Min, Prefetch, Q, prefetch_related_objects
 from rest_framework import serializers
-from .models import Release, Patch, Product, Image, Jar, HighLevelScope, SecurityIssue, PatchJar, PatchHighLevelScope, PatchProductImage,PatchImage,ProductSecurityIssue,PatchProductHelmChart,ReleaseProductImage
+from .models import Release, Patch, Product, Image, Jar, HighLevelScope, SecurityIssue, PatchJar, PatchHighLevelScope, PatchProductImage,PatchImage,ProductSecurityIssue,PatchProductHelmChart,ReleaseProductImage,IngestJob, SECURITY_ISSUE_KEY, library_hash, security_issue_hash
 from django.contrib.auth import get_user_model
 from rest_framework.exceptions import AuthenticationFailed
+from .changes import change_batch, mark_changed
+from .interning import jar_names, scope_names
+
+def _csv(value):
+    return {part.strip() for part in (value or '').split(',') if part.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Lets GET requests trim a serializer's output:
+
+      ?fields=name,patch_state   only these fields (plus anything in ?expand=)
+      ?expand=products           keep only the listed heavy fields
+                                 (Meta.expandable_fields); an empty ?expand=
+                                 drops all of them
+
+    Without either parameter the full document is returned, as before.
+    Only the top-level serializer (or each item of a top-level list) is trimmed.
+    """
+
+    @classmethod
+    def selected_fields(cls, request, field_names=None):
+        """The field names to render for `request`, or None for all of them."""
+        if request is None or request.method != 'GET':
+            return None
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+
+        expand = _csv(params.get('expand'))
+        if 'fields' in params:
+            return _csv(params['fields']) | expand
+
+        if field_names is None:
+            field_names = cls().fields.keys()
+        expandable = set(getattr(cls.Meta, 'expandable_fields', ()))
+        return {name for name in field_names if name not in expandable} | (expand & expandable)
+
+    @classmethod
+    def restrict_queryset(cls, queryset, request, always=()):
+        """.only() the columns the selected fields need (no-op for full documents)."""
+        selected = cls.selected_fields(request)
+        if selected is None:
+            return queryset
+        meta = cls.Meta.model._meta
+        columns = {f.name for f in meta.concrete_fields if f.name in selected}
+        return queryset.only(meta.pk.name, *columns, *always)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.root is self or self.root is self.parent:
+            selected = self.selected_fields(self.context.get('request'), fields.keys())
+            if selected is not None:
+                fields = {name: field for name, field in fields.items() if name in selected}
+        return fields
+
 
 class ReleaseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,10 +77,25 @@ class HighLevelScopeSerializer(serializers.ModelSerializer):
         model = HighLevelScope
         fields = '__all__'
 
-class SecurityIssueSerializer(serializers.ModelSerializer):
+class SecurityIssueSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SecurityIssue
-        fields = '__all__'
+        exclude = ['natural_key_hash', 'affected_libraries_hash']
+        expandable_fields = ['description', 'affected_libraries', 'library_path']
+
+    def validate(self, attrs):
+        # The natural key is unique through natural_key_hash, which DRF
+        # cannot derive a validator from.
+        key = [attrs.get(f, getattr(self.instance, f, None)) for f in SECURITY_ISSUE_KEY]
+        if None not in key:
+            duplicates = SecurityIssue.objects.filter(natural_key_hash=security_issue_hash(*key))
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError(
+                    f"The fields {', '.join(SECURITY_ISSUE_KEY)} must make a unique set.", code='unique'
+                )
+        return attrs
 
 
 class PatchContextSecurityIssueSerializer(serializers.ModelSerializer):
@@ -51,18 +123,40 @@ class PatchContextSecurityIssueSerializer(serializers.ModelSerializer):
         if not patch or not product:
             return ""
 
-        try:
-            psi = ProductSecurityIssue.objects.get(
-                patch=patch,
-                product=product,
-                security_issue=obj
-            )
-            return psi.product_security_des
-        except ProductSecurityIssue.DoesNotExist:
-            return ""
+        # All descriptions for the (patch, product) pair are loaded once and
+        # kept in the (shared) serializer context, not queried per CVE.
+        descriptions = preload_product_security_des(self.context, [(patch, product)])
+        return descriptions[(_pk(patch), _pk(product))].get(obj.pk, "")
 
 
-class ImageSerializer(serializers.ModelSerializer):
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def preload_product_security_des(context, pairs):
+    """
+    Loads ProductSecurityIssue descriptions for every (patch, product) pair
+    not already cached in `context`, in a single query, and returns the cache:
+    {(patch_name, product_name): {security_issue_id: product_security_des}}.
+    Pass the same context to every serializer of a request to share it.
+    """
+    cache = context.setdefault('product_security_des', {})
+    missing = {(_pk(patch), _pk(product)) for patch, product in pairs} - cache.keys()
+    if missing:
+        for key in missing:
+            cache[key] = {}
+        query = Q()
+        for patch_name, product_name in missing:
+            query |= Q(patch_id=patch_name, product_id=product_name)
+        rows = ProductSecurityIssue.objects.filter(query).values_list(
+            'patch_id', 'product_id', 'security_issue_id', 'product_security_des'
+        )
+        for patch_name, product_name, issue_id, description in rows:
+            cache[(patch_name, product_name)][issue_id] = description
+    return cache
+
+
+class ImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     security_issues = PatchContextSecurityIssueSerializer(many=True, read_only=True)
 
     # Write-only field
@@ -79,9 +173,11 @@ class ImageSerializer(serializers.ModelSerializer):
             'product', 'image_name', 'build_number', 'release_date',
             'twistlock_report_url', 'twistlock_report_clean',
             'created_at', 'updated_at', 'is_deleted', 'size', 'layers',
+            'critical_count', 'high_count', 'medium_count', 'max_cvss_score',
             'security_issues',
             'security_issue_ids',
         ]
+        expandable_fields = ['security_issues']
         
 
     # create/update methods 
@@ -178,6 +274,9 @@ class ProductSerializer(serializers.ModelSerializer):
         patch = self.context.get('patch')
         if not patch:
             return None 
+        helm_charts = self.context.get('helm_charts')
+        if helm_charts is not None:
+            return helm_charts.get((patch.name, obj.name))
         try:
             helm_entry = PatchProductHelmChart.objects.get(patch=patch, product=obj)
             return helm_entry.helm_charts
@@ -232,6 +331,10 @@ class ProductSerializer(serializers.ModelSerializer):
     def get_images(self, obj):
         patch = self.context.get('patch')
 
+        patch_images = self.context.get('patch_images')
+        if patch and patch_images is not None:
+            return patch_images.get((patch.name, obj.name), [])
+
         qs = obj.images.filter(is_deleted=False)
         if patch:
             qs = qs.filter(build_number=patch.name)
@@ -297,7 +400,7 @@ class ProductNestedSerializer(serializers.Serializer):
     images = PatchImageNestedSerializer(many=True)
 
 
-class PatchSerializer(serializers.ModelSerializer):
+class PatchSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     jars = PatchJarSerializer(source='patchjar_set', many=True, read_only=True)
     scopes = PatchHighLevelScopeSerializer(source='patchhighlevelscope_set', many=True, read_only=True)
 
@@ -319,12 +422,15 @@ class PatchSerializer(serializers.ModelSerializer):
             'products',
         ]
         lookup_field = 'name'
+        expandable_fields = ['products', 'jars', 'scopes', 'description']
         extra_kwargs = {
             'jars_data': {'required': True},
             'scopes_data': {'required': True},
             'products_data': {'required': True},
         }
 
+    @transaction.atomic
+    @change_batch()
     def create(self, validated_data):
         jars_payload = validated_data.pop('jars_data', [])
         scopes_payload = validated_data.pop('scopes_data', [])
@@ -333,131 +439,160 @@ class PatchSerializer(serializers.ModelSerializer):
 
         patch = super().create(validated_data)
 
-        # Create Products, Images, and Helm Charts from validated data
-        for pd in products_payload:
-            pkg, _ = Product.objects.get_or_create(name=pd['name'])
-            patch.products.add(pkg)
-            if (helm_charts_value := pd.get('helm_charts')) is not None:
-                PatchProductHelmChart.objects.update_or_create(
-                    patch=patch, product=pkg, defaults={"helm_charts": helm_charts_value}
-                )
+        # Everything below is written set-wise: one lookup and one bulk write
+        # per table, whatever the number of products, images, CVEs and jars.
+        self._create_products(patch, products_payload)
+        self._create_images(patch, products_payload)
+        self._create_security_issues(patch, initial_products_data)
+        self._create_jars_and_scopes(patch, jars_payload, scopes_payload)
 
-            # for img_dict in pd['images']:
-            #     img_name = img_dict.get('image_name')
-            #       # Use get_or_create to AVOID overwriting existing Twistlock data.
-            #     img, created = Image.objects.get_or_create(
-            #         product=pkg,
-            #         image_name=img_name,
-            #         build_number=patch.name,
-            #         defaults={
-            #             'release_date': patch.release_date,
-            #             'is_deleted': False,
-            #             'twistlock_report_url': None,
-            #             'twistlock_report_clean': None,
-            #         }
-            #     )
-            #     # If the image already existed but was marked as deleted, un-delete it.
-            #     if not created and img.is_deleted:
-            #         img.is_deleted = False
-            #         img.save(update_fields=['is_deleted'])
-
-            #     PatchProductImage.objects.get_or_create(patch=patch, product=pkg, image=img)
-            #     PatchImage.objects.update_or_create(
-            #         patch=patch, image=img,
-            #         defaults={
-            #             'ot2_pass': img_dict.get('ot2_pass'), 'registry': img_dict.get('registry'),
-            #             'patch_build_number': img_dict.get('patch_build_number'),
-            #         }
-            #     )
+        # Bulk writes skip the change-tracking signals
+        mark_changed(patch_names=[patch.pk])
+        return patch
+
+    def _create_products(self, patch, products_payload):
+        names = list(dict.fromkeys(pd['name'] for pd in products_payload))
+        existing = set(Product.objects.filter(name__in=names).values_list('name', flat=True))
+        Product.objects.bulk_create([Product(name=name) for name in names if name not in existing])
+        patch.products.add(*names)
+
+        helm_charts = {
+            pd['name']: pd['helm_charts']
+            for pd in products_payload if pd.get('helm_charts') is not None
+        }
+        PatchProductHelmChart.objects.bulk_create([
+            PatchProductHelmChart(patch=patch, product_id=name, helm_charts=value)
+            for name, value in helm_charts.items()
+        ])
+
+    def _create_images(self, patch, products_payload):
+        # Every image becomes (or is reset to) a fresh build of this patch
+        # with blank Twistlock fields.
+        image_names = {img['image_name'] for pd in products_payload for img in pd['images']}
+        images = {
+            img.image_name: img
+            for img in Image.objects.filter(build_number=patch.name, image_name__in=image_names)
+        }
+        now = timezone.now()
+        reset, new = {}, []
+        links, patch_images = {}, {}
+        for pd in products_payload:
             for img_dict in pd['images']:
                 img_name = img_dict.get('image_name')
-                existing_img = Image.objects.filter(image_name=img_name).first()
-
-                if existing_img:
-                    # Always create a new image with fresh twistlock fields
-                    img, created = Image.objects.get_or_create(
-                        product=pkg,
+                img = images.get(img_name)
+                if img is None or img.product_id != pd['name']:
+                    # Another product's build of the same name still hits
+                    # unique (image_name, build_number) on insert.
+                    img = Image(
+                        product_id=pd['name'],
                         image_name=img_name,
                         build_number=patch.name,
-                        defaults={
-                            'release_date': patch.release_date,
-                            "is_deleted": False,
-                            "twistlock_report_url": None,
-                            "twistlock_report_clean": None,
-                        }
-                    )
-                    if not created:
-                        img.twistlock_report_url = None
-                        img.twistlock_report_clean = None
-                        img.is_deleted = False
-                        img.save()
-
-                else:
-                    # New image – also ensure twistlock fields are null
-                    img = Image.objects.create(
-                        product=pkg,
-                        image_name=img_name,
-                        build_number=patch.name,
-                        release_date= patch.release_date ,
+                        release_date=patch.release_date,
                         twistlock_report_url=None,
                         twistlock_report_clean=None,
                         is_deleted=False,
                     )
-
-
-                # Create PatchProductImage (basic linking)
-                PatchProductImage.objects.get_or_create(
-                    patch=patch,
-                    product=pkg,
-                    image=img
-                )
-
-                # Create or update PatchImage with extra patch-specific fields
-                PatchImage.objects.update_or_create(
+                    images.setdefault(img_name, img)
+                    new.append(img)
+                elif img.pk is not None:
+                    img.twistlock_report_url = None
+                    img.twistlock_report_clean = None
+                    img.is_deleted = False
+                    img.updated_at = now
+                    reset[img.pk] = img
+
+                links[(pd['name'], img_name)] = img
+                patch_images[img_name] = PatchImage(
                     patch=patch,
                     image=img,
-                    defaults={
-                        'ot2_pass': img_dict.get('ot2_pass'),
-                        'registry': img_dict.get('registry'),
-                        'patch_build_number': img_dict.get('patch_build_number'),
-                    }
+                    ot2_pass=img_dict.get('ot2_pass'),
+                    registry=img_dict.get('registry'),
+                    patch_build_number=img_dict.get('patch_build_number'),
                 )
-        # 4. Process security issues from the raw initial data payload
+
+        Image.objects.bulk_update(
+            reset.values(), ['twistlock_report_url', 'twistlock_report_clean', 'is_deleted', 'updated_at']
+        )
+        Image.objects.bulk_create(new)
+        PatchProductImage.objects.bulk_create([
+            PatchProductImage(patch=patch, product_id=product_name, image=img)
+            for (product_name, _), img in links.items()
+        ])
+        PatchImage.objects.bulk_create(patch_images.values())
+
+    def _create_security_issues(self, patch, initial_products_data):
+        # The raw payload carries the CVEs and their per-product descriptions.
+        entries = []
         for pd_raw in initial_products_data:
-            pkg = Product.objects.get(name=pd_raw['name'])
             for img_dict in pd_raw.get('images', []):
                 for issue in img_dict.get('security_issues', []):
-                    cve_id = issue.get('cve_id')
-                    product_security_des = issue.get('product_security_des')
-
-                    if cve_id:
-                        security_issue_obj, _ = SecurityIssue.objects.get_or_create(
-                            cve_id=cve_id,
-                            defaults={
-                                'cvss_score': issue.get('cvss_score'), 'severity': issue.get('severity'),
-                                'affected_libraries': issue.get('affected_libraries'),
-                                'library_path': issue.get('library_path'), 'description': issue.get('description'),
-                                'is_deleted': issue.get('is_deleted', False),
-                            }
-                        )
-                        # Create the through-model link with the description
-                        ProductSecurityIssue.objects.update_or_create(
-                            patch=patch, product=pkg, security_issue=security_issue_obj,
-                            defaults={'product_security_des': product_security_des}
-                        )
-
-        # Process Jars and Scopes 
-        for jd in jars_payload:
-            jar_obj, _ = Jar.objects.get_or_create(name=jd['name'])
-            PatchJar.objects.update_or_create(
-                patch=patch, jar=jar_obj, defaults={'version': jd.get('version'), 'remarks': jd.get('remarks', '')}
-            )
-        for sd in scopes_payload:
-            scope_obj, _ = HighLevelScope.objects.get_or_create(name=sd['name'])
-            PatchHighLevelScope.objects.update_or_create(
-                patch=patch, scope=scope_obj, defaults={'version': sd.get('version'), 'remarks': sd.get('remarks', '')}
-            )
-        return patch
+                    if issue.get('cve_id'):
+                        entries.append((pd_raw['name'], issue))
+        if not entries:
+            return
+
+        def lookup(issue):
+            key = (issue['cve_id'], issue.get('cvss_score'), issue.get('severity'), issue.get('affected_libraries'))
+            if None in key:
+                # Partial issue payloads can only be matched on the CVE id
+                return ('cve_id', issue['cve_id'])
+            return ('natural_key_hash', security_issue_hash(*key))
+
+        lookups = [lookup(issue) for _, issue in entries]
+        issues = {}
+        by_hash = [value for kind, value in lookups if kind == 'natural_key_hash']
+        for issue in SecurityIssue.objects.filter(natural_key_hash__in=by_hash):
+            issues[('natural_key_hash', issue.natural_key_hash)] = issue
+        by_cve = [value for kind, value in lookups if kind == 'cve_id']
+        for issue in SecurityIssue.objects.filter(cve_id__in=by_cve).order_by('-pk'):
+            issues[('cve_id', issue.cve_id)] = issue
+
+        # First occurrence creates the issue, as get_or_create did
+        new = {}
+        for (_, issue), key in zip(entries, lookups):
+            if key in issues or key in new:
+                continue
+            fields = {
+                'cve_id': issue['cve_id'],
+                'cvss_score': issue.get('cvss_score'), 'severity': issue.get('severity'),
+                'affected_libraries': issue.get('affected_libraries'),
+                'library_path': issue.get('library_path'), 'description': issue.get('description'),
+                'is_deleted': issue.get('is_deleted', False),
+            }
+            if key[0] == 'natural_key_hash':
+                new[key] = SecurityIssue(
+                    **fields, natural_key_hash=key[1],
+                    affected_libraries_hash=library_hash(fields['affected_libraries']),
+                )
+            else:
+                issues[key] = SecurityIssue.objects.create(**fields)
+        SecurityIssue.objects.bulk_create(new.values())
+        issues.update(new)
+
+        # Last description per (product, issue) wins, as update_or_create did
+        descriptions = {
+            (product_name, issues[key].pk): issue.get('product_security_des')
+            for (product_name, issue), key in zip(entries, lookups)
+        }
+        ProductSecurityIssue.objects.bulk_create([
+            ProductSecurityIssue(patch=patch, product_id=product_name, security_issue_id=issue_pk,
+                                 product_security_des=des)
+            for (product_name, issue_pk), des in descriptions.items()
+        ])
+
+    def _create_jars_and_scopes(self, patch, jars_payload, scopes_payload):
+        jar_names.ensure(jd['name'] for jd in jars_payload)
+        jars = {jd['name']: jd for jd in jars_payload}
+        PatchJar.objects.bulk_create([
+            PatchJar(patch=patch, jar_id=name, version=jd.get('version'), remarks=jd.get('remarks', ''))
+            for name, jd in jars.items()
+        ])
+        scope_names.ensure(sd['name'] for sd in scopes_payload)
+        scopes = {sd['name']: sd for sd in scopes_payload}
+        PatchHighLevelScope.objects.bulk_create([
+            PatchHighLevelScope(patch=patch, scope_id=name, version=sd.get('version'), remarks=sd.get('remarks', ''))
+            for name, sd in scopes.items()
+        ])
 
 
 
@@ -609,103 +744,143 @@ class PatchSerializer(serializers.ModelSerializer):
     #             PatchHighLevelScope.objects.update_or_create(patch=patch, scope=scope_obj, defaults={'version': sd.get('version'), 'remarks': sd.get('remarks', '')})
 
     #     return patch
+    @transaction.atomic
+    @change_batch()
     def update(self, instance, validated_data):
         # Pop nested payloads
         jars_payload = validated_data.pop('jars_data', None)
         scopes_payload = validated_data.pop('scopes_data', None)
         products_payload = validated_data.pop('products_data', None)
 
-        with transaction.atomic():
-            patch = super().update(instance, validated_data)
-
-            if products_payload is not None:
-               
-                target_links = set()
-
-                for product_data in products_payload:
-                    product_instance, _ = Product.objects.get_or_create(name=product_data.get('name'))
-                    
-                    for image_dict in product_data.get('images', []):
-                        image_name = image_dict.get('image_name')
-                        if not image_name:
-                            continue
-
-                        existing_img = Image.objects.filter(image_name=image_name).first()
-                        
-                        if existing_img and existing_img.build_number == patch.name:
-                            img = existing_img
-                            img.is_deleted = False
-                            img.save(update_fields=['is_deleted'])
-                        else:
-                            img, _ = Image.objects.get_or_create(
-                                product=product_instance,
-                                image_name=image_name,
-                                build_number=patch.name,
-                                defaults={'release_date': patch.release_date, 'is_deleted': False}
-                            )
-
-                        target_links.add((product_instance.pk, img.id))
-
-                        PatchImage.objects.update_or_create(
-                            patch=patch,
-                            image=img,
-                            defaults={
-                                'ot2_pass': image_dict.get('ot2_pass'),
-                                'registry': image_dict.get('registry'),
-                                'patch_build_number': image_dict.get('patch_build_number') or patch.name,
-                            }
-                        )
-
-                current_links = set(
-                    PatchProductImage.objects.filter(patch=patch).values_list('product_id', 'image_id')
-                )
+        patch = super().update(instance, validated_data)
 
-                links_to_add = target_links - current_links
-                links_to_remove = current_links - target_links
-
-                if links_to_remove:
-                    for prod_pk, img_id in links_to_remove:
-                        PatchProductImage.objects.filter(patch=patch, product_id=prod_pk, image_id=img_id).delete()
-                        PatchImage.objects.filter(patch=patch, image_id=img_id).delete()
-
-                if links_to_add:
-                    new_ppi_links = [
-                        PatchProductImage(patch=patch, product_id=prod_pk, image_id=img_id)
-                        for prod_pk, img_id in links_to_add
-                    ]
-                    PatchProductImage.objects.bulk_create(new_ppi_links)
-                
-              
-                all_product_pks = {prod_pk for prod_pk, _ in target_links}
-                patch.products.set(all_product_pks)
-            
-
-        # Handle jars_payload
+        # The diff against the stored rows is worked out from a few IN
+        # lookups and applied with one bulk write per table; rows that did
+        # not change are not written at all.
+        if products_payload is not None:
+            self._update_images(patch, products_payload)
         if jars_payload is not None:
-            kept_jars = [jar['name'] for jar in jars_payload]
-            PatchJar.objects.filter(patch=patch).exclude(jar__name__in=kept_jars).delete()
-            for jd in jars_payload:
-                jar_obj, _ = Jar.objects.get_or_create(name=jd['name'])
-                PatchJar.objects.update_or_create(
-                    patch=patch,
-                    jar=jar_obj,
-                    defaults={'version': jd.get('version'), 'remarks': jd.get('remarks', '')}
-                )
-
-        # Handle scopes_payload
+            self._sync_patch_rows(patch, PatchJar, 'jar_id', jar_names, jars_payload)
         if scopes_payload is not None:
-            kept_scopes = [s['name'] for s in scopes_payload]
-            PatchHighLevelScope.objects.filter(patch=patch).exclude(scope__name__in=kept_scopes).delete()
-            for sd in scopes_payload:
-                scope_obj, _ = HighLevelScope.objects.get_or_create(name=sd['name'])
-                PatchHighLevelScope.objects.update_or_create(
-                    patch=patch,
-                    scope=scope_obj,
-                    defaults={'version': sd.get('version'), 'remarks': sd.get('remarks', '')}
-                )
+            self._sync_patch_rows(patch, PatchHighLevelScope, 'scope_id', scope_names, scopes_payload)
 
+        # Bulk writes skip the change-tracking signals
+        mark_changed(patch_names=[patch.pk])
         return patch
 
+    def _update_images(self, patch, products_payload):
+        product_names = list(dict.fromkeys(pd.get('name') for pd in products_payload))
+        existing = set(Product.objects.filter(name__in=product_names).values_list('name', flat=True))
+        Product.objects.bulk_create([Product(name=name) for name in product_names if name not in existing])
+
+        entries = [
+            (pd.get('name'), img_dict)
+            for pd in products_payload
+            for img_dict in pd.get('images', [])
+            if img_dict.get('image_name')
+        ]
+        image_names = {img_dict['image_name'] for _, img_dict in entries}
+        builds = {
+            img.image_name: img
+            for img in Image.objects.filter(build_number=patch.name, image_name__in=image_names)
+        }
+        oldest = dict(
+            Image.objects.filter(image_name__in=image_names)
+            .values('image_name').annotate(first_pk=Min('pk'))
+            .values_list('image_name', 'first_pk')
+        )
+        # This patch's build is reused as-is (whatever its product) when it
+        # is the oldest image of that name; otherwise the product's build is
+        # looked up, or created.
+        reusable = {name for name, img in builds.items() if oldest[name] == img.pk}
+
+        restored, new, resolved = {}, [], []
+        for product_name, img_dict in entries:
+            img_name = img_dict['image_name']
+            img = builds.get(img_name)
+            if img_name in reusable:
+                if img.is_deleted:
+                    img.is_deleted = False
+                    restored[img.pk] = img
+            elif img is None or img.product_id != product_name:
+                # Another product's build of the same name still hits
+                # unique (image_name, build_number) on insert.
+                img = Image(
+                    product_id=product_name,
+                    image_name=img_name,
+                    build_number=patch.name,
+                    release_date=patch.release_date,
+                    is_deleted=False,
+                )
+                builds.setdefault(img_name, img)
+                if img_name not in oldest:
+                    reusable.add(img_name)
+                new.append(img)
+            resolved.append((product_name, img, img_dict))
+
+        Image.objects.bulk_update(restored.values(), ['is_deleted'])
+        Image.objects.bulk_create(new)
+
+        # Last entry per image wins, as update_or_create did
+        target_links, values = {}, {}
+        for product_name, img, img_dict in resolved:
+            target_links[(product_name, img.pk)] = None
+            values[img.pk] = {
+                'ot2_pass': img_dict.get('ot2_pass'),
+                'registry': img_dict.get('registry'),
+                'patch_build_number': img_dict.get('patch_build_number') or patch.name,
+            }
+        patch_images = {
+            pi.image_id: pi
+            for pi in PatchImage.objects.filter(patch=patch, image_id__in=values).order_by('-pk')
+        }
+        changed, created = [], []
+        for image_id, fields in values.items():
+            pi = patch_images.get(image_id)
+            if pi is None:
+                created.append(PatchImage(patch=patch, image_id=image_id, **fields))
+            elif any(getattr(pi, name) != value for name, value in fields.items()):
+                for name, value in fields.items():
+                    setattr(pi, name, value)
+                changed.append(pi)
+        PatchImage.objects.bulk_update(changed, ['ot2_pass', 'registry', 'patch_build_number'])
+        PatchImage.objects.bulk_create(created)
+
+        current_links = {}
+        for pk, product_id, image_id in (
+            PatchProductImage.objects.filter(patch=patch).values_list('pk', 'product_id', 'image_id')
+        ):
+            current_links.setdefault((product_id, image_id), []).append(pk)
+        stale = [link for link in current_links if link not in target_links]
+        if stale:
+            PatchProductImage.objects.filter(pk__in=[pk for link in stale for pk in current_links[link]]).delete()
+            PatchImage.objects.filter(patch=patch, image_id__in={image_id for _, image_id in stale}).delete()
+        PatchProductImage.objects.bulk_create([
+            PatchProductImage(patch=patch, product_id=product_name, image_id=image_id)
+            for product_name, image_id in target_links if (product_name, image_id) not in current_links
+        ])
+
+        patch.products.set({product_name for product_name, _ in target_links})
+
+    def _sync_patch_rows(self, patch, model, name_field, names, payload):
+        # PatchJar / PatchHighLevelScope: drop the names no longer sent,
+        # then insert or update the rest (last entry per name wins).
+        rows = {entry['name']: entry for entry in payload}
+        model.objects.filter(patch=patch).exclude(**{f'{name_field}__in': rows}).delete()
+        names.ensure(rows)
+        current = {getattr(row, name_field): row for row in model.objects.filter(patch=patch)}
+        changed, created = [], []
+        for name, entry in rows.items():
+            version, remarks = entry.get('version'), entry.get('remarks', '')
+            row = current.get(name)
+            if row is None:
+                created.append(model(patch=patch, version=version, remarks=remarks, **{name_field: name}))
+            elif (row.version, row.remarks) != (version, remarks):
+                row.version, row.remarks = version, remarks
+                changed.append(row)
+        model.objects.bulk_update(changed, ['version', 'remarks'])
+        model.objects.bulk_create(created)
+
     # def get_products(self, obj):
     #     patch = obj
     #     products_qs = obj.products.filter(is_deleted=False)
@@ -758,6 +933,19 @@ class PatchSerializer(serializers.ModelSerializer):
 
     #     return products_data
     def get_products(self, patch):
+        patch_products = self.context.get('patch_products')
+        if patch_products is not None:
+            serializer = ProductSerializer(
+                patch_products.get(patch.name, []),
+                many=True,
+                context={
+                    'patch': patch,
+                    'helm_charts': self.context['helm_charts'],
+                    'patch_images': self.context['patch_images'],
+                }
+            )
+            return serializer.data
+
         products_qs = patch.products.filter(is_deleted=False)
         serializer = ProductSerializer(
             products_qs,
@@ -783,6 +971,78 @@ class PatchSerializer(serializers.ModelSerializer):
 
         return products_data
 
+def build_patch_read_context(patches, fields=None):
+    """
+    Preloads everything PatchSerializer reads for the given patches (one
+    instance or many) so that serializing them costs a fixed number of
+    queries instead of several per product:
+
+      * jars / scopes are prefetched onto the patches (with their Jar / scope),
+      * products, helm charts and per-product images go into lookup maps
+        that PatchSerializer / ProductSerializer pick up from the context.
+
+    `fields` (see SparseFieldsMixin.selected_fields) skips whatever the
+    response will not render.
+
+    Usage: PatchSerializer(patches, many=True, context=build_patch_read_context(patches))
+    """
+    if isinstance(patches, Patch):
+        patches = [patches]
+    patches = list(patches)
+    patch_names = [p.name for p in patches]
+
+    prefetches = []
+    if fields is None or 'jars' in fields:
+        prefetches.append(Prefetch('patchjar_set', queryset=PatchJar.objects.select_related('jar')))
+    if fields is None or 'scopes' in fields:
+        prefetches.append(Prefetch('patchhighlevelscope_set',
+                                   queryset=PatchHighLevelScope.objects.select_related('scope')))
+    if prefetches:
+        prefetch_related_objects(patches, *prefetches)
+
+    if fields is not None and 'products' not in fields:
+        return {'patch_products': {}, 'helm_charts': {}, 'patch_images': {}}
+
+    patch_products = {name: [] for name in patch_names}
+    links = (
+        Patch.products.through.objects
+        .filter(patch_id__in=patch_names, product__is_deleted=False)
+        .select_related('product')
+        # by name, as patch.products reads them off the (patch, product) key
+        .order_by('product_id')
+    )
+    for link in links:
+        patch_products[link.patch_id].append(link.product)
+
+    helm_charts = {
+        (patch_id, product_id): value
+        for patch_id, product_id, value in (
+            PatchProductHelmChart.objects
+            .filter(patch_id__in=patch_names)
+            .order_by('id')
+            .values_list('patch_id', 'product_id', 'helm_charts')
+        )
+    }
+
+    patch_images = {}
+    for product_id, image_name, build_number in (
+        Image.objects
+        .filter(build_number__in=patch_names, is_deleted=False)
+        .order_by('id')
+        .values_list('product_id', 'image_name', 'build_number')
+    ):
+        patch_images.setdefault((build_number, product_id), []).append({
+            "image_name": image_name,
+            "build_number": build_number
+        })
+
+    return {
+        'patch_products': patch_products,
+        'helm_charts': helm_charts,
+        'patch_images': patch_images,
+    }
+
+
 class ReleaseProductImageSerializer(serializers.ModelSerializer):
     release = serializers.SlugRelatedField(
         queryset=Release.objects.all(),
@@ -796,3 +1056,17 @@ class ReleaseProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReleaseProductImage
         fields = '__all__'
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    created_by = serializers.SlugRelatedField(read_only=True, slug_field='username')
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = IngestJob
+        exclude = ['payload']
+
+    def get_progress(self, obj):
+        if obj.total_items == 0:
+            return 100.0 if obj.status == 'succeeded' else 0.0
+        return round(obj.processed_items / obj.total_items * 100, 2)
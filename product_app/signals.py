@@ -0,0 +1,191 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .changes import mark_changed
+from .interning import jar_names, scope_names
+from .models import (
+    HighLevelScope, Image, Jar, Patch, PatchHighLevelScope, PatchImage, PatchImageJar, PatchJar,
+    PatchProductHelmChart, Product, ProductSecurityIssue, SecurityIssue,
+)
+
+# -----------------------
+# Patch change tracking (version / completion rollup)
+# -----------------------
+
+@receiver(post_save, sender=PatchImage)
+@receiver(post_delete, sender=PatchImage)
+@receiver(post_save, sender=PatchJar)
+@receiver(post_delete, sender=PatchJar)
+def patch_row_changed(sender, instance, **kwargs):
+    mark_changed(patch_names=[instance.patch_id])
+
+
+@receiver(post_save, sender=PatchHighLevelScope)
+@receiver(post_delete, sender=PatchHighLevelScope)
+@receiver(post_save, sender=PatchProductHelmChart)
+@receiver(post_delete, sender=PatchProductHelmChart)
+@receiver(post_save, sender=ProductSecurityIssue)
+@receiver(post_delete, sender=ProductSecurityIssue)
+def patch_detail_row_changed(sender, instance, **kwargs):
+    mark_changed(patch_names=[instance.patch_id], completion=False)
+
+
+@receiver(post_save, sender=Patch)
+def patch_changed(sender, instance, **kwargs):
+    mark_changed(patch_names=[instance.pk], completion=False)
+
+
+@receiver(post_save, sender=PatchImageJar)
+@receiver(post_delete, sender=PatchImageJar)
+def patch_image_jar_changed(sender, instance, **kwargs):
+    # Resolved to its patch when changes are flushed. If the PatchImage
+    # itself is being deleted, its own post_delete marks the patch.
+    mark_changed(patch_image_ids=[instance.patch_image_id])
+
+
+@receiver(post_save, sender=Image)
+def image_changed(sender, instance, **kwargs):
+    # An image only ever belongs to the patch named by its build number.
+    mark_changed(patch_names=[instance.build_number])
+
+
+@receiver(m2m_changed, sender=Image.security_issues.through)
+def image_security_issues_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            mark_changed(patch_names=[instance.build_number], completion=False, image_ids=[instance.pk])
+        return
+
+    # Issue side: issue.images.add/remove/clear(...)
+    if action == 'pre_clear':
+        instance._cleared_image_ids = list(instance.images.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        image_ids = getattr(instance, '_cleared_image_ids', [])
+    elif action.startswith('post_') and pk_set:
+        image_ids = pk_set
+    else:
+        return
+    mark_changed(
+        patch_names=Image.objects.filter(pk__in=image_ids).values_list('build_number', flat=True),
+        completion=False,
+        image_ids=image_ids,
+    )
+
+
+@receiver(post_save, sender=SecurityIssue)
+def security_issue_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    images = list(instance.images.values_list('pk', 'build_number'))
+    mark_changed(
+        patch_names=[build_number for _, build_number in images],
+        completion=False,
+        image_ids=[pk for pk, _ in images],
+    )
+
+
+@receiver(post_save, sender=Product)
+def product_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    mark_changed(patch_names=instance.patches.values_list('name', flat=True))
+
+
+@receiver(m2m_changed, sender=Patch.products.through)
+def patch_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            mark_changed(patch_names=[instance.pk])
+        return
+
+    # Product side: product.patches.add/remove/clear(...)
+    if action == 'pre_clear':
+        instance._cleared_patch_names = list(instance.patches.values_list('name', flat=True))
+    elif action == 'post_clear':
+        mark_changed(patch_names=getattr(instance, '_cleared_patch_names', []))
+    elif action in ('post_add', 'post_remove'):
+        mark_changed(patch_names=pk_set)
+
+
+def security_issue_links_changed(image_ids):
+    """
+    Reports a write to the image / security issue rows of the given images
+    that m2m_changed does not see: Django sends no signals for the
+    auto-created through model, so neither rows saved one by one (the Image
+    admin inline) nor rows removed along with their SecurityIssue are caught.
+    """
+    image_ids = list(image_ids)
+    mark_changed(
+        patch_names=Image.objects.filter(pk__in=image_ids).values_list('build_number', flat=True),
+        completion=False,
+        image_ids=image_ids,
+    )
+    clear_security_issues_digest(image_ids)
+
+
+@receiver(pre_delete, sender=SecurityIssue)
+def security_issue_deleting(sender, instance, **kwargs):
+    instance._deleted_image_ids = list(instance.images.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=SecurityIssue)
+def security_issue_deleted(sender, instance, **kwargs):
+    security_issue_links_changed(getattr(instance, '_deleted_image_ids', []))
+
+
+# -----------------------
+# Ingest digests
+# -----------------------
+# update_patch_data skips an image's security_issues / jars section when it
+# matches the digest stored on the PatchImage by the previous ingest. Any
+# other write to those rows invalidates the digest so the next ingest
+# rewrites the section.
+
+def clear_security_issues_digest(image_ids):
+    (PatchImage.objects.filter(image_id__in=image_ids)
+     .exclude(security_issues_digest='').update(security_issues_digest=''))
+
+
+@receiver(m2m_changed, sender=Image.security_issues.through)
+def image_security_issues_digest(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            clear_security_issues_digest([instance.pk])
+    elif action == 'pre_clear':
+        clear_security_issues_digest(instance.images.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        clear_security_issues_digest(pk_set)
+
+
+@receiver(post_save, sender=SecurityIssue)
+def security_issue_digest(sender, instance, created, **kwargs):
+    if not created:
+        clear_security_issues_digest(instance.images.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=PatchImageJar)
+@receiver(post_delete, sender=PatchImageJar)
+def patch_image_jar_digest(sender, instance, **kwargs):
+    PatchImage.objects.filter(pk=instance.patch_image_id).exclude(jars_digest='').update(jars_digest='')
+
+
+# -----------------------
+# Jar / HighLevelScope name cache
+# -----------------------
+
+@receiver(post_save, sender=Jar)
+@receiver(post_save, sender=HighLevelScope)
+def interned_name_saved(sender, instance, **kwargs):
+    cache = jar_names if sender is Jar else scope_names
+    transaction.on_commit(partial(cache.add, [instance.pk]))
+
+
+@receiver(post_delete, sender=Jar)
+@receiver(post_delete, sender=HighLevelScope)
+def interned_name_deleted(sender, instance, **kwargs):
+    cache = jar_names if sender is Jar else scope_names
+    cache.discard(instance.pk)
@@ -1,3 +1,1560 @@
+import json
+import re
+from collections import Counter
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from product_app.completion import image_completion, product_completion, tracked_patch_images
+from product_app.counters import refresh_vulnerability_counters
+from product_app.ingest import CHUNK_SIZE, PatchDataIngest
+from product_app.interning import jar_names, scope_names
+from product_app.jobs import LEASE_TIMEOUT, claim_next_job, run_ingest_job
+from product_app.models import (
+    CustomUser, HighLevelScope, Image, IngestJob, Jar, Patch, PatchHighLevelScope, PatchImage, PatchImageJar, PatchJar,
+    PatchProductCompletion, PatchProductHelmChart, PatchProductImage, Product, ProductSecurityIssue, Release,
+    SecurityIssue,
+)
+from product_app.serializers import ImageSerializer, PatchSerializer
+
+# -----------------------
+# Query plan regression tests
+# -----------------------
+# Every query behind the hot endpoints (and the ORM filters they are built
+# on) is run through EXPLAIN QUERY PLAN. A full scan of a product_app table
+# ("SCAN <table>", whether or not it walks an index to do it) fails the test,
+# so a dropped index or a query that stops matching one shows up here.
+
+FULL_SCAN = re.compile(r'SCAN (product_app_\w+)\b(?! VIRTUAL TABLE)')
+
+
+def create_patch(name, release, **fields):
+    return Patch.objects.create(
+        name=name, release=release, release_date='2024-01-01', kick_off='2024-01-01',
+        code_freeze='2024-01-01', platform_qa_build='2024-01-01',
+        client_build_availability='2024-01-01', description='patch', **fields,
+    )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='planner', password='x')
+        cls.release = Release.objects.create(name='24.4')
+        cls.products = [Product.objects.create(name=f'P{i}') for i in range(3)]
+        jars = [Jar.objects.create(name=f'jar{i}') for i in range(3)]
+        cls.issues = [
+            SecurityIssue.objects.create(
+                cve_id=f'CVE-2024-{i}', cvss_score=score, severity=severity,
+                affected_libraries=f'lib{i}', description=f'overflow in lib{i}',
+            )
+            for i, (score, severity) in enumerate([(9.8, 'Critical'), (7.5, 'High'), (5.0, 'Medium')])
+        ]
+        cls.patches = []
+        for patch_name in ('24.4.1', '24.4.2'):
+            patch = create_patch(patch_name, cls.release)
+            cls.patches.append(patch)
+            for jar in jars:
+                PatchJar.objects.create(patch=patch, jar=jar, version='1.0')
+            for product in cls.products:
+                patch.products.add(product)
+                PatchProductHelmChart.objects.create(patch=patch, product=product, helm_charts='Released')
+                image = Image.objects.create(product=product, image_name=f'{product.name}-img', build_number=patch_name)
+                image.security_issues.set(cls.issues[:2] if patch_name == '24.4.1' else cls.issues[1:])
+                PatchProductImage.objects.create(patch=patch, product=product, image=image)
+                patch_image = PatchImage.objects.create(patch=patch, image=image)
+                PatchImageJar.objects.create(patch_image=patch_image, jar=jars[0], current_version='1.0')
+                ProductSecurityIssue.objects.create(
+                    patch=patch, product=product, security_issue=cls.issues[1], product_security_des='triaged',
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # The name caches load every name once per TTL by design; warm them
+        # up front so only the request's own queries are checked.
+        for cache in (jar_names, scope_names):
+            cache.clear()
+            cache.ensure(())
+
+    def full_scans(self, run):
+        """Runs `run()` and returns the full table scans in the plans of the queries it executed."""
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            if not many:
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            run()
+
+        scans = []
+        with connection.cursor() as cursor:
+            for sql, params in queries:
+                if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params or ())
+                scans += [f'{detail}: {sql}' for *_, detail in cursor.fetchall() if FULL_SCAN.match(detail)]
+        return scans
+
+    def assertNoFullScan(self, method, url, data=None, status=200):
+        def run():
+            response = getattr(self.client, method)(url, data, format='json')
+            self.assertEqual(response.status_code, status, getattr(response, 'data', None))
+
+        with self.subTest(url=url):
+            self.assertEqual(self.full_scans(run), [])
+
+    def issue_key(self, issue):
+        return {
+            "cve_id": issue.cve_id, "cvss_score": issue.cvss_score,
+            "severity": issue.severity, "affected_libraries": issue.affected_libraries,
+        }
+
+    def test_hot_filters(self):
+        patch, product = self.patches[0], self.products[0]
+        querysets = [
+            Image.objects.filter(is_deleted=False, build_number=patch.name),
+            Image.objects.filter(is_deleted=False, product=product),
+            Image.objects.filter(image_name='P0-img'),
+            PatchImage.objects.filter(patch=patch, image__image_name='P0-img'),
+            PatchImage.objects.filter(patch=patch, lock=True),
+            ProductSecurityIssue.objects.filter(patch=patch, product=product),
+            Patch.objects.filter(is_deleted=False, release=self.release),
+            Patch.objects.filter(is_deleted=False, patch_state='new'),
+            tracked_patch_images([patch.name]),
+        ]
+        for queryset in querysets:
+            with self.subTest(query=str(queryset.query)):
+                self.assertEqual(self.full_scans(lambda: list(queryset)), [])
+
+    def test_patch_endpoints(self):
+        patch, product = self.patches[0], self.products[0]
+        for url in [
+            f'/api/patches/{patch.name}/',
+            f'/api/patches/?release={self.release.name}',
+            '/api/patches/?patch_state=new',
+            f'/api/patches/?product={product.name}',
+            f'/api/patches/{patch.name}/details/',
+            f'/api/patches/{patch.name}/products/{product.name}/',
+            f'/api/patches/product/{product.name.lower()}/',
+            f'/api/patches/{patch.name}/completion/',
+            f'/api/patches/{patch.name}/product-completion/',
+            f'/api/patches/{patch.name}/products/{product.name}/completion/',
+            f'/api/releases/{self.release.name}/completion-matrix/',
+            f'/api/patchimagejars/{patch.name}/{product.name}-img/',
+        ]:
+            self.assertNoFullScan('get', url)
+        self.assertNoFullScan('post', '/api/patches/completion-batch/', {"patches": [p.name for p in self.patches]})
+
+    def test_image_endpoints(self):
+        patch, product = self.patches[0], self.products[0]
+        for url in [
+            f'/api/images/?build_number={patch.name}',
+            f'/api/images/?image_name={product.name}-img',
+            f'/api/images/?product={product.name}',
+            f'/api/images/{product.name}-img/{patch.name}/',
+        ]:
+            self.assertNoFullScan('get', url)
+        images = [{"image_name": f'{p.name}-img', "build_number": patch.name} for p in self.products]
+        self.assertNoFullScan('post', '/api/hydrate-product-images/', {"products": [{"name": product.name, "images": images}]})
+
+    def test_security_endpoints(self):
+        patch, product, issue = self.patches[0], self.products[0], self.issues[1]
+        for url in [
+            '/api/security-issues/?severity=High',
+            f'/api/security-issues/impact/?cve_id={issue.cve_id}',
+            f'/api/security-issues/impact/?library={issue.affected_libraries}',
+            '/api/security-issues/search/?q=overflow&severity=High&cvss_min=7',
+            f'/api/security-issues/diff/?from={self.patches[0].name}&to={self.patches[1].name}',
+            f'/api/security-issues/diff/?from={self.patches[0].name}&to={self.patches[1].name}&image_name={product.name}-img',
+        ]:
+            self.assertNoFullScan('get', url)
+        images = [{"image_name": f'{p.name}-img', "build_number": patch.name} for p in self.products]
+        self.assertNoFullScan('post', '/api/security-report/?products=1', {"products": [{"images": images}]})
+        item = {"patchName": patch.name, "productName": product.name, **self.issue_key(issue)}
+        self.assertNoFullScan('post', '/api/get-security-description/', item)
+        self.assertNoFullScan('post', '/api/get-security-descriptions/', {"items": [item]})
+
+    def test_write_endpoints(self):
+        patch, product, issue = self.patches[0], self.products[0], self.issues[0]
+        self.assertNoFullScan('patch', '/api/patchimages/lock-by-names/', {
+            "patch": patch.name, "image": f'{product.name}-img', "lock": True,
+        })
+        self.assertNoFullScan('patch', '/api/security-descriptions/', {"items": [{
+            "patchName": patch.name, "productName": product.name, **self.issue_key(issue),
+            "product_security_des": "not reachable",
+        }]})
+        self.assertNoFullScan('post', '/api/patches/update-data/', [{"name": patch.name, "products": [{
+            "name": product.name, "helm_charts": "Released", "images": [{
+                "image_name": f'{product.name}-img', "build_number": patch.name,
+                "security_issues": [{"CVE": "CVE-2025-1", "cvss": 9.1, "Severity": "Critical", "PackageName": "openssl"}],
+                "jars": [{"Name": "jar1", "Version": "2.0"}],
+            }],
+        }]}])
+
+
+# -----------------------
+# Completion engine
+# -----------------------
+
+class CompletionTests(TestCase):
+
+    def test_blank_remarks_follow_str_strip(self):
+        # A jar with only whitespace in its remarks is not done, for every
+        # character str.strip() removes, not just the ones SQL TRIM knows.
+        patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        product = Product.objects.create(name='P0')
+        patch.products.add(product)
+        remarks = ['', ' ', ' \t\n\r ', '\x0b', '\x0c', '\xa0', '\u2003\u3000', '\x1c\x85', 'ok', ' \xa0done\xa0 ']
+        patch_image = PatchImage.objects.create(
+            patch=patch, image=Image.objects.create(product=product, image_name='img', build_number=patch.name),
+        )
+        for i, remark in enumerate(remarks):
+            jar = Jar.objects.create(name=f'jar{i}')
+            PatchJar.objects.create(patch=patch, jar=jar, version='1.0')
+            PatchImageJar.objects.create(patch_image=patch_image, jar=jar, remarks=remark)
+
+        completion = image_completion([patch.name])[patch.name][product.name]['img']
+        done = sum(1 for remark in remarks if remark.strip())
+        self.assertEqual(completion.total, 1 + len(remarks))
+        self.assertEqual(completion.halves, 2 * done)
+
+
+class RollupTransactionTests(TestCase):
+    """The rollup refresh runs in the writer's transaction: if it fails, the write is undone."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='writer', password='x')
+        cls.patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        product = Product.objects.create(name='P0')
+        cls.patch.products.add(product)
+        cls.image = Image.objects.create(product=product, image_name='img', build_number=cls.patch.name)
+        jar = Jar.objects.create(name='jar0')
+        PatchJar.objects.create(patch=cls.patch, jar=jar, version='1.0')
+        patch_image = PatchImage.objects.create(patch=cls.patch, image=cls.image)
+        cls.pij = PatchImageJar.objects.create(patch_image=patch_image, jar=jar, remarks='')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_failed_refresh_rolls_back_patch_image_jar_update(self):
+        with mock.patch('product_app.changes.refresh_rollup', side_effect=RuntimeError('refresh failed')):
+            with self.assertRaises(RuntimeError):
+                self.client.patch(f'/api/patchimagejars/{self.patch.name}/img/jar0/', {"remarks": "done"}, format='json')
+        self.pij.refresh_from_db()
+        self.assertEqual(self.pij.remarks, '')
+
+        response = self.client.patch(f'/api/patchimagejars/{self.patch.name}/img/jar0/', {"remarks": "done"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        completion = self.client.get(f'/api/patches/{self.patch.name}/completion/').data
+        self.assertEqual(completion["completion_percentage"], 50.0)
+
+    def test_failed_refresh_rolls_back_viewset_update(self):
+        with mock.patch('product_app.changes.refresh_rollup', side_effect=RuntimeError('refresh failed')):
+            with self.assertRaises(RuntimeError):
+                self.client.patch(f'/api/images/img/{self.patch.name}/', {"size": "10MB"}, format='json')
+        self.image.refresh_from_db()
+        self.assertIsNone(self.image.size)
+
+
+class RollupReadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='viewer', password='x')
+        release = Release.objects.create(name='24.4')
+        cls.patch = create_patch('24.4.1', release)
+        cls.patch.products.add(Product.objects.create(name='P0'))
+        PatchImage.objects.create(
+            patch=cls.patch, image=Image.objects.create(product_id='P0', image_name='img', build_number='24.4.1'),
+            registry='Released',
+        )
+        cls.empty = create_patch('24.4.2', release)
+        # As if written before the rollup existed
+        PatchProductCompletion.objects.all().delete()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def writes(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if q['sql'].split(' ', 1)[0] in ('INSERT', 'UPDATE', 'DELETE')]
+
+    def test_missing_rows_are_stored_once(self):
+        self.assertEqual(len(self.writes(f'/api/patches/{self.patch.name}/completion/')), 1)
+        self.assertEqual(
+            list(PatchProductCompletion.objects.values_list('patch_id', 'product_id', 'total_items', 'completed_halves')),
+            [('24.4.1', 'P0', 1, 1)],
+        )
+        self.assertEqual(self.writes(f'/api/patches/{self.patch.name}/completion/'), [])
+
+    def test_concurrent_read_storing_the_same_rows_first(self):
+        def racing(patch_names):
+            computed = product_completion(patch_names)
+            # Another request stores the rows between our read and our insert
+            PatchProductCompletion.objects.create(patch=self.patch, product_id='P0', total_items=1, completed_halves=1)
+            return computed
+
+        with mock.patch('product_app.completion.product_completion', racing):
+            response = self.client.get(f'/api/patches/{self.patch.name}/completion/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["completion_percentage"], 50.0)
+        self.assertEqual(PatchProductCompletion.objects.count(), 1)
+
+    def test_patch_with_nothing_to_store_is_not_written(self):
+        self.assertEqual(self.writes(f'/api/patches/{self.empty.name}/completion/'), [])
+        self.assertEqual(self.writes(f'/api/patches/{self.empty.name}/completion/'), [])
+
+
+class BatchPatchCompletionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='reader', password='x')
+        release = Release.objects.create(name='24.4')
+        for patch_name in ('24.4.1', '24.4.2'):
+            patch = create_patch(patch_name, release)
+            for product_name in ('D2', 'D22'):
+                patch.products.add(Product.objects.get_or_create(name=product_name)[0])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, body):
+        return self.client.post('/api/patches/completion-batch/', body, format='json')
+
+    def test_product_filters(self):
+        response = self.post({"patches": ["24.4.1", {"name": "24.4.2", "products": ["D22"]}, "nope"], "products": ["D2"]})
+        self.assertEqual(response.status_code, 200)
+        results = {r["name"]: r["completed_products"] + r["incomplete_products"] for r in response.data["results"]}
+        self.assertEqual(results, {"24.4.1": ["D2"], "24.4.2": ["D22"]})
+        self.assertEqual(response.data["not_found"], ["nope"])
+
+    def test_product_filter_must_be_a_list_of_names(self):
+        for body in [
+            {"patches": ["24.4.1"], "products": "D2"},
+            {"patches": ["24.4.1"], "products": [1]},
+            {"patches": [{"name": "24.4.1", "products": "D22"}]},
+            {"patches": [{"name": "24.4.1", "products": {"D2": True}}]},
+        ]:
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+
+
+class ReleaseCompletionMatrixTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='manager', password='x')
+        release = Release.objects.create(name='24.4')
+        p0, p1 = Product.objects.create(name='P0'), Product.objects.create(name='P1')
+        patch = create_patch('24.4.1', release, patch_state='in_progress')
+        patch.products.add(p0, p1)
+        for product, ot2_pass in [(p0, 'Released'), (p1, 'Not Released')]:
+            image = Image.objects.create(product=product, image_name=f'{product.name}-img', build_number=patch.name)
+            PatchImage.objects.create(patch=patch, image=image, registry='Released', ot2_pass=ot2_pass)
+        # Released earlier than 24.4.1, with nothing to complete yet
+        create_patch('24.4.2', release).products.add(p0)
+        Patch.objects.filter(name='24.4.2').update(release_date='2023-12-01')
+        create_patch('24.4.3', release, is_deleted=True).products.add(p0)
+        create_patch('25.1.1', Release.objects.create(name='25.1')).products.add(p0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_matrix_of_every_live_patch(self):
+        response = self.client.get('/api/releases/24.4/completion-matrix/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            "release": "24.4",
+            "patches": [
+                {
+                    "name": "24.4.2", "patch_state": "new", "completion_percentage": 0,
+                    "completed_products": [], "incomplete_products": ["P0"],
+                    "products": [{"name": "P0", "completion_percentage": 0, "completed": False}],
+                },
+                {
+                    "name": "24.4.1", "patch_state": "in_progress", "completion_percentage": 75.0,
+                    "completed_products": ["P0"], "incomplete_products": ["P1"],
+                    "products": [
+                        {"name": "P0", "completion_percentage": 100.0, "completed": True},
+                        {"name": "P1", "completion_percentage": 50.0, "completed": False},
+                    ],
+                },
+            ],
+        })
+
+    def test_matrix_matches_per_patch_endpoints(self):
+        matrix = self.client.get('/api/releases/24.4/completion-matrix/').data
+        for row in matrix["patches"]:
+            with self.subTest(patch=row["name"]):
+                completion = self.client.get(f'/api/patches/{row["name"]}/completion/').data
+                products = self.client.get(f'/api/patches/{row["name"]}/product-completion/').data
+                self.assertEqual(row["completion_percentage"], completion["completion_percentage"])
+                self.assertEqual(row["completed_products"], sorted(products["completed_products"]))
+                self.assertEqual(row["incomplete_products"], sorted(products["incomplete_products"]))
+
+    def test_unknown_release(self):
+        response = self.client.get('/api/releases/99.9/completion-matrix/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data, {"error": "Release not found."})
+
+
+class VulnerabilityDiffTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='auditor', password='x')
+        release = Release.objects.create(name='24.4')
+        product = Product.objects.create(name='P0')
+        retired = Product.objects.create(name='P9', is_deleted=True)
+        old, fixed, new = [
+            SecurityIssue.objects.create(cve_id=cve_id, cvss_score=score, severity=severity, affected_libraries='lib')
+            for cve_id, score, severity in [('CVE-1', 9.8, 'Critical'), ('CVE-2', 7.5, 'High'), ('CVE-9', 5.0, 'Medium')]
+        ]
+        for patch_name in ('24.4.1', '24.4.2'):
+            create_patch(patch_name, release).products.add(product)
+        Image.objects.create(product=product, image_name='a1', build_number='24.4.1').security_issues.set([old, fixed])
+        Image.objects.create(product=product, image_name='a1', build_number='24.4.2').security_issues.set([old])
+        Image.objects.create(product=retired, image_name='z1', build_number='24.4.2').security_issues.set([new])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_patch_diff_covers_ingested_images(self):
+        # update-data creates the image without any PatchProductImage link
+        response = self.client.post('/api/patches/update-data/', [{"name": "24.4.2", "products": [{"name": "P0", "images": [
+            {"image_name": "a9", "patch_name": "24.4.2",
+             "security_issues": [{"CVE": "CVE-9", "cvss": 5.0, "Severity": "Medium", "PackageName": "lib"}]},
+        ]}]}], format='json')
+        self.assertEqual(response.status_code, 200)
+
+        diff = self.client.get('/api/security-issues/diff/?from=24.4.1&to=24.4.2').data
+        self.assertEqual(diff["summary"], {
+            "added": 1, "resolved": 1, "unchanged": 1, "severity_delta": {"High": -1, "Medium": 1},
+        })
+        images = {image["image_name"]: image for image in diff["images"]}
+        self.assertEqual(set(images), {'a1', 'a9'})
+        self.assertEqual([issue["cve_id"] for issue in images['a9']["added"]], ['CVE-9'])
+        self.assertEqual((images['a9']["from_build"], images['a9']["to_build"]), (None, '24.4.2'))
+
+
+class CveImpactTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='analyst', password='x'))
+        patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        patch.products.add(Product.objects.create(name='P0'))
+        Image.objects.create(product_id='P0', image_name='img', build_number=patch.name)
+
+    def test_library_lookup_matches_long_values(self):
+        # Scanner package lists run well past what a b-tree entry can hold
+        library = ','.join(f'lib{i}' for i in range(2000))
+        self.client.post('/api/patches/update-data/', [{"name": "24.4.1", "products": [{"name": "P0", "images": [
+            {"image_name": "img", "security_issues": [
+                {"CVE": "CVE-1", "cvss": 7.5, "Severity": "High", "PackageName": library},
+                {"CVE": "CVE-2", "cvss": 7.5, "Severity": "High", "PackageName": library + ',extra'},
+            ]},
+        ]}]}], format='json')
+        SecurityIssue.objects.create(cve_id='CVE-3', cvss_score=5.0, severity='Medium', affected_libraries=library)
+
+        response = self.client.get('/api/security-issues/impact/', {'library': library})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(issue["cve_id"] for issue in response.data["security_issues"]), ['CVE-1', 'CVE-3'])
+        self.assertEqual(
+            self.client.get('/api/security-issues/impact/', {'library': 'lib0'}).status_code, 404
+        )
+
+
+class ListPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='lister', password='x')
+        product = Product.objects.create(name='P0')
+        Image.objects.bulk_create([
+            Image(product=product, image_name=f'img{i:02}', build_number='24.4.1' if i % 2 else '24.4.2')
+            for i in range(25)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pages_walk_the_list_in_key_order(self):
+        names, url, pages = [], '/api/images/?page_size=10', 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            names += [image["image_name"] for image in response.data["results"]]
+            url = response.data["next"]
+            pages += 1
+            if pages == 1:
+                # Rows written or removed behind the cursor neither repeat nor shift later pages
+                Image.objects.filter(image_name='img00').update(is_deleted=True)
+                Image.objects.create(product_id='P0', image_name='img99', build_number='24.4.1')
+        self.assertEqual(pages, 3)
+        self.assertEqual(names, [f'img{i:02}' for i in range(25)] + ['img99'])
+
+    def test_filtered_pages(self):
+        response = self.client.get('/api/images/?build_number=24.4.1&page_size=5')
+        names = [image["image_name"] for image in response.data["results"]]
+        response = self.client.get(response.data["next"])
+        names += [image["image_name"] for image in response.data["results"]]
+        self.assertEqual(names, [f'img{i:02}' for i in range(1, 21, 2)])
+
+    def test_lists_without_paging_parameters_stay_plain_arrays(self):
+        response = self.client.get('/api/images/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual([image["image_name"] for image in response.data], [f'img{i:02}' for i in range(25)])
+
+
+class PatchVersionTests(TestCase):
+
+    def test_save_never_writes_back_a_stale_version(self):
+        patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        stale = Patch.objects.get(pk=patch.pk)
+        loaded = stale.version
+
+        # A concurrent write to the patch document bumps the row
+        PatchJar.objects.create(patch=patch, jar=Jar.objects.create(name='jar0'), version='1.0')
+        bumped = Patch.objects.get(pk=patch.pk).version
+        self.assertGreater(bumped, loaded)
+
+        stale.description = 'changed'
+        stale.save()
+        row = Patch.objects.get(pk=patch.pk)
+        self.assertEqual(row.description, 'changed')
+        self.assertGreater(row.version, bumped)
+
+    def test_update_fields_cannot_write_version(self):
+        patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        current = Patch.objects.get(pk=patch.pk).version
+        patch.version = 0
+        patch.kba = 'KB-1'
+        patch.save(update_fields=['kba', 'version'])
+        row = Patch.objects.get(pk=patch.pk)
+        self.assertEqual(row.kba, 'KB-1')
+        self.assertEqual(row.version, current + 1)
+
+
+class PatchReadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='browser', password='x')
+        release = Release.objects.create(name='24.4')
+        p0, p1 = Product.objects.create(name='P0'), Product.objects.create(name='P1')
+        gone = Product.objects.create(name='PX', is_deleted=True)
+        for name in ['24.4.1', '24.4.2']:
+            patch = create_patch(name, release)
+            # linked out of name order
+            patch.products.add(p1)
+            patch.products.add(gone, p0)
+            PatchProductHelmChart.objects.create(patch=patch, product=p0, helm_charts='Released')
+            for image_name in ['a', 'b']:
+                Image.objects.create(product=p0, image_name=image_name, build_number=name)
+            PatchJar.objects.create(patch=patch, jar=Jar.objects.get_or_create(name='jar0')[0], version='1.0', remarks='ok')
+            PatchHighLevelScope.objects.create(
+                patch=patch, scope=HighLevelScope.objects.get_or_create(name='scope0')[0], version='2.0', remarks='',
+            )
+        Image.objects.create(product=p0, image_name='a', build_number='24.4.0')
+        Image.objects.create(product=p0, image_name='c', build_number='24.4.1', is_deleted=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def reference(self, name):
+        """The patch as PatchSerializer renders it with its per-row queries."""
+        return PatchSerializer(Patch.objects.get(name=name)).data
+
+    def test_patch_body(self):
+        response = self.client.get('/api/patches/24.4.1/details/')
+        self.assertEqual(response.status_code, 200)
+        (patch,) = response.data
+        self.assertEqual(
+            [(p["name"], p["images"], p["helm_charts"]) for p in patch["products"]],
+            [
+                ('P0', [{"image_name": "a", "build_number": "24.4.1"}, {"image_name": "b", "build_number": "24.4.1"}], 'Released'),
+                ('P1', [], None),
+            ],
+        )
+        self.assertEqual(patch["jars"], [{"name": "jar0", "version": "1.0", "remarks": "ok", "updated": False}])
+        self.assertEqual(patch["scopes"], [{"name": "scope0", "version": "2.0", "remarks": ""}])
+
+    def test_batched_reads_match_per_row_serializer(self):
+        expected = [self.reference('24.4.1'), self.reference('24.4.2')]
+        for url, body in [
+            ('/api/patches/', expected),
+            ('/api/patches/24.4.1/', expected[:1]),
+            ('/api/patches/24.4.1/details/', expected[:1]),
+            ('/api/patches/product/p0/', expected),
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data, body)
+
+    def test_read_queries_do_not_grow_with_patches(self):
+        with CaptureQueriesContext(connection) as two:
+            self.client.get('/api/patches/product/P0/')
+        create_patch('24.4.3', Release.objects.get(name='24.4')).products.add('P0', 'P1')
+        with CaptureQueriesContext(connection) as three:
+            response = self.client.get('/api/patches/product/P0/')
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(three), len(two))
+
+
+class SparseFieldsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='skimmer', password='x')
+        patch = create_patch('24.4.1', Release.objects.create(name='24.4'), patch_state='released')
+        product = Product.objects.create(name='P0')
+        patch.products.add(product)
+        PatchJar.objects.create(patch=patch, jar=Jar.objects.create(name='jar0'), version='1.0')
+        issue = SecurityIssue.objects.create(
+            cve_id='CVE-1', cvss_score=7.5, severity='High', affected_libraries='openssl',
+            library_path='/usr/lib', description='overflow',
+        )
+        Image.objects.create(product=product, image_name='img', build_number='24.4.1').security_issues.add(issue)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_fields_keeps_only_the_listed_fields(self):
+        self.assertEqual(self.get('/api/patches/?fields=name,patch_state'), [{"name": "24.4.1", "patch_state": "released"}])
+        self.assertEqual(
+            self.get('/api/images/?fields=image_name,build_number,high_count'),
+            [{"image_name": "img", "build_number": "24.4.1", "high_count": 1}],
+        )
+        self.assertEqual(
+            self.get('/api/security-issues/?fields=cve_id&expand=description'),
+            [{"cve_id": "CVE-1", "description": "overflow"}],
+        )
+
+    def test_expand_keeps_only_the_listed_heavy_fields(self):
+        full = self.get('/api/patches/24.4.1/')[0]
+        (patch,) = self.get('/api/patches/24.4.1/?expand=jars')
+        self.assertEqual(patch, {
+            name: value for name, value in full.items() if name not in ('products', 'scopes', 'description')
+        })
+        self.assertEqual(patch["jars"], [{"name": "jar0", "version": "1.0", "remarks": "", "updated": False}])
+
+        (image,) = self.get('/api/images/?expand=')
+        self.assertNotIn('security_issues', image)
+        self.assertEqual(image["image_name"], 'img')
+        (issue,) = self.get('/api/security-issues/?expand=')
+        self.assertEqual(
+            {name: issue[name] for name in ('cve_id', 'cvss_score', 'severity')},
+            {"cve_id": "CVE-1", "cvss_score": 7.5, "severity": "High"},
+        )
+        self.assertFalse({'description', 'affected_libraries', 'library_path'} & issue.keys())
+
+    def test_without_parameters_the_full_document_is_returned(self):
+        (patch,) = self.get('/api/patches/24.4.1/')
+        self.assertEqual(patch, PatchSerializer(Patch.objects.get(name='24.4.1')).data)
+        (image,) = self.get('/api/images/')
+        self.assertEqual([i["cve_id"] for i in image["security_issues"]], ['CVE-1'])
+
+    def test_skipped_columns_and_relations_are_not_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get('/api/patches/?fields=name,patch_state')
+        sql = ' '.join(q['sql'] for q in queries)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('product_app_patchjar', sql)
+        self.assertNotIn('product_app_patch_products', sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get('/api/images/?fields=image_name')
+        self.assertNotIn('product_app_image_security_issues', ' '.join(q['sql'] for q in queries))
+
+
+class PatchETagTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='cacher', password='x')
+        cls.patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        cls.patch.products.add(Product.objects.create(name='P0'), Product.objects.create(name='P1'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, etag=None):
+        return self.client.get(url, **({'HTTP_IF_NONE_MATCH': etag} if etag else {}))
+
+    def test_each_representation_has_its_own_etag(self):
+        urls = [
+            '/api/patches/24.4.1/',
+            '/api/patches/24.4.1/?fields=name',
+            '/api/patches/24.4.1/?fields=name,products',
+            '/api/patches/24.4.1/?expand=description',
+            '/api/patches/24.4.1/products/P0/',
+            '/api/patches/24.4.1/products/P1/',
+        ]
+        etags = {}
+        for url in urls:
+            response = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            etags[url] = response['ETag']
+        self.assertEqual(len(set(etags.values())), len(urls))
+
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url, etags[url]).status_code, 304)
+                others = ', '.join(etag for other, etag in etags.items() if other != url)
+                self.assertEqual(self.get(url, others).status_code, 200)
+
+    def test_change_to_the_patch_invalidates_every_etag(self):
+        url = '/api/patches/24.4.1/?fields=name'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get('/api/patches/24.4.1/?fields=name', etag).status_code, 304)
+        PatchJar.objects.create(patch=self.patch, jar=Jar.objects.create(name='jar0'), version='1.0')
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class NameCacheTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(jar_names.clear)
+        self.addCleanup(scope_names.clear)
+
+    def test_names_deleted_by_another_process_are_created_again(self):
+        user = CustomUser.objects.create_user(username='editor', password='x')
+        patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        patch.products.add(Product.objects.create(name='P0'))
+        # Cached here, then deleted elsewhere: only the other process's cache heard of it
+        jar_names.add(['jar0'])
+        scope_names.add(['scope0'])
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.patch(f'/api/patches/{patch.name}/', {
+            "jars_data": [{"name": "jar0", "version": "1.0"}], "scopes_data": [{"name": "scope0"}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Jar.objects.filter(name='jar0').exists())
+        self.assertTrue(patch.high_level_scope.filter(name='scope0').exists())
+
+        jar_names.add(['jar1'])
+        response = client.post('/api/patches/update-data/', [{"name": patch.name, "products": [{"name": "P0", "images": [
+            {"image_name": "img", "patch_name": patch.name, "jars": [{"Name": "jar1", "Version": "2.0"}]},
+        ]}]}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(PatchImageJar.objects.values_list('jar__name', 'current_version')), [('jar1', '2.0')])
+
+# -----------------------
+# Patch data writes
+# -----------------------
+# update_patch_data and PatchSerializer.create / update write in bulk; these
+# pin the rows and responses of the per-row code they replaced.
+
+class PatchDataIngestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='scanner', password='x')
+        release = Release.objects.create(name='24.4')
+        cls.patch = create_patch('24.4.1', release)
+        create_patch('24.4.0', release, is_deleted=True)
+        cls.product = Product.objects.create(name='P0')
+        Product.objects.create(name='P9', is_deleted=True)
+        cls.patch.products.add(cls.product)
+        cls.image = Image.objects.create(
+            product=cls.product, image_name='img', build_number=cls.patch.name, twistlock_report_url='old',
+        )
+        cls.patch_image = PatchImage.objects.create(patch=cls.patch, image=cls.image, patch_build_number='b0')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, images, **product):
+        body = [{"name": self.patch.name, "products": [{"name": "P0", "images": images, **product}]}]
+        return self.client.post('/api/patches/update-data/', body, format='json')
+
+    def issue(self, cve_id, **fields):
+        return {"CVE": cve_id, "cvss": 7.5, "Severity": "High", "PackageName": "lib", **fields}
+
+    def test_lock_freezes_patch_build_number(self):
+        response = self.post([
+            {"image_name": "img", "build_number": "b1", "ot2_pass": "Released"},
+            {"image_name": "img", "build_number": "b2", "registry": "Not Released"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "success")
+        self.patch_image.refresh_from_db()
+        self.assertEqual(
+            (self.patch_image.patch_build_number, self.patch_image.lock,
+             self.patch_image.ot2_pass, self.patch_image.registry),
+            ('b1', True, 'Released', 'Not Released'),
+        )
+
+        # Still locked by a later payload that no longer says "Released"
+        self.post([{"image_name": "img", "build_number": "b3", "ot2_pass": "Not Released"}])
+        self.patch_image.refresh_from_db()
+        self.assertEqual((self.patch_image.patch_build_number, self.patch_image.lock), ('b1', True))
+
+    def test_unlocked_image_takes_each_build_number(self):
+        self.post([{"image_name": "img", "build_number": "b1"}, {"image_name": "img", "build_number": "b2"}])
+        self.patch_image.refresh_from_db()
+        self.assertEqual((self.patch_image.patch_build_number, self.patch_image.lock), ('b2', False))
+
+    def test_repeated_entries_apply_in_order(self):
+        self.post([
+            {"image_name": "img", "twistlock_report_url": "first",
+             "security_issues": [self.issue("CVE-1")], "jars": [{"Name": "jar0", "Version": "1.0"}]},
+            {"image_name": "img", "twistlock_report_clean": False,
+             "security_issues": [self.issue("CVE-2"), self.issue("CVE-3", cvss=None)],
+             "jars": [{"Name": "jar0", "remarks": "done"}, {"Name": "jar1", "updated": True}, {"Version": "9"}]},
+        ])
+        self.image.refresh_from_db()
+        self.assertEqual((self.image.twistlock_report_url, self.image.twistlock_report_clean), ('first', False))
+        # The last security_issues section replaces the image's set; incomplete issues are skipped
+        self.assertEqual(set(self.image.security_issues.values_list('cve_id', flat=True)), {'CVE-2'})
+        self.assertTrue(SecurityIssue.objects.filter(cve_id='CVE-1').exists())
+        self.assertFalse(SecurityIssue.objects.filter(cve_id='CVE-3').exists())
+        # Jar fields sent by different entries add up on the same row
+        jars = {
+            pij.jar_id: (pij.current_version, pij.remarks, pij.updated)
+            for pij in PatchImageJar.objects.filter(patch_image=self.patch_image)
+        }
+        self.assertEqual(jars, {'jar0': ('1.0', 'done', False), 'jar1': (None, '', True)})
+
+    def test_security_issue_upserts_on_natural_key(self):
+        self.post([{"image_name": "img", "security_issues": [self.issue("CVE-1", Description="v1")]}])
+        self.post([{"image_name": "img", "security_issues": [
+            self.issue("CVE-1", Description="v2", library_path="/lib"),
+            self.issue("CVE-1", cvss=9.8, Severity="Critical"),
+        ]}])
+        issues = SecurityIssue.objects.filter(cve_id='CVE-1').order_by('cvss_score')
+        self.assertEqual(
+            [(i.cvss_score, i.description, i.library_path) for i in issues],
+            [(7.5, 'v2', '/lib'), (9.8, '', '')],
+        )
+        self.assertEqual(self.image.security_issues.count(), 2)
+
+    def test_unknown_image_is_created(self):
+        response = self.post(
+            [{"image_name": "new-img", "patch_name": self.patch.name, "registry": "Released"}],
+            helm_charts="Released",
+        )
+        self.assertEqual(response.status_code, 200)
+        image = Image.objects.get(image_name='new-img')
+        self.assertEqual(
+            (image.product_id, image.build_number, image.twistlock_report_url, image.twistlock_report_clean),
+            ('P0', self.patch.name, '', True),
+        )
+        patch_image = PatchImage.objects.get(patch=self.patch, image=image)
+        self.assertEqual((patch_image.registry, patch_image.lock), ('Released', True))
+        self.assertEqual(
+            PatchProductHelmChart.objects.get(patch=self.patch, product=self.product).helm_charts, 'Released'
+        )
+
+        # A later entry for the new image updates the row it created
+        self.post([{"image_name": "new-img", "twistlock_report_url": "url"}], helm_charts="Not Released")
+        image.refresh_from_db()
+        self.assertEqual(image.twistlock_report_url, 'url')
+        self.assertEqual(Image.objects.filter(image_name='new-img').count(), 1)
+        self.assertEqual(
+            list(PatchProductHelmChart.objects.filter(patch=self.patch).values_list('helm_charts', flat=True)),
+            ['Not Released'],
+        )
+
+    def test_entries_without_image_name_are_ignored(self):
+        response = self.post([{"registry": "Released"}, {"image_name": "", "ot2_pass": "Released"}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PatchImage.objects.count(), 1)
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_skipped_counts(self):
+        images = [{"image_name": "img", "security_issues": [self.issue("CVE-1")], "jars": [{"Name": "jar0"}]}]
+        first = self.post(images)
+        self.assertEqual(first.data["skipped"], {"security_issues": 0, "jars": 0})
+        again = self.post(images)
+        self.assertEqual(again.data["skipped"], {"security_issues": 1, "jars": 1})
+
+        images[0]["jars"] = [{"Name": "jar0", "remarks": "done"}]
+        changed = self.post(images)
+        self.assertEqual(changed.data["skipped"], {"security_issues": 1, "jars": 0})
+        self.assertEqual(PatchImageJar.objects.get(patch_image=self.patch_image).remarks, 'done')
+
+    def test_error_responses(self):
+        for body, status, error in [
+            ([{"products": []}], 400, "Field 'name' is required at top level."),
+            ([{"name": "nope"}], 404, "Patch 'nope' not found."),
+            ([{"name": "24.4.0"}], 404, "Patch '24.4.0' not found."),
+            ([{"name": "24.4.1", "products": [{"images": []}]}], 400, "Each product object must have a 'name'."),
+            ([{"name": "24.4.1", "products": [{"name": "nope"}]}], 404, "Product 'nope' not found."),
+            ([{"name": "24.4.1", "products": [{"name": "P9"}]}], 404, "Product 'P9' not found."),
+        ]:
+            with self.subTest(body=body):
+                response = self.client.post('/api/patches/update-data/', body, format='json')
+                self.assertEqual((response.status_code, response.data), (status, {"error": error}))
+        self.assertEqual(PatchImage.objects.count(), 1)
+        self.assertFalse(PatchProductHelmChart.objects.exists())
+
+
+class PatchDataStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='streamer', password='x')
+        patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        patch.products.add(Product.objects.create(name='P0'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stream(self, records, batch_size=1):
+        body = '\n'.join(json.dumps(record) for record in records)
+        response = self.client.post(
+            f'/api/patches/update-data/stream/?batch_size={batch_size}', body, content_type='application/x-ndjson',
+        )
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def record(self, image_name, **image):
+        return {"patch": "24.4.1", "product": "P0", "image": {"image_name": image_name, "patch_name": "24.4.1", **image}}
+
+    def test_malformed_nested_sections_are_rejected_per_record(self):
+        results = self.stream([
+            self.record("img0", security_issues=[1]),
+            self.record("img1", jars="x"),
+            self.record("img2", jars=[{"Name": "jar0"}, None]),
+            self.record("img3", security_issues={"CVE": "CVE-1"}),
+            self.record(["img4"]),
+            self.record("img5", jars=[{"Name": "jar0"}]),
+        ])
+        self.assertEqual([r.get("status") for r in results[:-1]], ["error"] * 5 + ["ok"])
+        self.assertEqual(results[0]["error"], "Field 'image.security_issues' must be a list of objects.")
+        self.assertEqual(results[1]["error"], "Field 'image.jars' must be a list of objects.")
+        self.assertEqual(results[-1]["summary"]["records"], 6)
+        self.assertEqual(list(Image.objects.values_list('image_name', flat=True)), ['img5'])
+
+    def test_unexpected_batch_failure_becomes_error_lines(self):
+        run = PatchDataIngest.run
+        calls = []
+
+        def fail_first_batch(ingest, *args, **kwargs):
+            calls.append(ingest)
+            if len(calls) == 1:
+                raise AttributeError('boom')
+            return run(ingest, *args, **kwargs)
+
+        with mock.patch.object(PatchDataIngest, 'run', fail_first_batch), self.assertLogs('product_app.ingest'):
+            results = self.stream([self.record("img0"), self.record("img1"), self.record("img2")], batch_size=2)
+        self.assertEqual(
+            results[:-1],
+            [{"line": 1, "status": "error", "error": "Batch rejected: boom"},
+             {"line": 2, "status": "error", "error": "Batch rejected: boom"},
+             {"line": 3, "status": "ok"}],
+        )
+        self.assertEqual(results[-1]["summary"]["errors"], 2)
+        self.assertEqual(list(Image.objects.values_list('image_name', flat=True)), ['img2'])
+
+
+class IngestJobLeaseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        patch.products.add(Product.objects.create(name='P0'))
+        cls.payload = [{"name": "24.4.1", "products": [{"name": "P0", "images": [
+            {"image_name": f"img{i}", "patch_name": "24.4.1"} for i in range(3)
+        ]}]}]
+
+    def job(self, **fields):
+        return IngestJob.objects.create(payload=self.payload, **fields)
+
+    def test_abandoned_job_is_reclaimed_and_resumed(self):
+        # Its worker died after committing the first batch
+        stale = timezone.now() - LEASE_TIMEOUT - timedelta(seconds=1)
+        job = self.job(status='running', started_at=stale, heartbeat_at=stale, total_items=3, processed_items=1)
+
+        claimed = claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertGreater(claimed.heartbeat_at, stale)
+        self.assertIsNone(claim_next_job())
+
+        run_ingest_job(claimed, batch_size=1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_items, job.total_items), ('succeeded', 3, 3))
+        self.assertEqual(sorted(Image.objects.values_list('image_name', flat=True)), ['img1', 'img2'])
+
+    def test_running_job_within_its_lease_is_left_alone(self):
+        now = timezone.now()
+        self.job(status='running', started_at=now, heartbeat_at=now - LEASE_TIMEOUT / 2)
+        self.assertIsNone(claim_next_job())
+        queued = self.job()
+        self.assertEqual(claim_next_job().pk, queued.pk)
+
+    def test_worker_that_lost_its_lease_writes_nothing(self):
+        self.job()
+        claimed = claim_next_job()
+        # Another worker took the job over in the meantime
+        IngestJob.objects.filter(pk=claimed.pk).update(heartbeat_at=timezone.now() + timedelta(seconds=1))
+
+        with self.assertLogs('product_app.jobs', 'WARNING'):
+            run_ingest_job(claimed, batch_size=1)
+        self.assertEqual((claimed.status, claimed.processed_items), ('running', 0))
+        self.assertFalse(Image.objects.exists())
+
+
+class PatchSerializerWriteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='editor', password='x')
+        cls.release = Release.objects.create(name='24.4')
+        product = Product.objects.create(name='P0')
+        # An older build of the image, from another patch
+        Image.objects.create(product=product, image_name='img', build_number='24.3.9', twistlock_report_url='old')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def body(self, **fields):
+        return {
+            "name": "24.4.1", "release": "24.4", "release_date": "2024-01-01", "kick_off": "2024-01-01",
+            "code_freeze": "2024-01-01", "platform_qa_build": "2024-01-01",
+            "client_build_availability": "2024-01-01", "description": "patch",
+            "jars_data": [], "scopes_data": [], "products_data": [], **fields,
+        }
+
+    def create(self):
+        issue = {
+            "cve_id": "CVE-1", "cvss_score": 7.5, "severity": "High", "affected_libraries": "lib",
+            "library_path": "/lib", "description": "overflow",
+        }
+        return self.client.post('/api/patches/', self.body(
+            products_data=[
+                {"name": "P0", "helm_charts": "Released", "images": [
+                    {"image_name": "img", "ot2_pass": "Released", "patch_build_number": "b1",
+                     "security_issues": [{**issue, "product_security_des": "first"}]},
+                    {"image_name": "img2", "security_issues": [{**issue, "product_security_des": "last"}]},
+                ]},
+                {"name": "P1", "images": []},
+            ],
+            jars_data=[{"name": "jar0", "version": "1.0"}, {"name": "jar0", "version": "2.0", "remarks": "r"}],
+            scopes_data=[{"name": "scope0", "version": "1"}],
+        ), format='json')
+
+    def test_create(self):
+        response = self.create()
+        self.assertEqual(response.status_code, 201)
+        patch = Patch.objects.get(name='24.4.1')
+        self.assertEqual(set(patch.products.values_list('name', flat=True)), {'P0', 'P1'})
+
+        images = {
+            img.image_name: (img.product_id, img.twistlock_report_url, img.twistlock_report_clean)
+            for img in Image.objects.filter(build_number='24.4.1')
+        }
+        self.assertEqual(images, {'img': ('P0', None, None), 'img2': ('P0', None, None)})
+        self.assertEqual(
+            set(PatchProductImage.objects.filter(patch=patch).values_list('product_id', 'image__image_name')),
+            {('P0', 'img'), ('P0', 'img2')},
+        )
+        self.assertEqual(
+            {pi.image.image_name: (pi.ot2_pass, pi.patch_build_number) for pi in PatchImage.objects.filter(patch=patch)},
+            {'img': ('Released', 'b1'), 'img2': (None, None)},
+        )
+        self.assertEqual(PatchProductHelmChart.objects.get(patch=patch).product_id, 'P0')
+
+        # One issue; the last description per product wins
+        self.assertEqual(SecurityIssue.objects.filter(cve_id='CVE-1').count(), 1)
+        self.assertEqual(
+            list(ProductSecurityIssue.objects.filter(patch=patch).values_list('product_id', 'product_security_des')),
+            [('P0', 'last')],
+        )
+        self.assertEqual(
+            list(PatchJar.objects.filter(patch=patch).values_list('jar_id', 'version', 'remarks')),
+            [('jar0', '2.0', 'r')],
+        )
+        self.assertEqual(
+            list(patch.patchhighlevelscope_set.values_list('scope_id', 'version', 'remarks')),
+            [('scope0', '1', '')],
+        )
+
+    def test_update_replaces_images_jars_and_scopes(self):
+        self.create()
+        response = self.client.put('/api/patches/24.4.1/', self.body(
+            products_data=[
+                {"name": "P0", "images": [{"image_name": "img2", "registry": "Released"}]},
+                {"name": "P2", "images": [{"image_name": "img3", "patch_build_number": "b3"}]},
+            ],
+            jars_data=[{"name": "jar1", "version": "1.0"}],
+            scopes_data=[{"name": "scope0", "version": "2", "remarks": "bumped"}],
+        ), format='json')
+        self.assertEqual(response.status_code, 200)
+        patch = Patch.objects.get(name='24.4.1')
+
+        self.assertEqual(set(patch.products.values_list('name', flat=True)), {'P0', 'P2'})
+        self.assertTrue(Product.objects.filter(name='P2').exists())
+        self.assertEqual(
+            set(PatchProductImage.objects.filter(patch=patch).values_list('product_id', 'image__image_name')),
+            {('P0', 'img2'), ('P2', 'img3')},
+        )
+        self.assertEqual(
+            {pi.image.image_name: (pi.registry, pi.patch_build_number) for pi in PatchImage.objects.filter(patch=patch)},
+            {'img2': ('Released', '24.4.1'), 'img3': (None, 'b3')},
+        )
+        # img is dropped from the patch but its build is kept; img3 is a new build under P2
+        self.assertTrue(Image.objects.filter(image_name='img', build_number='24.4.1').exists())
+        self.assertEqual(Image.objects.get(image_name='img3', build_number='24.4.1').product_id, 'P2')
+        self.assertEqual(
+            list(PatchJar.objects.filter(patch=patch).values_list('jar_id', 'version')), [('jar1', '1.0')],
+        )
+        self.assertEqual(
+            list(patch.patchhighlevelscope_set.values_list('scope_id', 'version', 'remarks')),
+            [('scope0', '2', 'bumped')],
+        )
+
+    def test_partial_update_keeps_unsent_sections(self):
+        self.create()
+        response = self.client.patch('/api/patches/24.4.1/', {"kba": "KB-1"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        patch = Patch.objects.get(name='24.4.1')
+        self.assertEqual(patch.kba, 'KB-1')
+        self.assertEqual(PatchImage.objects.filter(patch=patch).count(), 2)
+        self.assertEqual(PatchJar.objects.filter(patch=patch).count(), 1)
+
+
+# -----------------------
+# Security reports
+# -----------------------
+
+class SecurityReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='reporter', password='x')
+        product = Product.objects.create(name='P0')
+        cls.image = Image.objects.create(product=product, image_name='img', build_number='24.4.1')
+        # Ingest stores any severity string the scanner sends
+        cls.image.security_issues.set([
+            SecurityIssue.objects.create(cve_id=f'CVE-{i}', cvss_score=5.0, severity=severity, affected_libraries='lib')
+            for i, severity in enumerate(['High', 'High', 'Low', 'critical', 'Critical', 'Unknown'])
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def report(self, images, query=''):
+        return self.client.post(
+            f'/api/security-report/{query}', {"products": [{"name": "P0", "images": images}]}, format='json',
+        )
+
+    def test_summary_counts_every_severity(self):
+        response = self.report([{"image_name": "img", "build_number": "24.4.1"}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["vulnerability_summary"], {
+            "Critical": 1, "High": 2, "Low": 1, "critical": 1, "Unknown": 1,
+        })
+
+    def reference(self, pairs):
+        """Summary and per-image issues as the per-image ORM loop computed them before the rewrite."""
+        summary, issues = Counter(), {}
+        for image in Image.objects.prefetch_related('security_issues'):
+            if (image.image_name, image.build_number) not in pairs:
+                continue
+            summary.update(issue.severity for issue in image.security_issues.all())
+            issues[(image.image_name, image.build_number)] = [
+                {"cve_id": issue.cve_id, "severity": issue.severity, "description": issue.description}
+                for issue in image.security_issues.order_by('pk')
+            ]
+        return dict(summary), issues
+
+    def test_report_matches_per_image_loop_across_chunks(self):
+        product = Product.objects.get(name='P0')
+        issues = list(SecurityIssue.objects.order_by('pk'))
+        count = 2 * CHUNK_SIZE + 10
+        Image.objects.bulk_create([
+            Image(product=product, image_name=f'bulk{i}', build_number=f'b{i % 3}') for i in range(count)
+        ])
+        images = list(Image.objects.filter(image_name__startswith='bulk').order_by('pk'))
+        through = Image.security_issues.through
+        through.objects.bulk_create([
+            through(image_id=image.pk, securityissue_id=issue.pk)
+            for i, image in enumerate(images) for issue in issues[:i % len(issues)]
+        ])
+        refresh_vulnerability_counters([image.pk for image in images])
+
+        specs = [{"image_name": image.image_name, "build_number": image.build_number} for image in images]
+        # Unknown pairs, a repeated pair and entries without a build number
+        specs += [{"image_name": "bulk0", "build_number": "b9"}, specs[0], {"image_name": "img"}]
+        response = self.report(specs, '?products=1')
+        self.assertEqual(response.status_code, 200)
+
+        summary, expected = self.reference({(s["image_name"], s["build_number"]) for s in specs if "build_number" in s})
+        self.assertEqual(response.data["vulnerability_summary"], summary)
+        products = response.data["products"]
+        for spec in products[0]["images"]:
+            self.assertEqual(spec["security_issues"], expected.get((spec["image_name"], spec.get("build_number")), []))
+
+    def test_cve_exposure_matches_image_links(self):
+        release = Release.objects.create(name='24.4')
+        for name in ('24.4.1', '24.4.2'):
+            create_patch(name, release)
+        Patch.objects.filter(name='24.4.2').update(is_deleted=True)
+        retired = Product.objects.create(name='P9', is_deleted=True)
+        issue = SecurityIssue.objects.get(cve_id='CVE-1')
+        Image.objects.bulk_create(
+            [Image(product_id='P0', image_name=f'bulk{i}', build_number=f'24.4.{i % 3}') for i in range(CHUNK_SIZE + 10)]
+            + [Image(product=retired, image_name='gone', build_number='24.4.1'),
+               Image(product_id='P0', image_name='dropped', build_number='24.4.1', is_deleted=True)]
+        )
+        images = list(Image.objects.exclude(pk=self.image.pk).order_by('pk'))
+        through = Image.security_issues.through
+        through.objects.bulk_create([through(image_id=image.pk, securityissue_id=issue.pk) for image in images])
+        images.append(self.image)
+        ProductSecurityIssue.objects.create(patch_id='24.4.1', product_id='P0', security_issue=issue,
+                                            product_security_des='triaged')
+
+        response = self.client.get('/api/security-issues/impact/', {'cve_id': 'CVE-1'})
+        self.assertEqual(response.status_code, 200)
+        live = [
+            image for image in images
+            if not image.is_deleted and image.product_id == 'P0' and image.build_number != '24.4.2'
+        ]
+        self.assertEqual(
+            [(i["image_name"], i["build_number"], i["patch"], i["release"]) for i in response.data["images"]],
+            sorted(
+                [(image.image_name, image.build_number,
+                  image.build_number if image.build_number == '24.4.1' else None,
+                  '24.4' if image.build_number == '24.4.1' else None) for image in live],
+                key=lambda row: (row[0], row[1]),
+            ),
+        )
+        triage = {i["build_number"]: i["security_issues"][0]["product_security_des"] for i in response.data["images"]}
+        self.assertEqual(triage, {'24.4.0': None, '24.4.1': 'triaged'})
+        self.assertEqual(response.data["patches"], ['24.4.1'])
+        self.assertEqual(response.data["products"], ['P0'])
+
+
+class ProductSecurityDescriptionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='triager', password='x')
+        cls.patch = create_patch('24.4.1', Release.objects.create(name='24.4'))
+        cls.p0, p1 = Product.objects.create(name='P0'), Product.objects.create(name='P1')
+        issues = [
+            SecurityIssue.objects.create(cve_id=f'CVE-{i}', cvss_score=5.0, severity='High', affected_libraries='lib')
+            for i in range(3)
+        ]
+        cls.images = []
+        for name in ['a', 'b']:
+            image = Image.objects.create(product=cls.p0, image_name=name, build_number=cls.patch.name)
+            image.security_issues.set(issues)
+            cls.images.append(image)
+        for issue, product, description in [
+            (issues[0], cls.p0, 'not reachable'), (issues[1], cls.p0, 'fixed upstream'), (issues[2], p1, 'other product'),
+        ]:
+            ProductSecurityIssue.objects.create(
+                patch=cls.patch, product=product, security_issue=issue, product_security_des=description,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def description_queries(self, queries):
+        return [q['sql'] for q in queries if 'product_app_productsecurityissue' in q['sql']]
+
+    def test_descriptions_of_the_patch_and_product(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = ImageSerializer(self.images, many=True, context={'patch': self.patch, 'product': self.p0}).data
+        for image in data:
+            self.assertEqual(
+                sorted((i["cve_id"], i["product_security_des"]) for i in image["security_issues"]),
+                [('CVE-0', 'not reachable'), ('CVE-1', 'fixed upstream'), ('CVE-2', '')],
+            )
+        self.assertEqual(len(self.description_queries(queries)), 1)
+
+    def test_hydrated_images_have_no_description_context(self):
+        images = [{"image_name": name, "build_number": self.patch.name} for name in ['a', 'b']]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/api/hydrate-product-images/', {"products": [{"name": "P0", "images": images}]}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [sorted((i["cve_id"], i["product_security_des"]) for i in image["security_issues"])
+             for image in response.data[0]["images"]],
+            [[('CVE-0', ''), ('CVE-1', ''), ('CVE-2', '')]] * 2,
+        )
+        self.assertEqual(self.description_queries(queries), [])
+
+
+class SecurityDescriptionBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='annotator', password='x')
+        release = Release.objects.create(name='24.4')
+        for name in ['24.4.1', '24.4.2']:
+            create_patch(name, release)
+        for name in ['P0', 'P1']:
+            Product.objects.create(name=name)
+        cls.issues = [
+            SecurityIssue.objects.create(cve_id='CVE-1', cvss_score=7.5, severity='High', affected_libraries='openssl'),
+            SecurityIssue.objects.create(cve_id='CVE-2', cvss_score=9.8, severity='Critical', affected_libraries='zlib'),
+        ]
+        for patch_name, product_name, issue, description in [
+            ('24.4.1', 'P0', cls.issues[0], 'not reachable'),
+            ('24.4.2', 'P1', cls.issues[1], 'fixed upstream'),
+        ]:
+            ProductSecurityIssue.objects.create(
+                patch_id=patch_name, product_id=product_name, security_issue=issue, product_security_des=description,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def item(self, patch_name, product_name, issue, **fields):
+        return {
+            "patchName": patch_name, "productName": product_name, "cve_id": issue.cve_id,
+            "cvss_score": issue.cvss_score, "severity": issue.severity,
+            "affected_libraries": issue.affected_libraries, **fields,
+        }
+
+    def stored(self):
+        return set(ProductSecurityIssue.objects.values_list(
+            'patch_id', 'product_id', 'security_issue__cve_id', 'product_security_des',
+        ))
+
+    def test_lookup_in_item_order(self):
+        first, second = self.issues
+        items = [
+            self.item('24.4.2', 'P1', second),
+            # each field matches some entry, the combination none
+            self.item('24.4.1', 'P1', second),
+            self.item('24.4.2', 'P0', first),
+            self.item('24.4.1', 'P0', first),
+            self.item('24.4.1', 'P0', first, cvss_score=5.0),
+        ]
+        response = self.client.post('/api/get-security-descriptions/', {"items": items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"results": [
+            {"product_security_des": "fixed upstream"},
+            {"product_security_des": ""},
+            {"product_security_des": ""},
+            {"product_security_des": "not reachable"},
+            {"product_security_des": ""},
+        ]})
+        self.assertEqual(
+            response.data["results"],
+            [self.client.post('/api/get-security-description/', item, format='json').data for item in items],
+        )
+
+    def test_invalid_items(self):
+        item = self.item('24.4.1', 'P0', self.issues[0], product_security_des='x')
+        for items, error in [
+            ([], "A non-empty list of 'items' is required."),
+            ([item, 'CVE-1'], "Item 1 must be an object."),
+            ([item, {k: v for k, v in item.items() if k != 'severity'}], "Item 1 is missing required field: 'severity'"),
+            ([{**item, "cvss_score": "high"}], "Item 0: 'cvss_score' must be a number."),
+        ]:
+            with self.subTest(items=items):
+                for method, url in [('post', '/api/get-security-descriptions/'), ('patch', '/api/security-descriptions/')]:
+                    response = getattr(self.client, method)(url, {"items": items}, format='json')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.data, {"error": error})
+
+    def test_update_creates_and_updates_in_one_request(self):
+        first, second = self.issues
+        response = self.client.patch('/api/security-descriptions/', {"items": [
+            self.item('24.4.1', 'P0', first, product_security_des='superseded'),
+            self.item('24.4.2', 'P0', first, product_security_des='new note'),
+            self.item('24.4.1', 'P0', first, product_security_des='mitigated'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"status": "success", "created": 1, "updated": 1})
+        self.assertEqual(self.stored(), {
+            ('24.4.1', 'P0', 'CVE-1', 'mitigated'),
+            ('24.4.2', 'P0', 'CVE-1', 'new note'),
+            ('24.4.2', 'P1', 'CVE-2', 'fixed upstream'),
+        })
+
+    def test_update_with_a_missing_component_writes_nothing(self):
+        first, second = self.issues
+        before = self.stored()
+        response = self.client.patch('/api/security-descriptions/', {"items": [
+            self.item('24.4.1', 'P0', first, product_security_des='mitigated'),
+            self.item('99.9.9', 'P0', first, product_security_des='x'),
+            self.item('24.4.1', 'PX', first, product_security_des='x'),
+            self.item('24.4.1', 'P0', second, severity='Low', product_security_des='x'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data, {"error": "A required component could not be found.", "not_found": [1, 2, 3]})
+        self.assertEqual(self.stored(), before)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the ranked search runs on the SQLite FTS5 index')
+class SecurityIssueSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='searcher', password='x')
+        issues = {}
+        for cve_id, severity, score, library, description in [
+            ('CVE-2024-0001', 'High', 7.5, 'openssl', 'heap overflow in the parser, see CVE-2024-0003'),
+            ('CVE-2024-0002', 'Critical', 9.8, 'zlib', 'overflow when inflating data read by openssl'),
+            ('CVE-2024-0003', 'Medium', 5.0, 'log4j', 'remote code execution'),
+            ('CVE-2024-0004', 'High', 8.0, 'openssl', 'withdrawn'),
+        ]:
+            issues[cve_id] = SecurityIssue.objects.create(
+                cve_id=cve_id, severity=severity, cvss_score=score, affected_libraries=library, description=description,
+            )
+        issues['CVE-2024-0004'].soft_delete()
+        ProductSecurityIssue.objects.create(
+            product=Product.objects.create(name='P0'), security_issue=issues['CVE-2024-0003'],
+            product_security_des='openssl is not shipped',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        response = self.client.get('/api/security-issues/search/', query)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ranked_matches(self):
+        results = self.search({'q': 'openssl'})
+        # A library hit outranks prose and triage notes; deleted issues are left out
+        self.assertEqual(results[0]["cve_id"], 'CVE-2024-0001')
+        self.assertEqual({r["cve_id"] for r in results}, {'CVE-2024-0001', 'CVE-2024-0002', 'CVE-2024-0003'})
+        self.assertEqual(
+            {name: results[0][name] for name in ('severity', 'cvss_score', 'affected_libraries', 'description')},
+            {"severity": "High", "cvss_score": 7.5, "affected_libraries": "openssl",
+             "description": "heap overflow in the parser, see CVE-2024-0003"},
+        )
+        scores = [r["score"] for r in results]
+        self.assertEqual(scores, sorted(scores))
+
+    def test_every_word_matches_as_a_prefix(self):
+        self.assertEqual([r["cve_id"] for r in self.search({'q': 'overfl pars'})], ['CVE-2024-0001'])
+
+    def test_exact_cve_id_comes_first(self):
+        self.assertEqual([r["cve_id"] for r in self.search({'q': 'CVE-2024-0003'})], ['CVE-2024-0003', 'CVE-2024-0001'])
+
+    def test_severity_and_cvss_filters(self):
+        self.assertEqual(
+            [r["cve_id"] for r in self.search({'q': 'overflow', 'severity': 'High,Critical', 'cvss_min': '9'})],
+            ['CVE-2024-0002'],
+        )
+        self.assertEqual(
+            [r["cve_id"] for r in self.search({'q': 'openssl', 'severity': 'Medium', 'cvss_max': '5'})],
+            ['CVE-2024-0003'],
+        )
+
+    def test_index_follows_writes(self):
+        ProductSecurityIssue.objects.update(product_security_des='patched in the base image')
+        self.assertEqual(self.search({'q': 'shipped'}), [])
+        self.assertEqual([r["cve_id"] for r in self.search({'q': 'patched'})], ['CVE-2024-0003'])
+        SecurityIssue.objects.filter(cve_id='CVE-2024-0002').update(affected_libraries='libpng')
+        self.assertEqual([r["cve_id"] for r in self.search({'q': 'libpng'})], ['CVE-2024-0002'])
+
+    def test_invalid_parameters(self):
+        for query, error in [
+            ({}, "Query parameter 'q' is required."),
+            ({'q': 'openssl', 'cvss_min': 'high'}, "cvss_min, cvss_max and limit must be numbers."),
+            ({'q': 'openssl', 'limit': '0'}, "limit must be positive."),
+        ]:
+            with self.subTest(query=query):
+                response = self.client.get('/api/security-issues/search/', query)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data, {"error": error})
+
+
+# -----------------------
+# Image hydration
+# -----------------------
+
+class HydrateImagesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='hydrator', password='x')
+        release = Release.objects.create(name='24.4')
+        product = Product.objects.create(name='P0')
+        for build in ['24.4.1', '24.4.2']:
+            patch = create_patch(build, release)
+            for name in ['a', 'b']:
+                image = Image.objects.create(product=product, image_name=name, build_number=build)
+                PatchImage.objects.create(patch=patch, image=image, registry='Released', patch_build_number=f'{name}-{build}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def hydrate(self, images):
+        return self.client.post(
+            '/api/hydrate-product-images/', {"products": [{"name": "P0", "images": images}]}, format='json',
+        )
+
+    def test_only_requested_pairs_are_read(self):
+        # a/24.4.2 and b/24.4.1 are in the cross product of the requested
+        # names and builds, but not requested
+        images = [{"image_name": "a", "build_number": "24.4.1"}, {"image_name": "b", "build_number": "24.4.2"}]
+        with mock.patch.object(Image, 'from_db', wraps=Image.from_db) as image_rows, \
+                mock.patch.object(PatchImage, 'from_db', wraps=PatchImage.from_db) as patch_image_rows:
+            response = self.hydrate(images)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(i["image_name"], i["build_number"], i["patch_build_number"]) for i in response.data[0]["images"]],
+            [('a', '24.4.1', 'a-24.4.1'), ('b', '24.4.2', 'b-24.4.2')],
+        )
+        self.assertEqual(image_rows.call_count, 2)
+        self.assertEqual(patch_image_rows.call_count, 2)
 
-# Create your tests here.
+    def test_entries_line_up_across_chunks(self):
+        product = Product.objects.get(name='P0')
+        count = CHUNK_SIZE + 10
+        Image.objects.bulk_create([Image(product=product, image_name=f'bulk{i}', build_number='24.4.1') for i in range(count)])
+        images = [{"image_name": f'bulk{i}', "build_number": "24.4.1"} for i in reversed(range(count))]
+        images.insert(3, {"image_name": "a", "build_number": "24.4.3"})
+        response = self.hydrate(images)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [i["image_name"] for i in response.data[0]["images"]],
+            [f'bulk{i}' for i in reversed(range(count))],
+        )
+        self.assertEqual({i["patch_build_number"] for i in response.data[0]["images"]}, {'24.4.1'})
@@ -4,12 +4,13 @@ from django.urls import path, include
 from .views import (
     ReleaseViewSet, ProductViewSet, ImageViewSet,
     SecurityIssueViewSet, PatchViewSet, JarViewSet,
-    HighLevelScopeViewSet, patch_completion_percentage,patch_product_completion_status, update_patch_data, 
+    HighLevelScopeViewSet, patch_completion_percentage,patch_product_completion_status, release_completion_matrix, batch_patch_completion, update_patch_data, PatchDataStreamView, IngestJobDetailView,
     patch_image_jars_list,
     update_patch_image_jar, build_image_url_endpoint,product_jar_release_list,release_product_image_list,
     PatchProductDetailView,
     PatchDetailView,RefDB,ReleaseProductImageListAPIView,AllReleaseProductImagesAPIView,update_product_security_description_view, toggle_lock_by_names,PatchesByProductView,product_patch_completion_percentage, 
-    hydrate_images,SecurityReportView,get_security_description,hydrate_product_images
+    hydrate_images,SecurityReportView,get_security_description,hydrate_product_images,cve_impact,security_issue_search,vulnerability_diff,
+    get_security_descriptions,update_product_security_descriptions
 )
 
 release_list = ReleaseViewSet.as_view({
@@ -103,8 +104,12 @@ release_product_image_detail = ReleaseProductImageListAPIView.as_view()
 urlpatterns = [
     path('releases/', release_list, name='release-list'),
     path('releases/<str:name>/', release_detail, name='release-detail'),
+    path('releases/<str:name>/completion-matrix/', release_completion_matrix, name='release-completion-matrix'),
     path('patches/', patch_list, name='patch-list'),
     path('patches/update-data/', update_patch_data, name='update-patch-data'),
+    path('patches/update-data/stream/', PatchDataStreamView.as_view(), name='update-patch-data-stream'),
+    path('jobs/<int:pk>/', IngestJobDetailView.as_view(), name='ingest-job-detail'),
+    path('patches/completion-batch/', batch_patch_completion, name='patch-completion-batch'),
     path('patches/<str:name>/', patch_detail, name='patch-detail'),
     path('patches/<str:name>/completion/', patch_completion_percentage, name='patch-completion'),
     path('patches/<str:name>/product-completion/', patch_product_completion_status, name='patch-product-completion'),
@@ -113,6 +118,9 @@ urlpatterns = [
     path('images/', image_list, name='image-list'),
     path('images/<str:image_name>/<str:build_number>/', image_detail, name='image-detail'),
     path('security-issues/', security_issue_list, name='security-issue-list'),
+    path('security-issues/impact/', cve_impact, name='cve-impact'),
+    path('security-issues/search/', security_issue_search, name='security-issue-search'),
+    path('security-issues/diff/', vulnerability_diff, name='vulnerability-diff'),
     path('security-issues/<str:cve_id>/', security_issue_detail, name='security-issue-detail'),
     path('jars/', jar_list, name='jar-list'),
     path('jars/<str:name>/', jar_detail, name='jar-detail'),
@@ -157,5 +165,7 @@ urlpatterns = [
     path('hydrate-product-images/', hydrate_product_images, name='hydrate-product-images'),
     path('security-report/', SecurityReportView.as_view(), name='security-report'),
     path('get-security-description/', get_security_description, name='get_security_description'),
+    path('get-security-descriptions/', get_security_descriptions, name='get_security_descriptions'),
+    path('security-descriptions/', update_product_security_descriptions, name='update_product_security_descriptions'),
 
 ]
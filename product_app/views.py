@@ -2,45 +2,152 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
 from rest_framework import viewsets, status, serializers
-from .models import Release, Patch, Product, Image, Jar, HighLevelScope, SecurityIssue, PatchProductImage, PatchProductJar, PatchImageJar, PatchJar, PatchImage, PatchProductHelmChart,ProductJarRelease, ReleaseProductImage,ProductSecurityIssue,ReleaseProductImage
-from .serializers import ReleaseSerializer, PatchSerializer, ProductSerializer, ImageSerializer, SecurityIssueSerializer, JarSerializer, HighLevelScopeSerializer,ReleaseProductImageSerializer
+from .models import Release, Patch, Product, Image, Jar, HighLevelScope, SecurityIssue, PatchProductImage, PatchProductJar, PatchImageJar, PatchJar, PatchImage, PatchProductHelmChart,ProductJarRelease, ReleaseProductImage,ProductSecurityIssue,ReleaseProductImage,IngestJob, library_hash, security_issue_hash
+from .serializers import ReleaseSerializer, PatchSerializer, ProductSerializer, ImageSerializer, SecurityIssueSerializer, JarSerializer, HighLevelScopeSerializer,ReleaseProductImageSerializer, IngestJobSerializer, build_patch_read_context
 from rest_framework.decorators import api_view
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from .data import PATCH_DATA, build_image_url
 from rest_framework.views import APIView
 from .update_data import update_details
+from .completion import Completion, rollup_completion, rollup_patch_completion
+from .changes import change_batch, mark_changed
+from .interning import jar_names
+from .jobs import enqueue_ingest_job
+from .reports import build_vulnerability_diff, cve_exposure, image_security_issues, patch_vulnerability_diff, severity_counts
+from .search import search_security_issues
+from .ingest import BATCH_SIZE, CHUNK_SIZE, MAX_BATCH_SIZE, IngestError, PatchDataIngest, chunked, stream_ingest
+from .filters import QueryParamFilterBackend
+from .pagination import OptInCursorPagination
 from rest_framework import generics
 from rest_framework.generics import RetrieveUpdateAPIView,ListCreateAPIView,RetrieveUpdateDestroyAPIView
+import hashlib
+import json
 import requests 
-from django.db.models import Q 
-from django.http import JsonResponse
-from collections import Counter 
+from django.db.models import Q, Value, prefetch_related_objects
+from django.db.models.functions import Lower
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from itertools import islice
 from rest_framework_simplejwt.tokens import RefreshToken
 
-class ReleaseViewSet(viewsets.ModelViewSet):
+def patch_etag(patch, request, scope=''):
+    # Patch.version is bumped on every change to the patch document. The
+    # representation (sub-resource scope and query string, e.g. ?fields= /
+    # ?expand=) is hashed in too, so each one has a validator of its own.
+    representation = '&'.join(
+        f'{key}={value}' for key, values in sorted(request.query_params.lists()) for value in values
+    )
+    digest = hashlib.sha256(f'{scope}?{representation}'.encode()).hexdigest()[:16]
+    return quote_etag(f"{patch.name}-v{patch.version}-{digest}")
+
+
+def not_modified(request, etag):
+    """A 304 response if the client's If-None-Match already holds `etag`, else None."""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        if etag in etags or '*' in etags:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return None
+
+
+class AtomicWritesMixin:
+    """
+    Runs create / update / destroy in one transaction together with the
+    version bumps and rollup / counter refreshes their signals trigger
+    (changes.py), so a failure in either leaves nothing half-written.
+    """
+    @transaction.atomic
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+
+
+class ReleaseViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     queryset = Release.objects.filter(is_deleted=False)
     serializer_class = ReleaseSerializer
     lookup_field = 'name' 
+    pagination_class = OptInCursorPagination
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {'active': 'active'}
 
-class PatchViewSet(viewsets.ModelViewSet):
+class PatchViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     queryset         = Patch.objects.filter(is_deleted=False)
     serializer_class = PatchSerializer
     lookup_field     = 'name'
+    pagination_class = OptInCursorPagination
+    filter_backends  = [QueryParamFilterBackend]
+    query_filters    = {
+        'release': 'release_id',
+        'patch_state': 'patch_state',
+        'product': 'products__name',
+    }
+
+    def get_queryset(self):
+        return PatchSerializer.restrict_queryset(
+            super().get_queryset(), self.request, always=['version']
+        )
+
+    def get_read_serializer(self, patches, many=False):
+        context = self.get_serializer_context()
+        context.update(build_patch_read_context(
+            patches, fields=PatchSerializer.selected_fields(self.request)
+        ))
+        return self.get_serializer_class()(patches, many=many, context=context)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_read_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_read_serializer(list(queryset), many=True)
+        return Response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response([serializer.data], status=status.HTTP_200_OK)
+        etag = patch_etag(instance, request)
+        if (response := not_modified(request, etag)) is not None:
+            return response
+        serializer = self.get_read_serializer(instance)
+        return Response([serializer.data], status=status.HTTP_200_OK, headers={'ETag': etag})
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     queryset = Product.objects.filter(is_deleted=False)
     # queryset = Product.objects.filter(is_deleted=False, is_helm_chart=False)
     serializer_class = ProductSerializer
     lookup_field = 'name'
+    pagination_class = OptInCursorPagination
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {'status': 'status'}
 
-class ImageViewSet(viewsets.ModelViewSet):
+class ImageViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     queryset = Image.objects.filter(is_deleted=False)
     serializer_class = ImageSerializer
+    pagination_class = OptInCursorPagination
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {
+        'product': 'product_id',
+        'build_number': 'build_number',
+        'image_name': 'image_name',
+    }
+
+    def get_queryset(self):
+        queryset = ImageSerializer.restrict_queryset(super().get_queryset(), self.request)
+        selected = ImageSerializer.selected_fields(self.request)
+        if selected is None or 'security_issues' in selected:
+            queryset = queryset.prefetch_related('security_issues')
+        return queryset
 
     def get_object(self):
         image_name = self.kwargs['image_name']
@@ -48,17 +155,29 @@ class ImageViewSet(viewsets.ModelViewSet):
         return get_object_or_404(Image, image_name=image_name, build_number=build_number, is_deleted=False)
 
 
-class SecurityIssueViewSet(viewsets.ModelViewSet):
+class SecurityIssueViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     queryset = SecurityIssue.objects.filter(is_deleted=False)
     serializer_class = SecurityIssueSerializer
     lookup_field = 'cve_id'
-
-class JarViewSet(viewsets.ModelViewSet):
+    pagination_class = OptInCursorPagination
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {
+        'severity': 'severity',
+        'cvss_min': 'cvss_score__gte',
+        'cvss_max': 'cvss_score__lte',
+        'cve_id': 'cve_id',
+    }
+
+    def get_queryset(self):
+        return SecurityIssueSerializer.restrict_queryset(super().get_queryset(), self.request)
+
+class JarViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     queryset = Jar.objects.all()
     serializer_class = JarSerializer
     lookup_field = 'name'
+    pagination_class = OptInCursorPagination
 
-class HighLevelScopeViewSet(viewsets.ModelViewSet):
+class HighLevelScopeViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     queryset = HighLevelScope.objects.all()
     serializer_class = HighLevelScopeSerializer
     lookup_field = 'name'
@@ -123,51 +242,9 @@ def patch_completion_percentage(request, name):
         return Response({"error": "Patch not found."},
                         status=status.HTTP_404_NOT_FOUND)
 
-    total_items = 0
-    completed_items = 0
-
-    # Loop each product on this patch
-    for product in patch.products.filter(is_deleted=False):
-        # For each image_name tied to this patch/product
-        image_names = (
-            product.images
-                   .filter(build_number=patch.name, is_deleted=False)
-                   .values_list('image_name', flat=True)
-        )
-        for img_name in image_names:
-            # fetch the PatchImage row by patch + image_name + build_number
-            try:
-                pi = PatchImage.objects.get(
-                    patch=patch,
-                    image__image_name=img_name,
-                    image__build_number=patch.name
-                )
-            except PatchImage.DoesNotExist:
-                continue
+    completion = rollup_patch_completion([patch.name])[patch.name]
 
-            # count the two half‐points
-            total_items += 1
-            if (pi.registry or '').lower() == 'released':
-                completed_items += 0.5
-            if (pi.ot2_pass or '').lower() == 'released':
-                completed_items += 0.5
-
-            # now count any jars under this PatchImage
-            for pij in PatchImageJar.objects.filter(patch_image=pi):
-                # only if a matching PatchJar exists
-                if not PatchJar.objects.filter(patch=patch, jar=pij.jar).exists():
-                    continue
-
-                total_items += 1
-                if pij.updated or (pij.remarks and pij.remarks.strip()):
-                    completed_items += 1
-
-    if total_items == 0:
-        pct = 0
-    else:
-        pct = round((completed_items / total_items) * 100, 2)
-
-    return Response({"completion_percentage": pct},
+    return Response({"completion_percentage": completion.percentage},
                     status=status.HTTP_200_OK)
 
 #api for getting completed and incomplete products
@@ -242,293 +319,197 @@ def patch_product_completion_status(request, name):
     incomplete_products = []
 
     # Evaluate each product under this patch
-    for product in patch.products.filter(is_deleted=False):
-        total_items = 0
-        completed_items = 0
-
-        image_names = (
-            product.images
-                   .filter(build_number=patch.name, is_deleted=False)
-                   .values_list('image_name', flat=True)
+    for product_name, completion in rollup_completion([patch.name])[patch.name].items():
+        if completion.is_complete:
+            completed_products.append(product_name)
+        else:
+            incomplete_products.append(product_name)
+
+    return Response({
+        "completed_products": completed_products,
+        "incomplete_products": incomplete_products
+    }, status=status.HTTP_200_OK)
+
+
+#api for completion of many patches at once
+@api_view(['POST'])
+def batch_patch_completion(request):
+    """
+    Body: {"patches": ["24.4.1", {"name": "24.4.2", "products": ["D2"]}, ...],
+           "products": [...]}   # optional filter applied to plain patch names
+    Returns the completion percentage and completed/incomplete product
+    buckets of every requested patch, in request order.
+    """
+    requested = request.data.get('patches')
+    default_products = request.data.get('products')
+    if not isinstance(requested, list) or not requested:
+        return Response({"error": "A non-empty list of 'patches' is required."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    def valid_filter(products):
+        # a bare string would turn `in` into a substring test
+        return products is None or (
+            isinstance(products, list) and all(isinstance(name, str) for name in products)
         )
 
-        for img_name in image_names:
-            try:
-                pi = PatchImage.objects.get(
-                    patch=patch,
-                    image__image_name=img_name,
-                    image__build_number=patch.name
-                )
-            except PatchImage.DoesNotExist:
+    if not valid_filter(default_products):
+        return Response({"error": "'products' must be a list of product names."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    filters = []
+    for entry in requested:
+        if isinstance(entry, str):
+            filters.append((entry, default_products))
+        elif isinstance(entry, dict) and isinstance(entry.get('name'), str):
+            product_filter = entry.get('products', default_products)
+            if not valid_filter(product_filter):
+                return Response({"error": f"'products' of patch '{entry['name']}' must be a list of product names."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            filters.append((entry['name'], product_filter))
+        else:
+            return Response({"error": "Each patch must be a name or an object with a 'name'."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    existing = set(
+        Patch.objects.filter(name__in=[name for name, _ in filters], is_deleted=False)
+                     .values_list('name', flat=True)
+    )
+    rollup = rollup_completion(list(existing))
+
+    results = []
+    not_found = []
+    for patch_name, product_filter in filters:
+        if patch_name not in existing:
+            not_found.append(patch_name)
+            continue
+
+        total = Completion()
+        completed_products = []
+        incomplete_products = []
+        if product_filter is not None:
+            product_filter = set(product_filter)
+        for product_name, completion in rollup[patch_name].items():
+            if product_filter is not None and product_name not in product_filter:
                 continue
+            total.add(completion)
+            if completion.is_complete:
+                completed_products.append(product_name)
+            else:
+                incomplete_products.append(product_name)
+
+        results.append({
+            "name": patch_name,
+            "completion_percentage": total.percentage,
+            "completed_products": completed_products,
+            "incomplete_products": incomplete_products,
+        })
 
-            total_items += 1
-            if (pi.registry or '').lower() == 'released':
-                completed_items += 0.5
-            if (pi.ot2_pass or '').lower() == 'released':
-                completed_items += 0.5
+    return Response({"results": results, "not_found": not_found},
+                    status=status.HTTP_200_OK)
 
-            for pij in PatchImageJar.objects.filter(patch_image=pi):
-                if not PatchJar.objects.filter(patch=patch, jar=pij.jar).exists():
-                    continue
 
-                total_items += 1
-                if pij.updated or (pij.remarks and pij.remarks.strip()):
-                    completed_items += 1
+#api for completion of every patch x product in a release
+@api_view(['GET'])
+def release_completion_matrix(request, name):
+    try:
+        release = Release.objects.get(name=name, is_deleted=False)
+    except Release.DoesNotExist:
+        return Response({"error": "Release not found."},
+                        status=status.HTTP_404_NOT_FOUND)
 
-        if total_items > 0 and completed_items == total_items:
-            completed_products.append(product.name)
-        else:
-            incomplete_products.append(product.name)
+    patches = list(
+        release.patches.filter(is_deleted=False)
+               .order_by('release_date', 'name')
+               .values_list('name', 'patch_state')
+    )
+    rollup = rollup_completion([patch_name for patch_name, _ in patches])
+
+    matrix = []
+    for patch_name, patch_state in patches:
+        patch_total = Completion()
+        products = []
+        for product_name, completion in sorted(rollup[patch_name].items()):
+            patch_total.add(completion)
+            products.append({
+                "name": product_name,
+                "completion_percentage": completion.percentage,
+                "completed": completion.is_complete,
+            })
+        matrix.append({
+            "name": patch_name,
+            "patch_state": patch_state,
+            "completion_percentage": patch_total.percentage,
+            "completed_products": [p["name"] for p in products if p["completed"]],
+            "incomplete_products": [p["name"] for p in products if not p["completed"]],
+            "products": products,
+        })
 
-    return Response({
-        "completed_products": completed_products,
-        "incomplete_products": incomplete_products
-    }, status=status.HTTP_200_OK)
+    return Response({"release": release.name, "patches": matrix},
+                    status=status.HTTP_200_OK)
 
 
 #api for populating tables in database
 @api_view(['POST'])
 @transaction.atomic
+@change_batch()
 def update_patch_data(request):
-
-    data = request.data
-    for patch_data in data:
-        # 1) Look up the Patch by name
-        patch_name = patch_data.get("name")
-        if not patch_name:
+    # ?async=1: queue the payload for process_ingest_jobs and answer 202
+    if request.query_params.get('async') in ('1', 'true'):
+        if not isinstance(request.data, list):
             return Response(
-                {"error": "Field 'name' is required at top level."},
+                {"error": "Payload must be a list of patch objects."},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        job = enqueue_ingest_job(request.data, user=request.user)
+        job_url = reverse('ingest-job-detail', args=[job.pk])
+        return Response(
+            {"job_id": job.pk, "status": job.status, "url": job_url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": job_url},
+        )
 
-        try:
-            patch = Patch.objects.get(name=patch_name, is_deleted=False)
-        except Patch.DoesNotExist:
-            return Response(
-                {"error": f"Patch '{patch_name}' not found."},
-                status=status.HTTP_404_NOT_FOUND
-            )
+    # Validated up front and written in bulk (see ingest.py); nothing is
+    # written when the payload is rejected.
+    ingest = PatchDataIngest(request.data)
+    try:
+        ingest.run()
+    except IngestError as e:
+        return Response({"error": e.message}, status=e.status_code)
 
-        # 2) Iterate over each product in the payload
-        for prod_data in patch_data.get("products", []):
-            product_name = prod_data.get("name")
-            if not product_name:
-                return Response(
-                    {"error": "Each product object must have a 'name'."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+    # Image sections left alone because they matched the last ingest
+    return Response({"status": "success", "skipped": ingest.skipped}, status=status.HTTP_200_OK)
 
-            try:
-                product = Product.objects.get(name=product_name, is_deleted=False)
-            except Product.DoesNotExist:
-                return Response(
-                    {"error": f"Product '{product_name}' not found."},
-                    status=status.HTTP_404_NOT_FOUND
-                )
 
-            #
-            # 2.a) Process “jars” for this (patch, product) → write into PatchProductJar
-            #
-            # for jar_data in prod_data.get("jars", []):  # ← new block
-            #     jar_name = jar_data.get("name")
-            #     if not jar_name:
-            #         continue
-
-            #     #  2.a.i) Ensure the Jar exists (or create it if missing)
-            #     jar_obj, _ = Jar.objects.get_or_create(name=jar_name)
-
-            #     #  2.a.ii) Find the existing PatchJar for (this patch, this jar),
-            #     #            so we can pull its “version” field:
-            #     try:
-            #         patch_jar = PatchJar.objects.get(patch=patch, jar=jar_obj)
-            #     except PatchJar.DoesNotExist:
-            #         # If there is no PatchJar row yet, we can either:
-            #         #  • create a default one with version = None, or skip.
-            #         patch_jar = PatchJar.objects.create(patch=patch, jar=jar_obj, version=None, remarks="")
-                
-            #     #  2.a.iii) Now, upsert the PatchProductJar row.
-            #     defaults = {}
-
-            #     # If the payload sent “curr_version”, overwrite current_version:
-            #     if "curr_version" in jar_data:
-            #         defaults["current_version"] = jar_data.get("curr_version")
-            #     else:
-            #         # Optionally: do nothing, leave existing current_version alone.
-            #         pass
-
-            #     # Always set “version” from the PatchJar row (so they stay in sync):
-            #     # defaults["version"] = patch_jar.version
-
-            #     # If payload sent “updated” or “remarks”, copy them over:
-            #     if "updated" in jar_data:
-            #         defaults["updated"] = jar_data["updated"]
-            #     if "remarks" in jar_data:
-            #         defaults["remarks"] = jar_data["remarks"]
-
-            #     # Upsert PatchProductJar:
-            #     ppj, created = PatchProductJar.objects.update_or_create(
-            #         patch_jar_id=patch_jar,  # this is a ForeignKey to PatchJar
-            #         product=product,
-            #         defaults=defaults
-            #     )
-            #     # At this point, you have either created or updated the (
-            #     #    patch_jar_id = patch_jar, product = product
-            #     # ) row, with default values set above.
-
-            # #
-            # # 2.b) Process “images” for this (patch, product)
-            # #      (update Image fields, PatchImage fields, and attach SecurityIssues)
-
-            for img_data in prod_data.get("images", []):
-                image_name = img_data.get("image_name")
-                if not image_name:
-                    continue
-
-                #  2.b.i) Try to fetch an existing Image for this product
-                try:
-                    # image = Image.objects.get(image_name=image_name, product=product)
-                    image = Image.objects.get(image_name=image_name, build_number=patch_name)
-                    # Overwrite only the fields they provided:
-                    # if "build_number" in img_data:
-                    #     image.build_number = img_data["build_number"]
-                    if "twistlock_report_url" in img_data:
-                        image.twistlock_report_url = img_data["twistlock_report_url"]
-                    if "twistlock_report_clean" in img_data:
-                        image.twistlock_report_clean = img_data["twistlock_report_clean"]
-                    image.save()
-                except Image.DoesNotExist:
-                    # If no existing Image, create one with defaults
-                    create_kwargs = {
-                        "product": product,
-                        "image_name": image_name,
-                        "build_number": img_data.get("patch_name", ""),
-                        "twistlock_report_url": img_data.get("twistlock_report_url", ""),
-                        "twistlock_report_clean": img_data.get("twistlock_report_clean", True),
-                    }
-                    image = Image.objects.create(**create_kwargs)
-
-                #
-                #  2.b.ii) Upsert nested SecurityIssue rows if any were sent
-                #
-                if "security_issues" in img_data:
-                    issue_objs = []
-                    for issue_data in img_data["security_issues"]:
-                        # We match or create by the four fields (cve_id, cvss_score, severity, affected_libraries).
-                        # After creating/fetching, we will attach it to image.security_issues M2M.
-                        cve_id = issue_data.get("CVE")
-                        cvss_score = issue_data.get("cvss")
-                        severity = issue_data.get("Severity")
-                        affected_libraries = issue_data.get("PackageName")
-
-                        if not (cve_id and cvss_score is not None and severity and affected_libraries):
-                            # Skip incomplete entries
-                            continue
-
-                        # Build the “lookup” dict (the four‐field key) and “defaults” dict for any extra fields:
-                        lookup = {
-                            "cve_id": cve_id,
-                            "cvss_score": cvss_score,
-                            "severity": severity,
-                            "affected_libraries": affected_libraries
-                        }
-                        defaults = {
-                            "library_path": issue_data.get("library_path", ""),
-                            "description": issue_data.get("Description", ""),
-                            "is_deleted": False,
-                        }
-
-                        issue_obj, _ = SecurityIssue.objects.update_or_create(
-                            **lookup,
-                            defaults=defaults
-                        )
-                        issue_objs.append(issue_obj)
-
-                    # Replace the image’s M2M set with exactly what they sent:
-                    image.security_issues.set(issue_objs)
-
-                #
-                #  2.b.iii) Upsert (patch, image) → PatchImage, only on the fields given
-                #
-                # patch_image_defaults = {}
-                # if "ot2_pass" in img_data:
-                #     patch_image_defaults["ot2_pass"] = img_data["ot2_pass"]
-                # if "registry" in img_data:
-                #     patch_image_defaults["registry"] = img_data["registry"]
-                # # if "helm_charts" in img_data:
-                # #     patch_image_defaults["helm_charts"] = img_data["helm_charts"]
-                # if "build_number" in img_data:
-                #     patch_image_defaults["patch_build_number"] = img_data["build_number"]
-
-                # if patch_image_defaults:
-                #     # update_or_create PatchImage row for (patch, image)
-                #     PatchImage.objects.update_or_create(
-                #         patch=patch,
-                #         image=image,
-                #         defaults=patch_image_defaults
-                #     )
-
-                # -- fetch or create PatchImage
-                patch_image, _ = PatchImage.objects.update_or_create(
-                    patch=patch,
-                    image=image,
-                    defaults={
-                        **({"ot2_pass": img_data["ot2_pass"]} if "ot2_pass" in img_data else {}),
-                        **({"registry": img_data["registry"]} if "registry" in img_data else {}),
-                        # **({"patch_build_number": img_data["build_number"]} if "build_number" in img_data else {}),
-                         # only update build_number when we’re _not_ already locked
-                        **({
-                            "patch_build_number": img_data["build_number"]
-                        } if (
-                            "build_number" in img_data and
-                            not PatchImage.objects.filter(
-                                patch=patch, image=image, lock=True
-                            ).exists()
-                        ) else {}),
-
-                        # force lock on any new “Released” status
-                        **(
-                            {"lock": True}
-                            if img_data.get("ot2_pass") == "Released"
-                            or img_data.get("registry") == "Released"
-                            else {}
-                        ),
-                    }
-                )
+class IngestJobDetailView(generics.RetrieveAPIView):
+    """Status and progress counters of a queued update_patch_data job."""
+    queryset = IngestJob.objects.select_related('created_by')
+    serializer_class = IngestJobSerializer
 
-                # — NEW: process jars nested under this image —
-                for jar_data in img_data.get("jars", []):
-                    jar_name = jar_data.get("Name")
-                    if not jar_name:
-                        continue
-
-                    # 1) auto-create the Jar if missing
-                    jar_obj, _ = Jar.objects.get_or_create(name=jar_name)
-
-                    # 2) build the fields for PatchImageJar (no 'version' field here)
-                    pjij_defaults = {
-                        **({"current_version": jar_data["Version"]} if "Version" in jar_data else {}),
-                        **({"updated": jar_data["updated"]} if "updated" in jar_data else {}),
-                        **({"remarks": jar_data["remarks"]} if "remarks" in jar_data else {}),
-                    }
-
-                    # 3) upsert into PatchImageJar
-                    PatchImageJar.objects.update_or_create(
-                        patch_image=patch_image,
-                        jar=jar_obj,
-                        defaults=pjij_defaults
-                    )
-            # 2.c) Upsert PatchProductHelmChart
-            helm_val = prod_data.get("helm_charts", None)
-            if helm_val is not None:
-                PatchProductHelmChart.objects.update_or_create(
-                    patch=patch,
-                    product=product,
-                    defaults={"helm_charts": helm_val}
-                )
-        # End of “for each product” loop
 
-    return Response({"status": "success"}, status=status.HTTP_200_OK)
+class PatchDataStreamView(APIView):
+    """
+    NDJSON variant of update_patch_data for large scanner uploads: one
+    (patch, product, image) record per line (see ingest.py), answered with
+    one NDJSON result line per record and a closing summary line.
+    """
+
+    def post(self, request):
+        try:
+            batch_size = int(request.query_params.get('batch_size', BATCH_SIZE))
+        except ValueError:
+            return Response({"error": "'batch_size' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            return Response(
+                {"error": f"'batch_size' must be between 1 and {MAX_BATCH_SIZE}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Read the raw body line by line; request.data would parse it whole.
+        results = stream_ingest(request.stream or [], batch_size=batch_size)
+        return StreamingHttpResponse(
+            (json.dumps(result) + "\n" for result in results),
+            content_type='application/x-ndjson',
+        )
 
 # # API to get product specific jars
 # @api_view(['GET'])
@@ -705,6 +686,7 @@ def patch_image_jars_list(request, patch_name, image_name):
 
 # API to update a single PatchImageJar entry
 @api_view(['PATCH'])
+@transaction.atomic
 def update_patch_image_jar(request, patch_name, image_name, jar_name):
     # 1) Verify Patch
     try:
@@ -734,9 +716,7 @@ def update_patch_image_jar(request, patch_name, image_name, jar_name):
         )
 
     # 4) Verify Jar
-    try:
-        jar = Jar.objects.get(name=jar_name)
-    except Jar.DoesNotExist:
+    if not jar_names.exists(jar_name):
         return Response(
             {"error": f"Jar '{jar_name}' not found."},
             status=status.HTTP_404_NOT_FOUND
@@ -744,7 +724,7 @@ def update_patch_image_jar(request, patch_name, image_name, jar_name):
 
     # 5) Fetch PatchImageJar
     try:
-        pij = PatchImageJar.objects.get(patch_image=patch_image, jar=jar)
+        pij = PatchImageJar.objects.get(patch_image=patch_image, jar_id=jar_name)
     except PatchImageJar.DoesNotExist:
         return Response(
             {"error": (
@@ -838,8 +818,16 @@ class PatchProductDetailView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
+            etag = patch_etag(patch, request, scope=f'product:{product_name.lower()}')
+            if (response := not_modified(request, etag)) is not None:
+                return response
 
-            serializer = PatchSerializer(patch, context={'request': request})
+            serializer = PatchSerializer(
+                patch, context={
+                    'request': request,
+                    **build_patch_read_context(patch, fields=PatchSerializer.selected_fields(request)),
+                }
+            )
             
             full_patch_data = serializer.data
 
@@ -852,7 +840,7 @@ class PatchProductDetailView(APIView):
             
             final_response = [full_patch_data]
 
-            return Response(final_response, status=status.HTTP_200_OK)
+            return Response(final_response, status=status.HTTP_200_OK, headers={'ETag': etag})
 
         except Patch.DoesNotExist:
             return Response({"error": "Patch not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -862,14 +850,23 @@ class PatchProductDetailView(APIView):
 
 class PatchDetailView(APIView):
    
-    def get(self, request, patch_name):
+    def get(self, request, patch_name, conditional=True):
      
         patch = get_object_or_404(Patch, name=patch_name)
 
-        serializer = PatchSerializer(patch, context={'request': request})
+        etag = patch_etag(patch, request)
+        if conditional and (response := not_modified(request, etag)) is not None:
+            return response
+
+        serializer = PatchSerializer(
+            patch, context={
+                'request': request,
+                **build_patch_read_context(patch, fields=PatchSerializer.selected_fields(request)),
+            }
+        )
 
        
-        return Response([serializer.data], status=status.HTTP_200_OK)
+        return Response([serializer.data], status=status.HTTP_200_OK, headers={'ETag': etag})
 
 
 
@@ -881,7 +878,7 @@ class RefDB(APIView):
         try:
             update_details(patch_name, product_name)
             patchdetailsview = PatchDetailView()
-            response = patchdetailsview.get(request, patch_name)
+            response = patchdetailsview.get(request, patch_name, conditional=False)
             data = response.data
         except Exception as e:
             data = {"message": "Handled error", "error": str(e)}
@@ -910,9 +907,13 @@ class ReleaseProductImageListAPIView(RetrieveUpdateDestroyAPIView):
 class AllReleaseProductImagesAPIView(ListCreateAPIView):
     queryset = ReleaseProductImage.objects.all()
     serializer_class = ReleaseProductImageSerializer
+    pagination_class = OptInCursorPagination
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {'release': 'release_id', 'product': 'product_id'}
 
 #update product security description
 @api_view(['PATCH'])
+@transaction.atomic
 def update_product_security_description_view(request, patch_name, product_name, cve_id):
     """
     Updates or creates a security description based on the direct existence of
@@ -935,15 +936,17 @@ def update_product_security_description_view(request, patch_name, product_name,
 
     # --- STEP 2: Find all three required objects ---
     # The view will fail if any of these three do not exist.
+    try:
+        issue_hash = security_issue_hash(cve_id, cvss_score, severity, affected_libraries)
+    except (TypeError, ValueError):
+        return Response(
+            {"error": "'cvss_score' must be a number."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     try:
         patch_obj = Patch.objects.get(name=patch_name)
         product_obj = Product.objects.get(name=product_name)
-        security_issue_obj = SecurityIssue.objects.get(
-            cve_id=cve_id,
-            cvss_score=cvss_score,
-            severity=severity,
-            affected_libraries=affected_libraries
-        )
+        security_issue_obj = SecurityIssue.objects.get(natural_key_hash=issue_hash)
     except (Patch.DoesNotExist, Product.DoesNotExist, SecurityIssue.DoesNotExist) as e:
         # If any object is not found, return a 404 error.
         return Response(
@@ -964,8 +967,104 @@ def update_product_security_description_view(request, patch_name, product_name,
 
     return Response({"status": "success", "message": message}, status=status_code)
 
+
+def parse_security_description_items(items, extra_fields=()):
+    """
+    Validates a list of security description entries (the fields of
+    get_security_description, plus `extra_fields`) and returns
+    [(patch_name, product_name, issue_hash, {extra field: value}), ...],
+    or an error Response.
+    """
+    if not isinstance(items, list) or not items:
+        return Response({"error": "A non-empty list of 'items' is required."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_BATCH_SIZE:
+        return Response({"error": f"At most {MAX_BATCH_SIZE} items per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return Response({"error": f"Item {index} must be an object."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            patch_name = item['patchName']
+            product_name = item['productName']
+            issue_hash = security_issue_hash(item['cve_id'], item['cvss_score'], item['severity'], item['affected_libraries'])
+            extra = {field: item[field] for field in extra_fields}
+        except KeyError as e:
+            return Response({"error": f"Item {index} is missing required field: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        except (TypeError, ValueError):
+            return Response({"error": f"Item {index}: 'cvss_score' must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        parsed.append((patch_name, product_name, issue_hash, extra))
+    return parsed
+
+
+@api_view(['PATCH'])
+@transaction.atomic
+@change_batch()
+def update_product_security_descriptions(request):
+    """
+    Batched update_product_security_description_view.
+    Body: {"items": [{"patchName", "productName", "cve_id", "cvss_score",
+    "severity", "affected_libraries", "product_security_des"}, ...]}
+    Every item is resolved first; if any patch, product or security issue is
+    missing nothing is written. All notes are then applied in one upsert.
+    """
+    parsed = parse_security_description_items(request.data.get('items'), extra_fields=('product_security_des',))
+    if isinstance(parsed, Response):
+        return parsed
+
+    patch_names = {patch_name for patch_name, _, _, _ in parsed}
+    product_names = {product_name for _, product_name, _, _ in parsed}
+    patches = set(Patch.objects.filter(name__in=patch_names).values_list('name', flat=True))
+    products = set(Product.objects.filter(name__in=product_names).values_list('name', flat=True))
+    issues = {}
+    for chunk in chunked({issue_hash for _, _, issue_hash, _ in parsed}):
+        issues.update(SecurityIssue.objects.filter(natural_key_hash__in=chunk).values_list('natural_key_hash', 'pk'))
+
+    not_found = [
+        index for index, (patch_name, product_name, issue_hash, _) in enumerate(parsed)
+        if patch_name not in patches or product_name not in products or issue_hash not in issues
+    ]
+    if not_found:
+        return Response(
+            {"error": "A required component could not be found.", "not_found": not_found},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # Later items win over earlier ones for the same row
+    entries = {
+        (patch_name, product_name, issues[issue_hash]): extra['product_security_des']
+        for patch_name, product_name, issue_hash, extra in parsed
+    }
+    existing = set()
+    for chunk in chunked(entries):
+        existing.update(ProductSecurityIssue.objects.filter(
+            patch_id__in={key[0] for key in chunk},
+            product_id__in={key[1] for key in chunk},
+            security_issue_id__in={key[2] for key in chunk},
+        ).values_list('patch_id', 'product_id', 'security_issue_id'))
+    ProductSecurityIssue.objects.bulk_create(
+        [
+            ProductSecurityIssue(patch_id=patch_name, product_id=product_name, security_issue_id=issue_id,
+                                 product_security_des=description)
+            for (patch_name, product_name, issue_id), description in entries.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['patch', 'product', 'security_issue'],
+        update_fields=['product_security_des'],
+        batch_size=CHUNK_SIZE,
+    )
+    # bulk_create sends no post_save
+    mark_changed(patch_names=patch_names, completion=False)
+
+    updated = len(existing & set(entries))
+    return Response(
+        {"status": "success", "created": len(entries) - updated, "updated": updated},
+        status=status.HTTP_200_OK
+    )
+
 #Api for build number locking
 @api_view(['PATCH'])
+@transaction.atomic
 def toggle_lock_by_names(request):
     patch_name = request.data.get('patch')
     image_name = request.data.get('image')
@@ -1009,6 +1108,65 @@ def toggle_lock_by_names(request):
         "build_number":    pi.patch_build_number,
     }, status=status.HTTP_200_OK)
 
+def hydrate_image_entries(entries):
+    """
+    Serializes the (non-deleted) Image named by each {image_name, build_number}
+    entry, plus the ot2_pass / registry / patch_build_number / lock of its
+    PatchImage in the patch named by the build number. The result lines up
+    with `entries`: None for entries that are incomplete or match no image.
+
+    All entries are resolved together, a query per table (per CHUNK_SIZE
+    entries) however many there are.
+    """
+    pairs = [(entry.get('image_name'), entry.get('build_number')) for entry in entries]
+    wanted = {(name, build) for name, build in pairs if name and build}
+
+    images = {}
+    for chunk in chunked(wanted):
+        # One (image_name, build_number) condition per pair, each matching
+        # the unique key, so only the requested images are read.
+        match = Q()
+        for name, build in chunk:
+            match |= Q(image_name=name, build_number=build)
+        for img in Image.objects.filter(match, is_deleted=False):
+            images[(img.image_name, img.build_number)] = img
+    prefetch_related_objects(list(images.values()), 'security_issues')
+
+    # Each image's PatchImage in the patch named by its build number
+    patch_images = {}
+    for chunk in chunked(images.values()):
+        match = Q()
+        for img in chunk:
+            match |= Q(patch_id=img.build_number, image_id=img.pk)
+        for pi in PatchImage.objects.filter(match).order_by('id'):
+            patch_images.setdefault(pi.image_id, pi)
+
+    output = []
+    for name, build in pairs:
+        img = images.get((name, build))
+        if img is None:
+            output.append(None)
+            continue
+        img_data = ImageSerializer(img).data
+        pi = patch_images.get(img.pk)
+        if pi is not None:
+            img_data.update({
+                "ot2_pass"           : pi.ot2_pass,
+                "registry"           : pi.registry,
+                "patch_build_number" : pi.patch_build_number,
+                "lock"               : pi.lock,
+            })
+        else:
+            # leave the new fields null if no PatchImage exists
+            img_data.update({
+                "ot2_pass"           : None,
+                "registry"           : None,
+                "patch_build_number" : build,
+                "lock"               : False,
+            })
+        output.append(img_data)
+    return output
+
 #api for getting whole products images data
 @api_view(['POST'])
 def hydrate_product_images(request):
@@ -1018,59 +1176,18 @@ def hydrate_product_images(request):
             {"detail": "A list of products is required."},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
+
+    # Hydrate the images of every product at once, then hand them back out
+    raw_images = [prod.get('images') or [] for prod in payload]
+    hydrated = iter(hydrate_image_entries([entry for entries in raw_images for entry in entries]))
+
     output = []
-    for prod in payload:
+    for prod, entries in zip(payload, raw_images):
         prod_out = {
             k: prod.get(k)
             for k in ("name", "status", "created_at", "updated_at", "is_deleted", "helm_charts")
         }
-        raw_images = prod.get('images') or []
-        hydrated = []
-        for entry in raw_images:
-            name  = entry.get('image_name')
-            build = entry.get('build_number')
-            if not name or not build:
-                continue  # skip invalid entries
-
-            # 1) fetch the Image row (404 if missing)
-            try:
-                img = Image.objects.get(
-                    image_name   = name,
-                    build_number = build,
-                    is_deleted   = False
-                )
-            except Image.DoesNotExist:
-                # skip or optionally return an error for this entry
-                continue
-
-            # 2) serialize the Image itself
-            img_data = ImageSerializer(img).data
-
-            # 3) fetch the matching PatchImage (where patch.name == build_number)
-            try:
-                pi = PatchImage.objects.get(
-                    patch__name   = build,
-                    image         = img
-                )
-                img_data.update({
-                    "ot2_pass"           : pi.ot2_pass,
-                    "registry"           : pi.registry,
-                    "patch_build_number" : pi.patch_build_number,
-                    "lock"               : pi.lock,
-                })
-            except PatchImage.DoesNotExist:
-                # leave the new fields null if no PatchImage exists
-                img_data.update({
-                    "ot2_pass"           : None,
-                    "registry"           : None,
-                    "patch_build_number" : build,
-                    "lock"               : False,
-                })
-
-            hydrated.append(img_data)
-
-        prod_out['images'] = hydrated
+        prod_out['images'] = [img_data for img_data in islice(hydrated, len(entries)) if img_data is not None]
         output.append(prod_out)
 
     return Response(output, status=status.HTTP_200_OK)
@@ -1083,15 +1200,24 @@ class PatchesByProductView(APIView):
         try:
             base_queryset = Patch.objects.filter(is_deleted=False)
 
-            filtered_patches = base_queryset.filter(products__name__iexact=product_name).distinct()
+            # Case-insensitive match through the LOWER(name) index on Product
+            products = Product.objects.annotate(name_lower=Lower('name')).filter(name_lower=Lower(Value(product_name)))
+            filtered_patches = list(base_queryset.filter(products__in=products).distinct())
 
-            if not filtered_patches.exists():
+            if not filtered_patches:
                 return Response(
                     {"detail": f"No patches found for product '{product_name}'."},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            serializer = PatchSerializer(filtered_patches, many=True)
+            serializer = PatchSerializer(
+                filtered_patches, many=True, context={
+                    'request': request,
+                    **build_patch_read_context(
+                        filtered_patches, fields=PatchSerializer.selected_fields(request)
+                    ),
+                }
+            )
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -1113,61 +1239,11 @@ def product_patch_completion_percentage(request, name, product_name):
     except Product.DoesNotExist:
         return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
 
-    # Use the serializer to get the product's data within the context of the patch
-    serializer = PatchSerializer(patch)
-    patch_data = serializer.data
-
-    # Find the specific product data from the serialized output
-    target_product = None
-    for p in patch_data.get('products', []):
-        if p.get('name') == product_name:
-            target_product = p
-            break
-
-    if not target_product:
+    completion = rollup_completion([patch.name])[patch.name].get(product_obj.name)
+    if completion is None:
         return Response({"error": f"Product '{product_name}' is not part of patch '{name}'."}, status=status.HTTP_404_NOT_FOUND)
 
-    total_items = 0
-    completed_items = 0
-
-    # Loop through only the images of the target product
-    for image in target_product.get('images', []):
-        # Fetch the PatchImage row to get completion status
-        try:
-            pi = PatchImage.objects.get(
-                patch=patch,
-                image__image_name=image.get('image_name')
-            )
-        except PatchImage.DoesNotExist:
-            continue
-
-     
-        total_items += 1
-        if (pi.registry or '').lower() == 'released':
-            completed_items += 0.5
-
-        if (pi.ot2_pass or '').lower() == 'released':
-            completed_items += 0.5
-        
-        # Get all Jars associated with this specific PatchImage
-        pij_qs = PatchImageJar.objects.filter(patch_image=pi)
-        
-        for pij in pij_qs:
-            # We only count this Jar towards the total if it's managed at the patch level
-            if not PatchJar.objects.filter(patch=patch, jar=pij.jar).exists():
-                continue
-
-            total_items += 1
-            # A jar is "complete" if it's marked as updated OR has remarks
-            if pij.updated or (pij.remarks and pij.remarks.strip()):
-                completed_items += 1
-
-    if total_items == 0:
-        # If there are no trackable items, completion is 0%
-        return Response({"completion_percentage": 0}, status=status.HTTP_200_OK)
-
-    percentage = round((completed_items / total_items) * 100, 2)
-    return Response({"completion_percentage": percentage}, status=status.HTTP_200_OK)
+    return Response({"completion_percentage": completion.percentage}, status=status.HTTP_200_OK)
 
 
 #api for getting whole images data
@@ -1180,59 +1256,99 @@ def hydrate_images(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    output = []
-    for entry in payload:
-        name  = entry.get('image_name')
-        build = entry.get('build_number')
-        if not name or not build:
-            continue  # skip invalid entries
+    output = [img_data for img_data in hydrate_image_entries(payload) if img_data is not None]
+    return Response(output, status=status.HTTP_200_OK)
 
-        # 1) fetch the Image row (404 if missing)
-        try:
-            img = Image.objects.get(
-                image_name   = name,
-                build_number = build,
-                is_deleted   = False
-            )
-        except Image.DoesNotExist:
-            # skip or optionally return an error for this entry
-            continue
 
-        # 2) serialize the Image itself
-        img_data = ImageSerializer(img).data
 
-        # 3) fetch the matching PatchImage (where patch.name == build_number)
-        try:
-            pi = PatchImage.objects.get(
-                patch__name   = build,
-                image         = img
-            )
-            img_data.update({
-                "ot2_pass"           : pi.ot2_pass,
-                "registry"           : pi.registry,
-                "patch_build_number" : pi.patch_build_number,
-                "lock"               : pi.lock,
-            })
-        except PatchImage.DoesNotExist:
-            # leave the new fields null if no PatchImage exists
-            img_data.update({
-                "ot2_pass"           : None,
-                "registry"           : None,
-                "patch_build_number" : build,
-                "lock"               : False,
-            })
+#api for "where are we exposed to this CVE / library"
+@api_view(['GET'])
+def cve_impact(request):
+    """
+    ?cve_id=CVE-2024-1234 or ?library=openssl (matched exactly against
+    affected_libraries): every live release, patch, product and image build
+    linked to the matching security issues, with the products' triage notes.
+    """
+    cve_id = request.query_params.get('cve_id')
+    library = request.query_params.get('library')
+    if bool(cve_id) == bool(library):
+        return Response({"error": "Provide exactly one of 'cve_id' or 'library'."}, status=status.HTTP_400_BAD_REQUEST)
+
+    issues = SecurityIssue.objects.filter(is_deleted=False)
+    if cve_id:
+        issues = issues.filter(cve_id=cve_id)
+    else:
+        issues = issues.filter(affected_libraries_hash=library_hash(library), affected_libraries=library)
+    report = cve_exposure(issues)
+    if report is None:
+        return Response({"error": "No matching security issue found."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(report, status=status.HTTP_200_OK)
 
-        output.append(img_data)
 
-    return Response(output, status=status.HTTP_200_OK)
+@api_view(['GET'])
+def security_issue_search(request):
+    """
+    ?q=openssl heap: full-text search over the security issues and their
+    products' triage notes, best match first. Optional filters: severity
+    (comma-separated), cvss_min, cvss_max; limit (default 50, max 200).
+    """
+    text = request.query_params.get('q', '').strip()
+    if not text:
+        return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+    severities = [s.strip() for s in request.query_params.get('severity', '').split(',') if s.strip()]
+    try:
+        cvss_min = request.query_params.get('cvss_min')
+        cvss_min = float(cvss_min) if cvss_min else None
+        cvss_max = request.query_params.get('cvss_max')
+        cvss_max = float(cvss_max) if cvss_max else None
+        limit = min(int(request.query_params.get('limit', 50)), 200)
+    except ValueError:
+        return Response({"error": "cvss_min, cvss_max and limit must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({"error": "limit must be positive."}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = search_security_issues(text, severities, cvss_min, cvss_max, limit)
+    data = SecurityIssueSerializer([issue for issue, _ in results], many=True).data
+    for item, (_, score) in zip(data, results):
+        item["score"] = score
+    return Response(data, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+def vulnerability_diff(request):
+    """
+    ?from=24.4.1&to=24.4.2 compares the security issues of every image in two
+    patches; adding &image_name=foo compares two builds of that image instead.
+    Per image: added, resolved and unchanged CVEs and the severity deltas.
+    """
+    from_ref = request.query_params.get('from')
+    to_ref = request.query_params.get('to')
+    image_name = request.query_params.get('image_name')
+    if not from_ref or not to_ref:
+        return Response({"error": "Query parameters 'from' and 'to' are required."}, status=status.HTTP_400_BAD_REQUEST)
+    if from_ref == to_ref:
+        return Response({"error": "'from' and 'to' must differ."}, status=status.HTTP_400_BAD_REQUEST)
+
+    if image_name:
+        found = set(Image.objects.filter(image_name=image_name, build_number__in=[from_ref, to_ref]).values_list('build_number', flat=True))
+        missing = [ref for ref in (from_ref, to_ref) if ref not in found]
+        if missing:
+            return Response({"error": f"Image '{image_name}' has no build {missing[0]}."}, status=status.HTTP_404_NOT_FOUND)
+        diff = build_vulnerability_diff(image_name, from_ref, to_ref)
+    else:
+        found = set(Patch.objects.filter(name__in=[from_ref, to_ref], is_deleted=False).values_list('name', flat=True))
+        missing = [ref for ref in (from_ref, to_ref) if ref not in found]
+        if missing:
+            return Response({"error": f"Patch '{missing[0]}' not found."}, status=status.HTTP_404_NOT_FOUND)
+        diff = patch_vulnerability_diff(from_ref, to_ref)
+    return Response({"from": from_ref, "to": to_ref, **diff}, status=status.HTTP_200_OK)
+
 
 class SecurityReportView(APIView):
     """
     Accepts a POST request with products/images.
-    It returns the enriched product list AND a top-level summary
-    of all vulnerability counts.
+    It returns a top-level summary of all vulnerability counts and, with
+    ?products=1, the product list enriched with each image's issues.
     """
     def post(self, request, *args, **kwargs):
         products_from_request = request.data.get('products', [])
@@ -1249,41 +1365,20 @@ class SecurityReportView(APIView):
         if not image_identifiers:
             return Response({"vulnerability_summary": {}, "products": products_from_request})
 
-        # 2. Build and execute the efficient database query
-        final_query = Q()
-        for name, build in image_identifiers:
-            final_query |= Q(image_name=name, build_number=build)
-        
-        found_images = Image.objects.filter(final_query).prefetch_related('security_issues')
-
-        # We use collections.Counter for a clean and efficient way to sum up severities.
-        total_counts = Counter()
-        for image in found_images:
-            # The .values_list() is a small optimization to only pull the 'severity' field
-            severities = image.security_issues.values_list('severity', flat=True)
-            total_counts.update(severities)
+        # 2. Severities are counted by the database (see reports.py)
+        report = {"vulnerability_summary": severity_counts(image_identifiers)}
 
-        # Create a fast lookup map for enriching the product list
-        images_map = {(img.image_name, img.build_number): img for img in found_images}
+        # 3. Optionally enrich the original product list with issue details
+        if request.query_params.get('products') in ('1', 'true'):
+            issues = image_security_issues(image_identifiers)
+            for product in products_from_request:
+                for image_spec in product.get('images', []):
+                    image_spec['security_issues'] = issues.get(
+                        (image_spec.get('image_name'), image_spec.get('build_number')), []
+                    )
+            report["products"] = products_from_request
 
-        #  Enrich the original product list with issue details
-        for product in products_from_request:
-            for image_spec in product.get('images', []):
-                image_obj = images_map.get((image_spec.get('image_name'), image_spec.get('build_number')))
-                
-                if image_obj:
-                    image_spec['security_issues'] = [
-                        {"cve_id": issue.cve_id, "severity": issue.severity, "description": issue.description}
-                        for issue in image_obj.security_issues.all()
-                    ]
-                else:
-                    image_spec['security_issues'] = []
-            
-        #  Return the final response with BOTH the summary and the detailed list
-        return Response({
-            "vulnerability_summary": dict(total_counts), # Convert Counter to a plain dict for JSON
-            # "products": products_from_request
-        })
+        return Response(report)
 
 @api_view(['POST']) 
 def get_security_description(request):
@@ -1303,21 +1398,47 @@ def get_security_description(request):
         return Response({"error": f"Missing required field in request body: {e}"}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        security_issue_obj = SecurityIssue.objects.get(
-            cve_id=cve_id,
-            cvss_score=cvss_score,
-            severity=severity,
-            affected_libraries=affected_libraries
-        )
-        
-        entry = ProductSecurityIssue.objects.get(
-            patch__name=patch_name,
-            product__name=product_name,
-            security_issue=security_issue_obj
+        issue_hash = security_issue_hash(cve_id, cvss_score, severity, affected_libraries)
+    except (TypeError, ValueError):
+        return Response({"error": "'cvss_score' must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # One query through the hashed natural key instead of two
+    entry = list(ProductSecurityIssue.objects.filter(
+        patch__name=patch_name,
+        product__name=product_name,
+        security_issue__natural_key_hash=issue_hash,
+    ).values_list('product_security_des', flat=True)[:1])
+    description = entry[0] if entry else ""
+
+    return Response({"product_security_des": description})
+
+
+@api_view(['POST'])
+def get_security_descriptions(request):
+    """
+    Batched get_security_description.
+    Body: {"items": [{"patchName", "productName", "cve_id", "cvss_score",
+    "severity", "affected_libraries"}, ...]}
+    Returns {"results": [{"product_security_des": ...}, ...]} in item order,
+    "" where there is no entry, resolved with one join per chunk of items.
+    """
+    parsed = parse_security_description_items(request.data.get('items'))
+    if isinstance(parsed, Response):
+        return parsed
+
+    descriptions = {}
+    for chunk in chunked(parsed):
+        descriptions.update(
+            ((patch_name, product_name, issue_hash), description)
+            for patch_name, product_name, issue_hash, description in ProductSecurityIssue.objects.filter(
+                patch_id__in={patch_name for patch_name, _, _, _ in chunk},
+                product_id__in={product_name for _, product_name, _, _ in chunk},
+                security_issue__natural_key_hash__in={issue_hash for _, _, issue_hash, _ in chunk},
+            ).values_list('patch_id', 'product_id', 'security_issue__natural_key_hash', 'product_security_des')
         )
-        description = entry.product_security_des
-        
-    except (SecurityIssue.DoesNotExist, ProductSecurityIssue.DoesNotExist):
-        description = ""
 
-    return Response({"product_security_des": description})
\ No newline at end of file
+    results = [
+        {"product_security_des": descriptions.get((patch_name, product_name, issue_hash), "")}
+        for patch_name, product_name, issue_hash, _ in parsed
+    ]
+    return Response({"results": results})
@@ -89,6 +89,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction starts, so concurrent writers
+        # (web workers, process_ingest_jobs --concurrency) wait for each other
+        # instead of failing with "database is locked".
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 # POSTGRES Connection